@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, Header, Path
+from fastapi.responses import FileResponse
+
+from profiling import RequestProfiler
+from serializers import FastJSONResponse
+
+router = APIRouter()
+
+endpoint_name = "admin"
+version = "v1"
+
+def check_profile_token(token: str | None):
+    """Las capturas pueden contener rutas e identificadores de datos: solo se sirven con PROFILE_TOKEN."""
+    if not RequestProfiler.is_authorized(token):
+        raise HTTPException(status_code=403, detail="Token de perfilado no válido")
+
+@router.get("/" + endpoint_name + "/profiles", tags=["admin endpoints"])
+async def list_profiles(x_profile_token: str | None = Header(None, description="Valor de PROFILE_TOKEN")):
+    """Listar las capturas de perfilado guardadas, de la más reciente a la más antigua."""
+    check_profile_token(x_profile_token)
+    return FastJSONResponse(content=RequestProfiler.list())
+
+@router.get("/" + endpoint_name + "/profiles/{id}", tags=["admin endpoints"])
+async def get_profile(
+    id: str = Path(..., description="ID de la captura (cabecera X-Profile-Id de la respuesta perfilada)"),
+    x_profile_token: str | None = Header(None, description="Valor de PROFILE_TOKEN"),
+):
+    """Descargar una captura como pilas colapsadas, para flamegraph.pl o speedscope."""
+    check_profile_token(x_profile_token)
+    path = RequestProfiler.path(id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Captura no encontrada")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{id}.collapsed")
@@ -1,8 +1,14 @@
+import hashlib
 import os
-from typing import Optional, Dict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Dict, AsyncIterator
 from fastapi import Request, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from bson import ObjectId
 
+from serializers import DocumentSerializer
+
 class APIUtils:
     _is_docker = os.path.exists('/.dockerenv')
     _endpoints = {
@@ -49,9 +55,23 @@ class APIUtils:
     def check_accept_json(cls, request: Request):
         """Verificar si la cabecera Accept contiene 'application/json'."""
         accepted = request.headers.get("Accept", "")
-        if "application/json" not in accepted and "*/*" not in accepted:
+        if "application/json" not in accepted and "application/x-ndjson" not in accepted and "*/*" not in accepted:
             raise HTTPException(status_code=406, detail="La cabecera Accept debe incluir 'application/json'")
 
+    @classmethod
+    def wants_ndjson(cls, request: Request, stream: Optional[bool] = None) -> bool:
+        """Devuelve True si el cliente pide la respuesta en streaming (NDJSON)."""
+        return bool(stream) or "application/x-ndjson" in request.headers.get("Accept", "")
+
+    @classmethod
+    def ndjson_response(cls, documents: AsyncIterator[dict], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+        """Construir una respuesta NDJSON que serializa cada documento según se lee del cursor."""
+        async def lines():
+            async for document in documents:
+                yield DocumentSerializer.dumps(document) + b"\n"
+
+        return StreamingResponse(lines(), status_code=200, media_type="application/x-ndjson", headers=headers)
+
     @classmethod
     def check_content_type_json(cls, request: Request):
         """Verificar si la cabecera Content-Type contiene 'application/json'."""
@@ -84,6 +104,94 @@ class APIUtils:
             return [(field, 1) for field in sort.split(',')]
         return None
 
+    @classmethod
+    def parse_ids(cls, ids: str) -> list:
+        """Leer una lista de IDs separados por comas, con el mismo límite que los lotes."""
+        id_list = [document_id.strip() for document_id in ids.split(",") if document_id.strip()]
+        cls.check_batch_size(id_list)
+        return id_list
+
+    @classmethod
+    def add_missing_ids(cls, headers: Dict[str, str], missing: list) -> Dict[str, str]:
+        """Indicar en la cabecera X-Missing-Ids los IDs pedidos que no se han encontrado."""
+        if missing:
+            headers["X-Missing-Ids"] = ",".join(missing)
+        return headers
+
+    @classmethod
+    def check_batch_size(cls, items: list):
+        """Verificar que un lote no esté vacío ni supere BATCH_MAX_ITEMS elementos."""
+        max_items = int(os.getenv('BATCH_MAX_ITEMS', 10000))
+        if not items:
+            raise HTTPException(status_code=422, detail="El lote no contiene ningún elemento")
+        if len(items) > max_items:
+            raise HTTPException(status_code=413, detail=f"El lote no puede superar {max_items} elementos")
+
+    @classmethod
+    def batch_content(cls, results: list) -> dict:
+        """Resumir el resultado de una operación masiva."""
+        failed = sum(1 for r in results if r["status"] >= 400)
+        return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+    @classmethod
+    def add_next_cursor(cls, request: Request, headers: Dict[str, str], next_cursor: Optional[str]) -> Dict[str, str]:
+        """Añadir a las cabeceras el cursor de la página siguiente y su enlace, si existe."""
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+            next_url = request.url.remove_query_params("offset").include_query_params(after=next_cursor)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return headers
+
+    @classmethod
+    def etag(cls, body: bytes) -> str:
+        """Calcular una ETag fuerte a partir del cuerpo ya serializado de la respuesta."""
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    @classmethod
+    def is_not_modified(cls, request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+        """
+        Comprobar las cabeceras condicionales de la petición.
+
+        If-None-Match tiene prioridad: si viene, If-Modified-Since se ignora (RFC 9110, 13.2.2).
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+        if_modified_since = request.headers.get("If-Modified-Since")
+        if if_modified_since and last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return last_modified.replace(microsecond=0) <= since
+        return False
+
+    @classmethod
+    def conditional_response(cls, request: Request, content, headers: Optional[Dict[str, str]] = None,
+                             last_modified: Optional[datetime] = None) -> Response:
+        """
+        Construir una respuesta JSON con ETag (y Last-Modified si se conoce) que devuelve 304 sin cuerpo
+        cuando el cliente ya tiene esa misma versión.
+
+        :param last_modified: Fecha de la última modificación; sin zona horaria se entiende que está en UTC
+        """
+        body = DocumentSerializer.dumps(content)
+        headers = {k: v for k, v in (headers or {}).items() if k.lower() != "content-type"}
+        headers["ETag"] = cls.etag(body)
+        headers["Cache-Control"] = "no-cache"
+        if last_modified is not None:
+            if last_modified.tzinfo is None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+            headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+        if cls.is_not_modified(request, headers["ETag"], last_modified):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, status_code=200, media_type="application/json", headers=headers)
+
     @classmethod
     async def get(cls, client, url):
         response = await client.get(url, headers={"Accept" : "application/json"})
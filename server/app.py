@@ -1,15 +1,58 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from paises_v1 import router as eventos_v1_router
 from multimedia_v1 import router as multimedia_v1_router
 from users_v1 import router as users_v1_router
+from admin_v1 import router as admin_v1_router
+from async_db_connection import AsyncDatabaseConnection
+from db_indexes import IndexRegistry
+from geocoder import Gazetteer
+from compression import CompressionMiddleware, CompressedCache
+from document_cache import DocumentCache
+from metrics import Metrics, MetricsMiddleware
+from profiling import ProfilingMiddleware
+from upload_jobs import UploadJobs
+from username_filter import UsernameFilter
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Antes de aceptar peticiones: abrir y calentar el pool de MongoDB, crear los índices declarados y cargar
+    el nomenclátor. Al parar: esperar a las subidas en curso y cerrar el pool.
+    Configuración (variables de entorno):
+    - MONGO_WARMUP_CONNECTIONS: Conexiones que se abren al arrancar (por defecto MONGO_MIN_POOL_SIZE, o 10).
+    - MONGO_ENSURE_INDEXES: 'false' para no comprobar los índices al arrancar (por defecto 'true').
+    """
+    warmup = int(os.getenv('MONGO_WARMUP_CONNECTIONS', os.getenv('MONGO_MIN_POOL_SIZE', 10)))
+    try:
+        await AsyncDatabaseConnection.warm_up(warmup)
+        logger.info(f"Pool de conexiones preparado ({warmup} conexiones).")
+    except Exception as e:
+        # Sin base de datos la aplicación arranca igualmente: las peticiones fallarán hasta que responda
+        logger.error(f"La base de datos no responde al arrancar: {e}")
+    Gazetteer.load()
+    if os.getenv('MONGO_ENSURE_INDEXES', 'true').lower() == 'true':
+        try:
+            report = await IndexRegistry.ensure_indexes()
+            logger.info(f"Índices comprobados: {report}")
+        except Exception as e:
+            logger.error(f"No se han podido comprobar los índices: {e}")
+    yield
+    await UploadJobs.shutdown()
+    await AsyncDatabaseConnection.close_connection()
+
+app = FastAPI(lifespan=lifespan)
 app.title = "Eventual"
 app.version = "1.0.0"
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(CompressionMiddleware, minimum_size=1000)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +62,31 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los encabezados
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+def component_metrics():
+    """Indicadores de las cachés, del filtro de nombres y de las subidas, calculados al publicar /metrics."""
+    samples = []
+    for cache, stats in (("document", DocumentCache.stats()), ("compressed", CompressedCache.stats())):
+        for field, value in stats.items():
+            samples.append((f"cache_{field}", f"Contador '{field}' de las cachés en memoria", {"cache": cache}, value))
+    for field, value in UsernameFilter.stats().items():
+        samples.append((f"username_filter_{field}", f"Valor '{field}' del filtro de nombres de usuario", None, value))
+    samples.append(("upload_jobs_pending", "Trabajos de subida en cola o en curso en este proceso", None, UploadJobs.pending()))
+    return samples
+
+Metrics.add_collector(component_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Métricas de este proceso en el formato de texto de Prometheus. Es asíncrona a propósito: render() solo
+    recorre diccionarios en memoria, y como función síncrona cada lectura esperaría turno en el pool de hilos.
+    """
+    return Response(Metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(eventos_v1_router, prefix="/api/v1")
 app.include_router(multimedia_v1_router, prefix="/api/v1")
-app.include_router(users_v1_router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(users_v1_router, prefix="/api/v1")
+app.include_router(admin_v1_router, prefix="/api/v1")
@@ -0,0 +1,684 @@
+from pymongo import AsyncMongoClient, InsertOne, UpdateOne, DeleteOne, errors
+from pymongo.server_api import ServerApi
+from bson import json_util
+from bson.objectid import ObjectId
+import asyncio
+import base64
+import logging
+import os
+from dotenv import load_dotenv
+
+from serializers import DocumentSerializer
+from document_cache import DocumentCache, CountCache
+from memory_db import MemoryClient
+from metrics import timed, PoolMetricsListener
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+class AsyncDatabaseConnection:
+    """
+    AsyncDatabaseConnection es la variante asíncrona de DatabaseConnection. Expone los mismos métodos,
+    pero todos los accesos a MongoDB se realizan con el driver asíncrono de pymongo (AsyncMongoClient),
+    de modo que una consulta lenta no bloquea el bucle de eventos de uvicorn.
+    Métodos de Clase:
+    - connect(cls): Crea el cliente y el pool de conexiones (no realiza E/S).
+    - ping(cls): Comprueba que la base de datos responde.
+    - warm_up(cls, connections): Abre de antemano varias conexiones del pool.
+    - get_collection(cls, collection_name): Obtiene una colección específica de la base de datos.
+    - count_documents, get_collection_fields, create_document, create_array_element_id,
+      update_array_element_id, delete_array_element_id, read_document_id, find_documents,
+      query_document, update_document_id, delete_document_id: equivalentes awaitables de DatabaseConnection.
+    - create_documents, update_documents_id, delete_documents_id: Escrituras masivas sin orden con el
+      resultado de cada elemento.
+    - query_document_after(cls, ...): Paginación por rango a partir de un cursor opaco.
+    Las lecturas por ID pasan por DocumentCache y todas las escrituras por ID la invalidan.
+    - stream_documents(cls, ...): Generador asíncrono que recorre el cursor por lotes.
+    - count_documents_cached(cls, collection_name, query): Total de documentos con caché de pocos segundos.
+    - close_connection(cls): Cierra el pool de conexiones.
+    Los métodos con E/S llevan @timed, que publica en /metrics su duración por colección, los errores y los
+    documentos devueltos; el pool publica sus conexiones abiertas y en uso con PoolMetricsListener.
+    Configuración del pool (variables de entorno):
+    - MONGO_MAX_POOL_SIZE: Número máximo de conexiones por proceso (por defecto 200).
+    - MONGO_MIN_POOL_SIZE: Conexiones que se mantienen abiertas (por defecto 10).
+    - MONGO_MAX_IDLE_TIME_MS: Tiempo máximo que una conexión puede estar ociosa (por defecto 60000).
+    - MONGO_WAIT_QUEUE_TIMEOUT_MS: Espera máxima para obtener una conexión del pool (por defecto 5000).
+    - MONGO_SERVER_SELECTION_TIMEOUT_MS: Espera máxima para seleccionar un servidor (por defecto 5000).
+    - MONGO_CONNECT_TIMEOUT_MS: Tiempo máximo para abrir una conexión (por defecto 5000).
+    - MONGO_SOCKET_TIMEOUT_MS: Tiempo máximo de una operación en el socket (por defecto 20000).
+    Motor de almacenamiento (variables de entorno):
+    - DB_BACKEND: 'mongo' (por defecto, MongoDB en URI) o 'memory' (MemoryClient de memory_db: colecciones
+      en memoria del proceso con índices, para pruebas y benchmarks sin servidor). Los métodos de esta
+      clase son los mismos con cualquier motor; 'memory' no conserva nada al terminar el proceso.
+    """
+
+    _client = None
+    _db = None
+    _backends = {
+        "mongo": lambda options: AsyncMongoClient(os.getenv('URI'), server_api=ServerApi('1'), **options),
+        "memory": lambda options: MemoryClient(**options),
+    }
+
+    @classmethod
+    def get_pool_options(cls):
+        """Leer del entorno las opciones del pool de conexiones y de los timeouts."""
+        return {
+            "maxPoolSize": int(os.getenv('MONGO_MAX_POOL_SIZE', 200)),
+            "minPoolSize": int(os.getenv('MONGO_MIN_POOL_SIZE', 10)),
+            "maxIdleTimeMS": int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000)),
+            "waitQueueTimeoutMS": int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+            "serverSelectionTimeoutMS": int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+            "connectTimeoutMS": int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+            "socketTimeoutMS": int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+            "event_listeners": [PoolMetricsListener()],
+        }
+
+    @classmethod
+    def get_backend(cls):
+        """Nombre del motor de almacenamiento elegido en DB_BACKEND."""
+        backend = os.getenv('DB_BACKEND', 'mongo').strip().lower()
+        if backend not in cls._backends:
+            raise ValueError(f"DB_BACKEND no válido: {backend!r} (opciones: {', '.join(cls._backends)})")
+        return backend
+
+    @classmethod
+    def connect(cls):
+        """Crear el cliente asíncrono. El pool abre las conexiones bajo demanda."""
+        if cls._client is None:
+            try:
+                backend = cls.get_backend()
+                cls._client = cls._backends[backend](cls.get_pool_options())
+                cls._db = cls._client['mimapa']
+                logger.info(f"Cliente asíncrono creado para la base de datos ({backend}).")
+            except errors.ConnectionFailure as e:
+                logger.error(f"Error de conexión a la base de datos: {e}")
+                raise
+
+    @classmethod
+    @timed
+    async def ping(cls):
+        """Comprobar que la base de datos responde."""
+        cls.connect()
+        await cls._client.admin.command('ping')
+        return True
+
+    @classmethod
+    async def warm_up(cls, connections: int = 1):
+        """
+        Abrir de antemano 'connections' conexiones del pool con pings simultáneos, para que las primeras
+        peticiones no paguen la conexión (TCP, TLS y autenticación).
+        """
+        cls.connect()
+        await asyncio.gather(*(cls.ping() for _ in range(max(1, connections))))
+
+    @classmethod
+    def get_collection(cls, collection_name):
+        """Obtener una colección específica de la base de datos."""
+        cls.connect()
+        return cls._db[collection_name]
+
+    @classmethod
+    @timed
+    async def count_documents(cls, collection_name, query):
+        collection = cls.get_collection(collection_name)
+        return float(await collection.count_documents(query))
+
+    @classmethod
+    @timed
+    async def count_documents_cached(cls, collection_name, query=None):
+        """
+        Devolver el total de documentos que cumplen el filtro, reutilizando durante unos segundos el último
+        valor calculado para ese mismo filtro (CountCache).
+
+        Sin filtro se usa estimated_document_count, que lee los metadatos de la colección en lugar de recorrerla.
+        """
+        key = CountCache.key(query)
+        count = CountCache.get(collection_name, key)
+        if count is not None:
+            return count
+
+        collection = cls.get_collection(collection_name)
+        if query:
+            count = await collection.count_documents(query)
+        else:
+            count = await collection.estimated_document_count()
+        CountCache.put(collection_name, key, count)
+        return count
+
+    @classmethod
+    @timed
+    async def get_collection_fields(cls, collection_name, projection = None, hasDate = False):
+        """Obtener una colección específica de la base de datos y mostrar los campos elegidos."""
+        collection = cls.get_collection(collection_name)
+        try:
+            documents = collection.find(projection=projection)
+
+            date_format = DocumentSerializer.DATE_FORMAT
+            return [DocumentSerializer.to_json_document(d, hasDate, date_format) async for d in documents]
+
+        except Exception as e:
+            logger.error(f"ID de documento no válido: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def create_document(cls, collection_name, document, hasDate = False):
+        """Crear un nuevo documento en la colección."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.insert_one(document)
+            CountCache.invalidate(collection_name)
+            DocumentSerializer.to_json_document(document, hasDate, DocumentSerializer.DATE_FORMAT)
+            logger.info(f"Documento creado con ID: {result.inserted_id}")
+            return document['_id']
+        except errors.PyMongoError as e:
+            logger.error(f"Error al crear el documento: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def create_array_element_id(cls, collection_name, document_id, array_field, element):
+        """Crear un nuevo elemento en un arreglo de un documento existente, a partir de un ID."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.update_one(
+                {"_id": ObjectId(document_id)},
+                {"$push": {array_field: element}}
+            )
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+            if result.modified_count == 0:
+                logger.warning(f"No se encontró el documento con ID {document_id} para agregar un elemento.")
+                raise ValueError("Documento no encontrado para el ID proporcionado.")
+
+            logger.info(f"Elemento agregado al documento con ID {document_id}.")
+            return True
+        except ValueError as e:
+            raise e
+        except errors.PyMongoError as e:
+            logger.error(f"Error al agregar un elemento al documento: {e}")
+            raise RuntimeError("Error de base de datos al agregar el elemento.")
+
+    @classmethod
+    @timed
+    async def update_array_element_id(cls, collection_name, document_id, array_field, element_query, updated_fields):
+        """Actualizar un elemento de un arreglo en un documento existente, a partir de un ID."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.update_one(
+                {"_id": ObjectId(document_id), array_field: element_query},
+                {"$set": {f"{array_field}.$": updated_fields}}
+            )
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+            if result.modified_count == 0:
+                logger.warning(f"No se encontró el documento con ID {document_id} para actualizar un elemento.")
+                raise ValueError("Documento no encontrado para el ID proporcionado.")
+
+            logger.info(f"Elemento actualizado en el documento con ID {document_id}.")
+            return True
+        except ValueError as e:
+            raise e
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar un elemento en el documento: {e}")
+            raise RuntimeError("Error de base de datos al actualizar el elemento.")
+
+    @classmethod
+    @timed
+    async def delete_array_element_id(cls, collection_name, document_id, array_field, element_query):
+        """Eliminar un elemento de un arreglo en un documento existente, a partir de un ID."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.update_one(
+                {"_id": ObjectId(document_id)},
+                {"$pull": {array_field: element_query}}
+            )
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+            if result.modified_count == 0:
+                logger.warning(f"No se encontró el documento con ID {document_id} para eliminar un elemento.")
+                raise ValueError("Documento no encontrado para el ID proporcionado.")
+
+            logger.info(f"Elemento eliminado del documento con ID {document_id}.")
+            return True
+        except ValueError as e:
+            raise e
+        except errors.PyMongoError as e:
+            logger.error(f"Error al eliminar un elemento del documento: {e}")
+            raise RuntimeError("Error de base de datos al eliminar el elemento.")
+
+    @classmethod
+    @timed
+    async def read_document_id(cls, collection_name, document_id : str, projection = None, hasDate = False, use_cache = True):
+        """Leer un documento por su ID. Las lecturas se sirven desde DocumentCache mientras no caduquen."""
+        collection = cls.get_collection(collection_name)
+        try:
+            object_id = ObjectId(document_id)
+            cache_id = str(object_id)
+            variant = (tuple(sorted(projection.items())) if projection else None, hasDate)
+            document = DocumentCache.get(collection_name, cache_id, variant) if use_cache else None
+            if document is not None:
+                return document
+
+            generation = DocumentCache.generation(collection_name, cache_id)
+            document = await collection.find_one({"_id": object_id}, projection)
+            if document is None:
+                logger.warning(f"Documento con ID {document_id} no encontrado.")
+            else:
+                DocumentSerializer.to_json_document(document, hasDate, DocumentSerializer.DATE_FORMAT)
+                DocumentCache.put(collection_name, cache_id, variant, document, generation)
+            return document
+        except Exception as e:
+            logger.error(f"ID de documento no válido: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def exists(cls, collection_name, query):
+        """Comprobar si algún documento cumple el filtro, sin leer más que su _id."""
+        collection = cls.get_collection(collection_name)
+        try:
+            return await collection.find_one(query, {"_id": 1}) is not None
+        except errors.PyMongoError as e:
+            logger.error(f"Error al comprobar la existencia del documento: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def read_documents_ids(cls, collection_name, document_ids, projection = None, hasDate = False):
+        """
+        Leer varios documentos por ID en una sola consulta $in. Los que están en DocumentCache no se piden.
+
+        :return: Tupla (documentos en el orden de 'document_ids', IDs que no existen o no son válidos)
+        """
+        collection = cls.get_collection(collection_name)
+        variant = (tuple(sorted(projection.items())) if projection else None, hasDate)
+        keys = {document_id: str(ObjectId(document_id)) if cls.is_valid_objectid(document_id) else None
+                for document_id in document_ids}
+        requested = list(dict.fromkeys(key for key in keys.values() if key is not None))
+
+        found = {}
+        for cache_id in requested:
+            document = DocumentCache.get(collection_name, cache_id, variant)
+            if document is not None:
+                found[cache_id] = document
+
+        pending = [cache_id for cache_id in requested if cache_id not in found]
+        if pending:
+            generations = {cache_id: DocumentCache.generation(collection_name, cache_id) for cache_id in pending}
+            try:
+                documents = collection.find({"_id": {"$in": [ObjectId(cache_id) for cache_id in pending]}}, projection)
+                async for document in documents:
+                    DocumentSerializer.to_json_document(document, hasDate, DocumentSerializer.DATE_FORMAT)
+                    found[document["_id"]] = document
+                    DocumentCache.put(collection_name, document["_id"], variant, document, generations[document["_id"]])
+            except errors.PyMongoError as e:
+                logger.error(f"Error al leer los documentos por ID: {e}")
+                raise
+
+        missing = [document_id for document_id, key in keys.items() if key not in found]
+        return [found[cache_id] for cache_id in requested if cache_id in found], missing
+
+    @classmethod
+    @timed
+    async def find_documents(cls, collection_name, query=None, projection=None, sort=None, offset=0, limit=10):
+        """
+        Busca múltiples documentos en una colección con soporte para proyección, orden y paginación.
+
+        :param collection_name: Nombre de la colección donde buscar
+        :param query: Diccionario de búsqueda (filtro)
+        :param projection: Diccionario de proyección para campos específicos
+        :param sort: Lista de criterios de ordenamiento [(campo, orden), ...]
+        :param offset: Número de documentos a saltar (paginación)
+        :param limit: Número máximo de documentos a devolver
+        :return: Lista de documentos encontrados
+        """
+        try:
+            collection = cls.get_collection(collection_name)
+            cursor = collection.find(query or {}, projection)
+
+            if sort:
+                cursor = cursor.sort(sort)
+
+            if offset:
+                cursor = cursor.skip(offset)
+
+            if limit:
+                cursor = cursor.limit(limit)
+
+            return [DocumentSerializer.to_json_document(d) async for d in cursor]
+
+        except Exception as e:
+            logger.error(f"Error al buscar documentos: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def query_document(cls, collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, id_list=None, hasDate=False):
+        """Realizar query según los parámetros."""
+        collection = cls.get_collection(collection_name)
+        try:
+            if id_list:
+                document_query['_id'] = {"$in": id_list}
+
+            logger.warning(f"Query para la colección '{collection_name}': {document_query}")
+
+            documents = collection.find(document_query, projection)
+
+            if sort_criteria:
+                documents = documents.sort(sort_criteria)
+            if skip > 0:
+                documents = documents.skip(skip)
+            if limit > 0:
+                documents = documents.limit(limit)
+
+            return [cls._to_json_document(d, hasDate) async for d in documents]
+        except Exception as e:
+            logger.error(f"Error al realizar la consulta: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def _bulk_write(cls, collection_name, operations, indexes, results):
+        """Ejecutar operaciones sin orden y marcar como fallidas las que el servidor rechace."""
+        if not operations:
+            return
+        collection = cls.get_collection(collection_name)
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except errors.BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                item = results[indexes[error["index"]]]
+                item["status"] = 409 if error.get("code") == 11000 else 400
+                item["detail"] = error.get("errmsg")
+            logger.warning(f"Escritura masiva en '{collection_name}' con {len(e.details.get('writeErrors', []))} errores.")
+        finally:
+            CountCache.invalidate(collection_name)
+
+    @classmethod
+    @timed
+    async def _existing_ids(cls, collection_name, object_ids):
+        """Devolver el conjunto de IDs que existen en la colección, en una sola consulta."""
+        collection = cls.get_collection(collection_name)
+        cursor = collection.find({"_id": {"$in": object_ids}}, {"_id": 1})
+        return {d["_id"] async for d in cursor}
+
+    @classmethod
+    @timed
+    async def create_documents(cls, collection_name, documents):
+        """Crear varios documentos con una escritura masiva y devolver el resultado de cada uno."""
+        results = []
+        operations = []
+        for document in documents:
+            document["_id"] = ObjectId()
+            results.append({"_id": str(document["_id"]), "status": 201})
+            operations.append(InsertOne(document))
+
+        await cls._bulk_write(collection_name, operations, list(range(len(operations))), results)
+        logger.info(f"Escritura masiva en '{collection_name}': {len(documents)} documentos enviados.")
+        return results
+
+    @classmethod
+    @timed
+    async def update_documents_id(cls, collection_name, updates):
+        """
+        Actualizar varios documentos con una escritura masiva.
+
+        :param updates: Lista de tuplas (ID, campos a actualizar)
+        :return: Resultado de cada actualización, en el mismo orden
+        """
+        results = [{"_id": document_id, "status": 200} for document_id, _ in updates]
+        valid = [(i, ObjectId(document_id), fields) for i, (document_id, fields) in enumerate(updates)
+                 if cls.is_valid_objectid(document_id)]
+        existing = await cls._existing_ids(collection_name, [oid for _, oid, _ in valid])
+
+        operations, indexes = [], []
+        for i, (document_id, fields) in enumerate(updates):
+            if not cls.is_valid_objectid(document_id):
+                results[i].update(status=400, detail="El ID proporcionado no es válido.")
+            elif not fields:
+                results[i].update(status=422, detail="No se ha especificado ningún campo.")
+        for i, oid, fields in valid:
+            if results[i]["status"] != 200:
+                continue
+            if oid not in existing:
+                results[i].update(status=404, detail="Documento no encontrado.")
+                continue
+            operations.append(UpdateOne({"_id": oid}, {"$set": fields}))
+            indexes.append(i)
+
+        await cls._bulk_write(collection_name, operations, indexes, results)
+        for i in indexes:
+            DocumentCache.invalidate(collection_name, ObjectId(results[i]["_id"]))
+        return results
+
+    @classmethod
+    @timed
+    async def delete_documents_id(cls, collection_name, document_ids):
+        """Eliminar varios documentos por su ID con una escritura masiva."""
+        results = [{"_id": document_id, "status": 200} for document_id in document_ids]
+        valid = [(i, ObjectId(document_id)) for i, document_id in enumerate(document_ids)
+                 if cls.is_valid_objectid(document_id)]
+        existing = await cls._existing_ids(collection_name, [oid for _, oid in valid])
+
+        operations, indexes = [], []
+        for i, document_id in enumerate(document_ids):
+            if not cls.is_valid_objectid(document_id):
+                results[i].update(status=400, detail="El ID proporcionado no es válido.")
+        for i, oid in valid:
+            if oid not in existing:
+                results[i].update(status=404, detail="Documento no encontrado.")
+                continue
+            operations.append(DeleteOne({"_id": oid}))
+            indexes.append(i)
+
+        await cls._bulk_write(collection_name, operations, indexes, results)
+        for i in indexes:
+            DocumentCache.invalidate(collection_name, ObjectId(results[i]["_id"]))
+        return results
+
+    @classmethod
+    def encode_cursor(cls, sort_criteria, document):
+        """Codificar en un cursor opaco los valores de ordenación del último documento de la página."""
+        payload = {
+            "s": [[field, direction] for field, direction in sort_criteria],
+            "v": [document.get(field) for field, _ in sort_criteria],
+        }
+        return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode_cursor(cls, cursor, sort_criteria):
+        """Decodificar un cursor y comprobar que se generó con los mismos criterios de ordenación."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+            if [tuple(s) for s in payload["s"]] != list(sort_criteria):
+                raise ValueError("El cursor no corresponde a la ordenación solicitada.")
+            return payload["v"]
+        except ValueError:
+            raise
+        except Exception:
+            raise ValueError("El cursor proporcionado no es válido.")
+
+    @classmethod
+    def build_keyset_query(cls, sort_criteria, values):
+        """
+        Construir el filtro de rango que devuelve los documentos posteriores a los valores dados.
+
+        Un campo nulo o ausente se guarda en el cursor como None, y {campo: {$gt: None}} no devuelve nada en
+        MongoDB. Como los nulos van antes que cualquier otro valor, en orden ascendente después de un nulo
+        vienen los no nulos ($ne: None) y en descendente no viene nada; y después de un valor no nulo, en
+        descendente, también vienen los nulos. La igualdad {campo: None} cubre los nulos y los ausentes.
+        """
+        branches = []
+        for i, (field, direction) in enumerate(sort_criteria):
+            branch = {sort_criteria[j][0]: values[j] for j in range(i)}
+            if values[i] is None:
+                if direction != 1:
+                    continue
+                branch[field] = {"$ne": None}
+            elif direction == 1:
+                branch[field] = {"$gt": values[i]}
+            else:
+                branch["$or"] = [{field: {"$lt": values[i]}}, {field: None}]
+            branches.append(branch)
+        return branches[0] if len(branches) == 1 else {"$or": branches}
+
+    @classmethod
+    @timed
+    async def query_document_after(cls, collection_name, document_query, projection=None, sort_criteria=None, after=None, limit=10, hasDate=False):
+        """
+        Paginar una consulta por rango (keyset) en lugar de con skip.
+
+        La ordenación se completa siempre con '_id' para que sea total, y la página siguiente se pide
+        con el cursor devuelto, de modo que el coste de cada página no depende de su posición.
+        :return: Tupla (documentos, cursor de la página siguiente o None)
+        """
+        collection = cls.get_collection(collection_name)
+        sort_criteria = [s for s in (sort_criteria or []) if s[0] != "_id"] + [("_id", 1)]
+        try:
+            query = dict(document_query)
+            if after:
+                keyset = cls.build_keyset_query(sort_criteria, cls.decode_cursor(after, sort_criteria))
+                query = {"$and": [query, keyset]} if query else keyset
+
+            extra_fields = []
+            if projection:
+                projection = dict(projection)
+                for field, _ in sort_criteria:
+                    if field not in projection:
+                        projection[field] = 1
+                        extra_fields.append(field)
+
+            documents = await collection.find(query, projection).sort(sort_criteria).limit(limit + 1).to_list()
+
+            next_cursor = None
+            if len(documents) > limit:
+                documents = documents[:limit]
+                next_cursor = cls.encode_cursor(sort_criteria, documents[-1])
+
+            for d in documents:
+                for field in extra_fields:
+                    d.pop(field, None)
+            return [cls._to_json_document(d, hasDate) for d in documents], next_cursor
+        except ValueError:
+            raise
+        except Exception as e:
+            logger.error(f"Error al realizar la consulta paginada: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def stream_documents(cls, collection_name, document_query, projection=None, sort_criteria=None, skip=0, limit=0, hasDate=False):
+        """
+        Recorrer una consulta documento a documento sin cargar el resultado completo en memoria.
+
+        El cursor pide los documentos al servidor en lotes de MONGO_STREAM_BATCH_SIZE (por defecto 500).
+        """
+        collection = cls.get_collection(collection_name)
+        cursor = collection.find(document_query, projection, batch_size=int(os.getenv('MONGO_STREAM_BATCH_SIZE', 500)))
+        if sort_criteria:
+            cursor = cursor.sort(sort_criteria)
+        if skip > 0:
+            cursor = cursor.skip(skip)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        try:
+            async for d in cursor:
+                yield cls._to_json_document(d, hasDate)
+        finally:
+            await cursor.close()
+
+    @classmethod
+    def _to_json_document(cls, d, hasDate=False):
+        """Convertir un documento de MongoDB en un diccionario serializable (fechas en ISO 8601)."""
+        return DocumentSerializer.to_json_document(d, hasDate)
+
+    @classmethod
+    @timed
+    async def update_document_operators(cls, collection_name, document_id, update, condition=None, projection=None):
+        """
+        Aplicar de forma atómica una actualización con operadores ($inc, $push, $set...) a un documento.
+
+        :param update: Documento de actualización de MongoDB
+        :param condition: Filtro adicional que debe cumplir el documento (p. ej. para comparar y actualizar)
+        :param projection: Campos del documento actualizado a devolver
+        :return: Documento tras la actualización, o None si ningún documento cumple el filtro
+        """
+        collection = cls.get_collection(collection_name)
+        try:
+            updated_document = await collection.find_one_and_update(
+                {"_id": ObjectId(document_id), **(condition or {})},
+                update,
+                projection=projection,
+                return_document=True
+            )
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+            if updated_document is not None:
+                DocumentSerializer.to_json_document(updated_document)
+            return updated_document
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar el documento: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def update_document_id(cls, collection_name, document_id, updated_fields, hasDate = False):
+        """Actualizar un documento existente a partir de su ID y devolver el documento actualizado."""
+        collection = cls.get_collection(collection_name)
+        try:
+            updated_document = await collection.find_one_and_update(
+                {"_id": ObjectId(document_id)},
+                {"$set": updated_fields},
+                return_document=True
+            )
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+
+            if updated_document is None:
+                logger.warning(f"No se encontró el documento con ID {document_id} para actualizar.")
+            else:
+                DocumentSerializer.to_json_document(updated_document, hasDate, DocumentSerializer.DATE_FORMAT)
+                logger.info(f"Documento con ID {document_id} actualizado.")
+
+            return updated_document
+
+        except errors.PyMongoError as e:
+            logger.error(f"Error al actualizar el documento: {e}")
+            raise
+
+    @classmethod
+    @timed
+    async def delete_document_id(cls, collection_name, document_id):
+        """Eliminar un documento por su ID."""
+        collection = cls.get_collection(collection_name)
+        try:
+            result = await collection.delete_one({"_id": ObjectId(document_id)})
+            DocumentCache.invalidate(collection_name, ObjectId(document_id))
+            CountCache.invalidate(collection_name)
+            if result.deleted_count == 0:
+                logger.warning(f"No se encontró el documento con ID {document_id} para eliminar.")
+            else:
+                logger.info(f"Documento con ID {document_id} eliminado.")
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"ID de documento no válido: {e}")
+            raise
+
+    @classmethod
+    async def close_connection(cls):
+        """Cerrar el pool de conexiones a la base de datos."""
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
+            cls._db = None
+            logger.info("Conexión asíncrona a la base de datos cerrada.")
+
+    @classmethod
+    def is_valid_objectid(cls, id: str) -> bool:
+        try:
+            ObjectId(id)
+            return True
+        except Exception:
+            return False
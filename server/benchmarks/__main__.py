@@ -0,0 +1,97 @@
+"""
+Ejecutar todos los benchmarks y guardar el resultado en JSON.
+
+Siembra los datos (benchmarks.seed), lanza la carga sobre todos los endpoints (benchmarks.load) y los
+microbenchmarks (benchmarks.bench_utils y benchmarks.bench_serializer). El fichero incluye el commit, la
+versión de Python y los parámetros, para comparar ejecuciones; con --baseline se muestran las diferencias
+con una ejecución anterior.
+
+Uso (desde server/, con URI apuntando a una base de datos de pruebas):
+    python -m benchmarks --drop [--duration 30] [--concurrency 32] [--output resultado.json] [--baseline anterior.json]
+Con DB_BACKEND=memory se ejecuta sin servidor de MongoDB, sobre el motor en memoria de memory_db.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from async_db_connection import AsyncDatabaseConnection
+from benchmarks import bench_serializer, bench_utils, load, seed
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline):
+    """Mostrar la variación de p50/p95/p99 y rps por escenario, y de los microbenchmarks, frente a 'baseline'."""
+    def change(new, old):
+        if new is None or not old:
+            return "    -"
+        return f"{(new - old) / old * 100:+6.1f}%"
+
+    print(f"\nFrente a {baseline.get('commit')} ({baseline.get('createdAt')}):")
+    old_scenarios = baseline.get("load", {}).get("scenarios", {})
+    for name, r in results.get("load", {}).get("scenarios", {}).items():
+        old = old_scenarios.get(name)
+        if old and r["requests"]:
+            print(f"{name:<34} rps {change(r['rps'], old['rps'])}  p50 {change(r['p50_ms'], old['p50_ms'])}"
+                  f"  p95 {change(r['p95_ms'], old['p95_ms'])}  p99 {change(r['p99_ms'], old['p99_ms'])}")
+    old_micro = baseline.get("micro", {})
+    for name, value in results.get("micro", {}).items():
+        if name in old_micro:
+            print(f"{name:<40} {change(value, old_micro[name])}")
+
+async def run_load(args):
+    try:
+        seeded = await seed.seed(args.paises, args.users, args.images, args.reviews, args.seed, args.drop)
+        return seeded["counts"], await load.main(args, seeded)
+    finally:
+        await AsyncDatabaseConnection.close_connection()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    seed.add_arguments(parser)
+    load.add_arguments(parser)
+    parser.add_argument("--skip-load", action="store_true", help="Solo los microbenchmarks (no necesita base de datos)")
+    parser.add_argument("--skip-micro", action="store_true", help="Solo la carga")
+    parser.add_argument("--output", default=None, help="Fichero JSON (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--baseline", default=None, help="Resultado anterior con el que comparar")
+    args = parser.parse_args()
+
+    results = {
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": vars(args),
+    }
+
+    if not args.skip_load:
+        results["dataset"], results["load"] = asyncio.run(run_load(args))
+        load.print_report(results["load"])
+    if not args.skip_micro:
+        results["micro"] = bench_utils.run()
+        results["serializer"] = bench_serializer.run()
+        for name, value in results["micro"].items():
+            print(f"{name:<40}{value:>10.3f} µs")
+        print(f"{'serializer (legacy -> fast)':<40}{results['serializer']['legacy']:>10.3f} -> {results['serializer']['fast']:.3f} µs/doc")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
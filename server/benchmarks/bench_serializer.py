@@ -0,0 +1,71 @@
+"""
+Microbenchmark de la serialización de documentos.
+
+Compara la ruta anterior (copia del diccionario, binary.hex() del ObjectId y json de la biblioteca estándar)
+con DocumentSerializer + orjson, y muestra el coste por documento.
+
+Uso (desde server/): python -m benchmarks.bench_serializer [--docs 10000] [--repeat 5]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from serializers import DocumentSerializer
+
+def make_documents(count):
+    """Generar documentos con la forma de los de la colección 'image'."""
+    now = datetime.now()
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"imagen_{i}.jpg",
+            "ownerId": random.randint(1, 10),
+            "url": f"https://res.cloudinary.com/demo/image/upload/v1234567890/imagen_{i}.jpg",
+            "timestamp": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+def legacy(documents):
+    converted = [
+        {
+            **d,
+            '_id': d['_id'].binary.hex(),
+            'timestamp': d['timestamp'].isoformat() if isinstance(d.get('timestamp'), datetime) else d.get('timestamp')
+        }
+        for d in documents
+    ]
+    return json.dumps(converted, ensure_ascii=False).encode("utf-8")
+
+def fast(documents):
+    return DocumentSerializer.dumps([DocumentSerializer.to_json_document(d, True) for d in documents])
+
+def measure(function, count, repeat):
+    """Devolver el mejor tiempo por documento (en microsegundos) de varias repeticiones."""
+    best = float("inf")
+    for _ in range(repeat):
+        documents = make_documents(count)
+        start = time.perf_counter()
+        function(documents)
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+def run(count=10000, repeat=5):
+    results = {name: measure(function, count, repeat) for name, function in (("legacy", legacy), ("fast", fast))}
+    results["speedup"] = results["legacy"] / results["fast"]
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.docs, args.repeat)
+    print(f"legacy: {results['legacy']:.2f} µs/doc")
+    print(f"fast:   {results['fast']:.2f} µs/doc")
+    print(f"x{results['speedup']:.1f}")
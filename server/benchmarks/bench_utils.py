@@ -0,0 +1,77 @@
+"""
+Microbenchmarks de los conversores de AsyncDatabaseConnection y de los constructores de APIUtils.
+
+Mide el coste por llamada, sin base de datos, de lo que cada petición ejecuta antes y después de la
+consulta: proyecciones, ordenación, IDs, cursores de paginación, conversión de documentos, ETags y
+respuestas condicionales.
+
+Uso (desde server/): python -m benchmarks.bench_utils [--number 20000] [--repeat 5]
+"""
+import argparse
+import time
+
+from starlette.requests import Request
+
+from api_utils import APIUtils
+from async_db_connection import AsyncDatabaseConnection
+from benchmarks.seed import make_dataset
+
+def request_with(headers=None):
+    """Petición ASGI mínima para los métodos de APIUtils que leen cabeceras."""
+    raw = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": raw})
+
+def measure(function, number, repeat):
+    """Devolver el mejor tiempo por llamada (en microsegundos) de varias repeticiones."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+def cases():
+    """Casos a medir: nombre -> función sin argumentos."""
+    dataset = make_dataset(paises=100, users=100, images=100, reviews=5)
+    user, pais, image = dataset["user"][0], dataset["paises"][0], dataset["image"][0]
+    page = dataset["paises"][:50]
+    ids = ",".join(str(d["_id"]) for d in dataset["user"][:50])
+    sort_criteria = [("nombre", 1), ("_id", 1)]
+    cursor = AsyncDatabaseConnection.encode_cursor(sort_criteria, pais)
+    body = APIUtils.conditional_response(request_with(), page).body
+    etag = APIUtils.etag(body)
+    fresh = request_with({"If-None-Match": etag})
+    stale = request_with({"If-None-Match": '"otra"'})
+    results = [{"status": 200 if i % 10 else 409} for i in range(100)]
+
+    # _to_json_document modifica el documento: la copia hace de diccionario nuevo que entrega el cursor
+    return {
+        "db.to_json_document(user)": lambda: AsyncDatabaseConnection._to_json_document(dict(user)),
+        "db.to_json_document(image, hasDate)": lambda: AsyncDatabaseConnection._to_json_document(dict(image), True),
+        "db.encode_cursor": lambda: AsyncDatabaseConnection.encode_cursor(sort_criteria, pais),
+        "db.decode_cursor": lambda: AsyncDatabaseConnection.decode_cursor(cursor, sort_criteria),
+        "db.build_keyset_query": lambda: AsyncDatabaseConnection.build_keyset_query(sort_criteria, [pais["nombre"], pais["_id"]]),
+        "db.is_valid_objectid": lambda: AsyncDatabaseConnection.is_valid_objectid(str(user["_id"])),
+        "api.build_projection": lambda: APIUtils.build_projection("nombre,email,lat,lon"),
+        "api.build_sort_criteria": lambda: APIUtils.build_sort_criteria("nombre,email"),
+        "api.add_regex": lambda: APIUtils.add_regex({}, "name", "Nombre1"),
+        "api.parse_ids(50)": lambda: APIUtils.parse_ids(ids),
+        "api.batch_content(100)": lambda: APIUtils.batch_content(results),
+        "api.etag(50 paises)": lambda: APIUtils.etag(body),
+        "api.conditional_response(50 paises)": lambda: APIUtils.conditional_response(stale, page),
+        "api.conditional_response(304)": lambda: APIUtils.conditional_response(fresh, page),
+    }
+
+def run(number=20000, repeat=5):
+    """Devolver microsegundos por llamada de cada caso."""
+    return {name: round(measure(function, number, repeat), 3) for name, function in cases().items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, value in run(args.number, args.repeat).items():
+        print(f"{name:<40}{value:>10.3f} µs")
@@ -0,0 +1,205 @@
+"""
+Generador de carga asíncrono para la API.
+
+Lanza --concurrency clientes que recorren en bucle los escenarios (uno o varios por endpoint de app.py)
+durante --duration segundos y mide, por escenario, peticiones por segundo y latencias p50/p95/p99.
+Sin --url la aplicación se ejecuta en el mismo proceso con httpx.ASGITransport (sin red ni uvicorn), así
+que las latencias son las de la aplicación y la base de datos; con --url se mide un servidor desplegado.
+
+Las subidas de ficheros (POST /media, /media/uploads) y los borrados no se incluyen: dependen del almacén
+de imágenes o destruyen los datos sembrados.
+
+Se ejecuta desde python -m benchmarks, que siembra antes los datos de los escenarios.
+"""
+import asyncio
+import itertools
+import math
+import os
+import random
+import time
+from collections import Counter
+
+import httpx
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+API = "/api/v1"
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano de una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def memory_usage():
+    """Memoria del proceso en MB: residente actual (Linux) y pico (getrusage)."""
+    usage = {}
+    try:
+        with open("/proc/self/statm") as f:
+            usage["rss_mb"] = round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["peak_rss_mb"] = round(peak / (2 ** 20 if os.uname().sysname == "Darwin" else 2 ** 10), 1)
+    return usage
+
+def build_scenarios(seeded, rng):
+    """
+    Escenarios de carga: (nombre, método, función que devuelve (ruta, cuerpo JSON o None)).
+
+    Las rutas se eligen al azar entre los documentos sembrados, así que se mezclan aciertos y fallos de
+    las cachés como en producción.
+    """
+    pick = rng.choice
+    ids = lambda key, n: ",".join(rng.sample(seeded[key], min(n, len(seeded[key]))))
+    counter = itertools.count()
+
+    def profile():
+        # UserCreate y UserUpdate exigen todos sus campos de texto
+        n = next(counter)
+        return {"email": f"carga{n}@example.com", "name": "Carga", "surname": "Prueba", "description": f"Carga {n}",
+                "profilePicture": f"https://example.com/profile/carga{n}.jpg"}
+
+    def bbox():
+        lon, lat = rng.uniform(-170, 150), rng.uniform(-55, 50)
+        return f"{lon:.4f},{lat:.4f},{lon + 20:.4f},{lat + 15:.4f}"
+
+    return [
+        ("GET /paises", "GET", lambda: (f"{API}/paises?limit=50", None)),
+        ("GET /paises?offset", "GET", lambda: (f"{API}/paises?offset={rng.randrange(0, 500)}&limit=20&sort=nombre", None)),
+        ("GET /paises?fields", "GET", lambda: (f"{API}/paises?limit=100&fields=nombre,lat,lon", None)),
+        ("GET /paises?bbox", "GET", lambda: (f"{API}/paises?bbox={bbox()}&limit=100", None)),
+        ("GET /paises?ids", "GET", lambda: (f"{API}/paises?ids={ids('paises', 20)}", None)),
+        ("GET /paises/email/{email}", "GET", lambda: (f"{API}/paises/email/{pick(seeded['emails'])}", None)),
+        ("GET /paises/geocode", "GET", lambda: (f"{API}/paises/geocode?q={pick(['Madrid', 'Paris', 'Lima', 'Tokyo', 'Roma'])}", None)),
+        ("GET /paises/clusters", "GET", lambda: (f"{API}/paises/clusters?zoom={rng.randint(0, 8)}", None)),
+        ("GET /paises/near", "GET", lambda: (f"{API}/paises/near?lat={rng.uniform(-50, 60):.4f}&lon={rng.uniform(-170, 170):.4f}&radius=500000", None)),
+        ("GET /paises/{id}", "GET", lambda: (f"{API}/paises/{pick(seeded['paises'])}", None)),
+        ("POST /paises:lookup", "POST", lambda: (f"{API}/paises:lookup", {"ids": ids("paises", 50).split(",")})),
+        ("POST /paises", "POST", lambda: (f"{API}/paises", {"nombre": f"Carga {next(counter)}", "email": pick(seeded["emails"]),
+                                                           "lat": rng.uniform(-60, 70), "lon": rng.uniform(-180, 180), "imagen": ""})),
+        ("PUT /paises/{id}", "PUT", lambda: (f"{API}/paises/{pick(seeded['paises'])}", {"imagen": f"https://example.com/{next(counter)}.jpg"})),
+        ("GET /users", "GET", lambda: (f"{API}/users?limit=50", None)),
+        ("GET /users?userName", "GET", lambda: (f"{API}/users?userName={pick(seeded['userNames'])}", None)),
+        ("GET /users?ids", "GET", lambda: (f"{API}/users?ids={ids('users', 20)}", None)),
+        ("GET /users/username-available", "GET", lambda: (f"{API}/users/username-available?userName=libre_{rng.randrange(10 ** 9)}", None)),
+        ("GET /users/{id}", "GET", lambda: (f"{API}/users/{pick(seeded['users'])}", None)),
+        ("GET /users/{id}/profile", "GET", lambda: (f"{API}/users/{pick(seeded['users'])}/profile", None)),
+        ("GET /users/{id}/review-average", "GET", lambda: (f"{API}/users/{pick(seeded['users'])}/review-average", None)),
+        ("GET /users/oauth/{oauthId}", "GET", lambda: (f"{API}/users/oauth/{pick(seeded['oauthIds'])}", None)),
+        ("POST /users:lookup", "POST", lambda: (f"{API}/users:lookup", {"ids": ids("users", 50).split(",")})),
+        ("POST /users/{id}/review", "POST", lambda: (f"{API}/users/{pick(seeded['users'])}/review",
+                                                     {"user": pick(seeded["users"]), "rating": rng.randint(1, 5)})),
+        ("PUT /users/{id}", "PUT", lambda: (f"{API}/users/{pick(seeded['users'])}", {**profile(), "description": f"Editado {next(counter)}"})),
+        ("POST /users", "POST", lambda: (f"{API}/users", {**profile(), "userName": f"carga_{os.getpid()}_{next(counter)}",
+                                                          "oauthId": f"carga-{next(counter)}", "oauthProvider": "google", "oauthToken": "x"})),
+        ("GET /media", "GET", lambda: (f"{API}/media?limit=50", None)),
+        ("GET /media?ids", "GET", lambda: (f"{API}/media?ids={ids('images', 20)}", None)),
+        ("GET /media/{id}", "GET", lambda: (f"{API}/media/{pick(seeded['images'])}", None)),
+        ("POST /media:lookup", "POST", lambda: (f"{API}/media:lookup", {"ids": ids("images", 50).split(",")})),
+        ("GET /metrics", "GET", lambda: ("/metrics", None)),
+    ]
+
+async def run_load(client, scenarios, duration=30.0, concurrency=32, only=None):
+    """
+    Ejecutar los escenarios durante 'duration' segundos con 'concurrency' clientes simultáneos.
+
+    :param only: Nombres de escenarios a ejecutar (por defecto todos)
+    :return: Resultados por escenario y totales
+    """
+    if only:
+        scenarios = [s for s in scenarios if s[0] in only]
+    latencies = {name: [] for name, _, _ in scenarios}
+    statuses = {name: Counter() for name, _, _ in scenarios}
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        # Cada cliente empieza en un escenario distinto para repartir la carga desde el primer segundo
+        for name, method, build in itertools.islice(itertools.cycle(scenarios), offset, None):
+            if time.perf_counter() >= deadline:
+                return
+            path, body = build()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers={"Accept": "application/json"})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[name].append(time.perf_counter() - start)
+            statuses[name][str(status)] += 1
+
+    memory_before = memory_usage()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i % len(scenarios)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name, values in latencies.items():
+        values.sort()
+        errors = sum(count for status, count in statuses[name].items() if not status.isdigit() or int(status) >= 500)
+        results[name] = {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3) if values else None,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3) if values else None,
+            "statuses": dict(statuses[name]),
+        }
+
+    every = sorted(v for values in latencies.values() for v in values)
+    total = {
+        "requests": len(every),
+        "errors": sum(r["errors"] for r in results.values()),
+        "rps": round(len(every) / elapsed, 2),
+        "p50_ms": round(percentile(every, 0.50) * 1000, 3) if every else None,
+        "p95_ms": round(percentile(every, 0.95) * 1000, 3) if every else None,
+        "p99_ms": round(percentile(every, 0.99) * 1000, 3) if every else None,
+        "duration_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        "memory_before": memory_before,
+        "memory_after": memory_usage(),
+    }
+    return {"scenarios": results, "total": total}
+
+def client_for(url=None, app=None):
+    """Cliente httpx contra un servidor (url) o contra la aplicación en el mismo proceso."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=30)
+
+def print_report(results):
+    print(f"{'escenario':<34}{'req':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results["scenarios"].items():
+        if r["requests"]:
+            print(f"{name:<34}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+    t = results["total"]
+    print(f"{'TOTAL':<34}{t['requests']:>8}{t['errors']:>6}{t['rps']:>10}{t['p50_ms']:>10}{t['p95_ms']:>10}{t['p99_ms']:>10}")
+    print(f"memoria: {t['memory_before']} -> {t['memory_after']}")
+
+def add_arguments(parser):
+    parser.add_argument("--duration", type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clientes simultáneos")
+    parser.add_argument("--url", default=None, help="Servidor a medir (por defecto, la aplicación en este proceso)")
+    parser.add_argument("--only", action="append", help="Ejecutar solo este escenario (se puede repetir)")
+    parser.add_argument("--random-seed", type=int, default=7, help="Semilla de la elección de documentos")
+
+async def main(args, seeded):
+    """Ejecutar la carga contra la aplicación local (con su lifespan) o contra --url."""
+    scenarios = build_scenarios(seeded, random.Random(args.random_seed))
+    if args.url:
+        async with client_for(args.url) as client:
+            return await run_load(client, scenarios, args.duration, args.concurrency, args.only)
+
+    from app import app
+    async with app.router.lifespan_context(app):
+        async with client_for(app=app) as client:
+            return await run_load(client, scenarios, args.duration, args.concurrency, args.only)
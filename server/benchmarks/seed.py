@@ -0,0 +1,137 @@
+"""
+Datos de prueba para los benchmarks.
+
+Genera países, usuarios con reviews e imágenes de forma reproducible (misma semilla, mismos documentos y
+mismos IDs) y los inserta en la base de datos configurada en URI. Con --drop vacía antes las colecciones
+'paises', 'user' e 'image': úsese solo contra una base de datos de pruebas.
+
+Uso (desde server/): python -m benchmarks.seed [--paises 5000] [--users 1000] [--images 2000] [--reviews 5] [--drop]
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from async_db_connection import AsyncDatabaseConnection
+from db_indexes import IndexRegistry
+from document_cache import DocumentCache, CountCache
+from geo_utils import GeoUtils
+
+COLLECTIONS = ("paises", "user", "image")
+INSERT_BATCH = 1000
+
+def make_users(rng, count, reviews):
+    """Usuarios con 'reviews' valoraciones de otros usuarios y los agregados ratingSum/ratingCount."""
+    users = [
+        {
+            "_id": ObjectId(rng.randbytes(12)),
+            "email": f"usuario{i}@example.com",
+            "name": f"Nombre{i}",
+            "surname": f"Apellido{i % 97}",
+            "description": f"Usuario de prueba número {i}",
+            "userName": f"usuario_{i}",
+            "oauthId": f"oauth-{i}",
+            "oauthProvider": "google",
+            "oauthToken": rng.randbytes(16).hex(),
+            "profilePicture": f"https://example.com/profile/{i}.jpg",
+        }
+        for i in range(count)
+    ]
+    for user in users:
+        reviewers = rng.sample(users, min(reviews, len(users) - 1)) if len(users) > 1 else []
+        user["reviews"] = [{"user": r["_id"], "rating": rng.randint(1, 5)} for r in reviewers if r is not user]
+        user["ratingSum"] = sum(r["rating"] for r in user["reviews"])
+        user["ratingCount"] = len(user["reviews"])
+    return users
+
+def make_paises(rng, count, users):
+    """Países repartidos por todo el mapa; cada uno pertenece al email de un usuario."""
+    paises = []
+    for i in range(count):
+        pais = {
+            "_id": ObjectId(rng.randbytes(12)),
+            "nombre": f"Lugar {i}",
+            "email": rng.choice(users)["email"] if users else f"usuario{i}@example.com",
+            "lat": round(rng.uniform(-60, 70), 6),
+            "lon": round(rng.uniform(-180, 180), 6),
+            "imagen": f"https://example.com/lugar/{i}.jpg",
+        }
+        paises.append(GeoUtils.add_location(pais))
+    return paises
+
+def make_images(rng, count):
+    """Imágenes con la forma de las que guarda POST /media."""
+    now = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(rng.randbytes(12)),
+            "name": f"imagen_{i}.jpg",
+            "ownerId": rng.randint(1, 50),
+            "url": f"https://example.com/media/imagen_{i}.jpg",
+            "timestamp": now - timedelta(minutes=i),
+            "sha256": rng.randbytes(32).hex(),
+        }
+        for i in range(count)
+    ]
+
+def make_dataset(paises=5000, users=1000, images=2000, reviews=5, seed=42):
+    """Generar todos los documentos con una semilla fija."""
+    rng = random.Random(seed)
+    user_documents = make_users(rng, users, reviews)
+    return {
+        "user": user_documents,
+        "paises": make_paises(rng, paises, user_documents),
+        "image": make_images(rng, images),
+    }
+
+async def seed(paises=5000, users=1000, images=2000, reviews=5, seed=42, drop=False):
+    """
+    Insertar el conjunto de datos y devolver los valores que usan los escenarios de carga.
+
+    :return: Diccionario con IDs, emails, oauthIds y nombres de usuario insertados
+    """
+    dataset = make_dataset(paises, users, images, reviews, seed)
+    for name in COLLECTIONS:
+        collection = AsyncDatabaseConnection.get_collection(name)
+        if drop:
+            await collection.drop()
+        for start in range(0, len(dataset[name]), INSERT_BATCH):
+            await collection.insert_many(dataset[name][start:start + INSERT_BATCH], ordered=False)
+    await IndexRegistry.ensure_indexes()
+    DocumentCache.clear()
+    for name in COLLECTIONS:
+        CountCache.invalidate(name)
+
+    return {
+        "paises": [str(d["_id"]) for d in dataset["paises"]],
+        "users": [str(d["_id"]) for d in dataset["user"]],
+        "images": [str(d["_id"]) for d in dataset["image"]],
+        "emails": sorted({d["email"] for d in dataset["paises"]}),
+        "oauthIds": [d["oauthId"] for d in dataset["user"]],
+        "userNames": [d["userName"] for d in dataset["user"]],
+        "counts": {name: len(dataset[name]) for name in COLLECTIONS},
+    }
+
+def add_arguments(parser):
+    parser.add_argument("--paises", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=5, help="Reviews por usuario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drop", action="store_true", help="Vaciar antes las colecciones (solo bases de datos de pruebas)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            seeded = await seed(args.paises, args.users, args.images, args.reviews, args.seed, args.drop)
+            print(", ".join(f"{name}: {count}" for name, count in seeded["counts"].items()))
+        finally:
+            await AsyncDatabaseConnection.close_connection()
+
+    asyncio.run(main())
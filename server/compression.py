@@ -0,0 +1,264 @@
+import logging
+import os
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+class _StreamEncoder:
+    """Compresor incremental con la misma interfaz para los tres formatos."""
+
+    def __init__(self, compress, flush, finish):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+class Codecs:
+    """
+    Codecs reúne los formatos de compresión disponibles y elige el que mejor encaja con la cabecera
+    Accept-Encoding del cliente.
+    Métodos de Clase:
+    - available(cls): Formatos disponibles en orden de preferencia del servidor.
+    - negotiate(cls, accept_encoding): Formato a usar o None si el cliente no acepta ninguno.
+    - compress(cls, encoding, body): Comprime un cuerpo completo.
+    - encoder(cls, encoding): Compresor incremental para respuestas en streaming.
+    Configuración (variables de entorno):
+    - COMPRESSION_PREFERENCE: Orden de preferencia (por defecto 'br,zstd,gzip'). brotli y zstd solo se usan
+      si están instalados los paquetes 'brotli' y 'zstandard'.
+    - COMPRESSION_GZIP_LEVEL (por defecto 6), COMPRESSION_BROTLI_QUALITY (por defecto 5) y
+      COMPRESSION_ZSTD_LEVEL (por defecto 3).
+    """
+
+    _gzip_level = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    _brotli_quality = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+    _zstd_level = int(os.getenv('COMPRESSION_ZSTD_LEVEL', 3))
+    _preference = [e.strip() for e in os.getenv('COMPRESSION_PREFERENCE', 'br,zstd,gzip').split(",") if e.strip()]
+
+    @classmethod
+    def available(cls):
+        """Devolver los formatos que se pueden usar, en orden de preferencia."""
+        installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+        return [e for e in cls._preference if installed.get(e)]
+
+    @classmethod
+    def negotiate(cls, accept_encoding: str):
+        """
+        Elegir el formato con mayor peso 'q' en Accept-Encoding; a igual peso decide la preferencia del servidor.
+        Un formato con q=0 queda excluido aunque '*' lo acepte.
+        """
+        weights = {}
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            name = name.strip().lower()
+            if not name:
+                continue
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[name] = q
+
+        best, best_q = None, 0.0
+        for encoding in cls.available():
+            q = weights.get(encoding, weights.get("*", 0.0))
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    @classmethod
+    def compress(cls, encoding: str, body: bytes) -> bytes:
+        """Comprimir un cuerpo completo."""
+        if encoding == "br":
+            return brotli.compress(body, quality=cls._brotli_quality)
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=cls._zstd_level).compress(body)
+        compressor = zlib.compressobj(cls._gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+
+    @classmethod
+    def encoder(cls, encoding: str) -> _StreamEncoder:
+        """
+        Crear un compresor incremental. flush() devuelve lo pendiente de lo ya comprimido para que el cliente
+        pueda descomprimirlo sin esperar al siguiente bloque; finish() devuelve los últimos bytes.
+        """
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=cls._brotli_quality)
+            return _StreamEncoder(compressor.process, compressor.flush, compressor.finish)
+        if encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=cls._zstd_level).compressobj()
+            return _StreamEncoder(compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                                  compressor.flush)
+        compressor = zlib.compressobj(cls._gzip_level, zlib.DEFLATED, 31)
+        return _StreamEncoder(compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+class CompressedCache:
+    """
+    CompressedCache guarda los cuerpos ya comprimidos de las respuestas con ETag. La ETag fuerte es un hash
+    del cuerpo sin comprimir, así que (ETag, formato) identifica el contenido comprimido aunque lo devuelvan
+    URLs distintas, y una respuesta repetida se comprime una sola vez.
+    Métodos de Clase:
+    - get(cls, etag, encoding): Devuelve el cuerpo comprimido o None.
+    - put(cls, etag, encoding, body): Guarda un cuerpo comprimido.
+    - clear(cls): Vacía la caché.
+    - stats(cls): Contadores de aciertos, fallos, expulsiones y tamaño.
+    Configuración (variables de entorno):
+    - COMPRESSION_CACHE_MAX_BYTES: Tamaño máximo de la caché (por defecto 32 MB; 0 la desactiva).
+    - COMPRESSION_CACHE_MAX_ITEM_BYTES: Cuerpos comprimidos mayores no se guardan (por defecto 1 MB).
+    """
+
+    _max_bytes = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    _max_item_bytes = int(os.getenv('COMPRESSION_CACHE_MAX_ITEM_BYTES', 1024 * 1024))
+
+    _entries = OrderedDict()
+    _size = 0
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+
+    @classmethod
+    def get(cls, etag, encoding):
+        """Devolver el cuerpo comprimido o None."""
+        body = cls._entries.get((etag, encoding))
+        if body is None:
+            cls._misses += 1
+            return None
+        cls._entries.move_to_end((etag, encoding))
+        cls._hits += 1
+        return body
+
+    @classmethod
+    def put(cls, etag, encoding, body):
+        """Guardar un cuerpo comprimido, expulsando los menos usados si se supera el tamaño máximo."""
+        if len(body) > min(cls._max_item_bytes, cls._max_bytes) or (etag, encoding) in cls._entries:
+            return
+        cls._entries[(etag, encoding)] = body
+        cls._size += len(body)
+        while cls._size > cls._max_bytes:
+            _, evicted = cls._entries.popitem(last=False)
+            cls._size -= len(evicted)
+            cls._evictions += 1
+
+    @classmethod
+    def clear(cls):
+        """Vaciar la caché."""
+        cls._entries.clear()
+        cls._size = 0
+
+    @classmethod
+    def stats(cls):
+        """Devolver los contadores de la caché."""
+        return {
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "evictions": cls._evictions,
+            "size": len(cls._entries),
+            "bytes": cls._size,
+            "max_bytes": cls._max_bytes,
+        }
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime las respuestas con brotli, zstd o gzip según Accept-Encoding.
+
+    - Solo se comprimen los tipos de texto (JSON, NDJSON, HTML...) y, si la respuesta es de un solo bloque,
+      cuando ocupa al menos 'minimum_size' bytes.
+    - Las respuestas con ETag se buscan antes en CompressedCache. Al comprimir, la ETag pasa a ser débil
+      (W/"..."), como hace nginx: APIUtils.is_not_modified acepta ambas formas.
+    - Las respuestas en streaming se comprimen bloque a bloque sin conocer su longitud. Cada bloque se vacía
+      del compresor al enviarlo (Z_SYNC_FLUSH, flush de brotli, FLUSH_BLOCK de zstd): si no, el compresor
+      retiene los datos y un cliente de NDJSON no recibe los documentos hasta que termina la respuesta.
+    """
+
+    _COMPRESSIBLE = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                     "application/xml", "image/svg+xml")
+
+    def __init__(self, app, minimum_size: int = 1000):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = Codecs.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "encoder": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                if state["start"] is not None:
+                    start, state["start"] = state["start"], None
+                    await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["start"] is not None:
+                start, state["start"] = state["start"], None
+                headers = MutableHeaders(raw=start["headers"])
+                if not self._compressible(start["status"], headers) or (not more_body and len(body) < self.minimum_size):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                etag = headers.get("etag")
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+
+                if not more_body:
+                    compressed = CompressedCache.get(etag, encoding) if etag else None
+                    if compressed is None:
+                        compressed = Codecs.compress(encoding, body)
+                        if etag:
+                            CompressedCache.put(etag, encoding, compressed)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                state["encoder"] = Codecs.encoder(encoding)
+                await send(start)
+
+            data = state["encoder"].compress(body)
+            if not more_body:
+                data += state["encoder"].finish()
+            elif body:
+                data += state["encoder"].flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, status: int, headers: MutableHeaders) -> bool:
+        """Comprobar si una respuesta se puede comprimir."""
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(self._COMPRESSIBLE)
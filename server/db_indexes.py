@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import logging
+
+from pymongo import ASCENDING, GEOSPHERE
+
+from async_db_connection import AsyncDatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+class IndexRegistry:
+    """
+    IndexRegistry declara los índices que necesitan las consultas de los routers y se encarga de
+    crearlos al arrancar la aplicación.
+    Métodos de Clase:
+    - ensure_indexes(cls): Crea los índices que falten y devuelve un informe con las diferencias.
+    - uncovered_queries(cls, indexes=None): Lista las consultas de los routers que no usan ningún índice.
+    - backfill_locations(cls): Añade el punto GeoJSON a los países anteriores al índice 2dsphere.
+    Atributos de Clase:
+    - INDEXES: Índices declarados por colección.
+    - QUERIES: Filtros que usa cada endpoint, por colección.
+    """
+
+    INDEXES = {
+        "paises": [
+            {"name": "email_1", "keys": [("email", ASCENDING)]},
+            {"name": "location_2dsphere", "keys": [("location", GEOSPHERE)]},
+            {"name": "lat_1_lon_1", "keys": [("lat", ASCENDING), ("lon", ASCENDING)]},
+        ],
+        "user": [
+            {"name": "userName_1", "keys": [("userName", ASCENDING)], "unique": True,
+             "partialFilterExpression": {"userName": {"$type": "string"}}},
+            {"name": "oauthId_1_oauthProvider_1", "keys": [("oauthId", ASCENDING), ("oauthProvider", ASCENDING)]},
+            {"name": "email_1", "keys": [("email", ASCENDING)]},
+        ],
+        "image": [
+            {"name": "ownerId_1_name_1", "keys": [("ownerId", ASCENDING), ("name", ASCENDING)]},
+            {"name": "name_1", "keys": [("name", ASCENDING)]},
+            {"name": "sha256_1", "keys": [("sha256", ASCENDING)], "unique": True,
+             "partialFilterExpression": {"sha256": {"$type": "string"}}},
+        ],
+        "upload_job": [
+            # Los trabajos de subida se borran solos un día después de su último cambio
+            {"name": "updatedAt_1", "keys": [("updatedAt", ASCENDING)], "expireAfterSeconds": 86400},
+        ],
+        "upload_session": [
+            # Igual que UPLOAD_SESSION_TTL_SECONDS: las sesiones sin actividad durante un día se descartan
+            {"name": "updatedAt_1", "keys": [("updatedAt", ASCENDING)], "expireAfterSeconds": 86400},
+        ],
+    }
+
+    QUERIES = [
+        {"route": "GET /paises/email/{email}", "collection": "paises", "fields": ["email"]},
+        {"route": "GET /paises?bbox=", "collection": "paises", "fields": ["lat", "lon"]},
+        {"route": "GET /paises/near", "collection": "paises", "fields": ["location"]},
+        {"route": "GET /users?userName=", "collection": "user", "fields": ["userName"]},
+        {"route": "GET /users?email=", "collection": "user", "fields": ["email"]},
+        {"route": "GET /users?name=", "collection": "user", "fields": ["name"]},
+        {"route": "GET /users?surname=", "collection": "user", "fields": ["surname"]},
+        {"route": "GET /users/oauth/{oauthId}", "collection": "user", "fields": ["oauthId"]},
+        {"route": "GET /users/oauth/{oauthId}?oauthProvider=", "collection": "user", "fields": ["oauthId", "oauthProvider"]},
+        {"route": "GET /users/username-available", "collection": "user", "fields": ["userName"]},
+        {"route": "GET /media?ownerId=", "collection": "image", "fields": ["ownerId"]},
+        {"route": "GET /media?name=", "collection": "image", "fields": ["name"]},
+        {"route": "GET /media?ownerId=&name=", "collection": "image", "fields": ["ownerId", "name"]},
+        {"route": "POST /media (duplicados)", "collection": "image", "fields": ["sha256"]},
+    ]
+
+    @classmethod
+    def _index_options(cls, spec):
+        """Opciones de un índice declarado que se comparan con las del servidor."""
+        return {k: v for k, v in spec.items() if k not in ("name", "keys")}
+
+    @classmethod
+    async def ensure_indexes(cls):
+        """Crear los índices que falten y devolver un informe con los creados y las diferencias."""
+        report = {"created": [], "drift": [], "extra": []}
+        for collection_name, specs in cls.INDEXES.items():
+            collection = AsyncDatabaseConnection.get_collection(collection_name)
+            existing = await collection.index_information()
+
+            for spec in specs:
+                options = cls._index_options(spec)
+                current = existing.get(spec["name"])
+                if current is None:
+                    await collection.create_index(spec["keys"], name=spec["name"], **options)
+                    report["created"].append(f"{collection_name}.{spec['name']}")
+                    logger.info(f"Índice {spec['name']} creado en '{collection_name}'.")
+                    continue
+
+                same_keys = [tuple(k) for k in current["key"]] == list(spec["keys"])
+                same_options = all(current.get(k) == v for k, v in options.items())
+                if not same_keys or not same_options:
+                    report["drift"].append(f"{collection_name}.{spec['name']}")
+                    logger.warning(f"El índice {spec['name']} de '{collection_name}' no coincide con el declarado.")
+
+            declared = {spec["name"] for spec in specs} | {"_id_"}
+            for name in existing:
+                if name not in declared:
+                    report["extra"].append(f"{collection_name}.{name}")
+                    logger.warning(f"El índice {name} de '{collection_name}' no está declarado en el registro.")
+        return report
+
+    @classmethod
+    def uncovered_queries(cls, indexes=None):
+        """
+        Devolver las consultas de QUERIES que no pueden resolverse con un índice.
+
+        Una consulta está cubierta si sus campos forman un prefijo de las claves de algún índice.
+        :param indexes: Diccionario {colección: [lista de claves]}; por defecto, los índices declarados.
+        """
+        if indexes is None:
+            indexes = {name: [[k for k, _ in spec["keys"]] for spec in specs] for name, specs in cls.INDEXES.items()}
+
+        uncovered = []
+        for query in cls.QUERIES:
+            fields = set(query["fields"])
+            covered = any(set(keys[:len(fields)]) == fields for keys in indexes.get(query["collection"], []))
+            if not covered:
+                uncovered.append(query)
+        return uncovered
+
+    @classmethod
+    async def backfill_locations(cls):
+        """Rellenar el campo GeoJSON 'location' de los países guardados solo con 'lat' y 'lon'."""
+        collection = AsyncDatabaseConnection.get_collection("paises")
+        result = await collection.update_many(
+            {"location": {"$exists": False}, "lat": {"$type": "number"}, "lon": {"$type": "number"}},
+            [{"$set": {"location": {"type": "Point", "coordinates": ["$lon", "$lat"]}}}]
+        )
+        logger.info(f"Campo 'location' añadido a {result.modified_count} países.")
+        return result.modified_count
+
+    @classmethod
+    async def live_indexes(cls):
+        """Leer del servidor las claves de los índices existentes en cada colección."""
+        indexes = {}
+        for collection_name in cls.INDEXES:
+            collection = AsyncDatabaseConnection.get_collection(collection_name)
+            info = await collection.index_information()
+            indexes[collection_name] = [[k for k, _ in index["key"]] for index in info.values()]
+        return indexes
+
+async def _main(args):
+    indexes = None
+    try:
+        if args.backfill_locations:
+            count = await IndexRegistry.backfill_locations()
+            print(f"Campo 'location' añadido a {count} países.")
+        if args.live:
+            indexes = await IndexRegistry.live_indexes()
+    finally:
+        await AsyncDatabaseConnection.close_connection()
+
+    uncovered = IndexRegistry.uncovered_queries(indexes)
+    if not uncovered:
+        print("Todas las consultas de los routers están cubiertas por un índice.")
+        return
+    for query in uncovered:
+        print(f"{query['route']:<45} {query['collection']:<8} {', '.join(query['fields'])}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mostrar las consultas de los routers que no están cubiertas por un índice.")
+    parser.add_argument("--live", action="store_true", help="Comprobar contra los índices existentes en la base de datos")
+    parser.add_argument("--backfill-locations", action="store_true", help="Añadir 'location' a los países que solo tienen lat/lon")
+    asyncio.run(_main(parser.parse_args()))
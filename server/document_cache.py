@@ -0,0 +1,163 @@
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from bson import json_util
+
+logger = logging.getLogger(__name__)
+
+class DocumentCache:
+    """
+    DocumentCache es una caché LRU con caducidad (TTL) para los documentos leídos por ID. Vive en memoria
+    del proceso, así que con varios workers cada uno tiene la suya: el TTL acota cuánto puede tardar un
+    worker en ver un cambio hecho por otro.
+    Métodos de Clase:
+    - get(cls, collection_name, document_id, variant): Devuelve una copia del documento o None.
+    - generation(cls, collection_name, document_id): Marca a pasar a put() para no guardar lecturas obsoletas.
+    - put(cls, collection_name, document_id, variant, document, generation): Guarda un documento.
+    - invalidate(cls, collection_name, document_id): Descarta todas las variantes de un documento.
+    - clear(cls): Vacía la caché.
+    - stats(cls): Contadores de aciertos, fallos, expulsiones y tamaño.
+    Configuración (variables de entorno):
+    - DOC_CACHE_ENABLED: 'false' desactiva la caché (por defecto 'true').
+    - DOC_CACHE_MAX_ENTRIES: Número máximo de documentos (por defecto 10000).
+    - DOC_CACHE_TTL_SECONDS: Segundos que un documento permanece en caché (por defecto 30).
+    """
+
+    _enabled = os.getenv('DOC_CACHE_ENABLED', 'true').lower() == 'true'
+    _max_entries = int(os.getenv('DOC_CACHE_MAX_ENTRIES', 10000))
+    _ttl = float(os.getenv('DOC_CACHE_TTL_SECONDS', 30))
+
+    _entries = OrderedDict()
+    _generations = {}
+    _epoch = 0
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+
+    @classmethod
+    def get(cls, collection_name, document_id, variant):
+        """
+        Devolver una copia del documento cacheado o None si no está o ha caducado.
+
+        :param variant: Clave que distingue lecturas del mismo documento (p. ej. proyección y formato de fecha)
+        """
+        if not cls._enabled:
+            return None
+        key = (collection_name, document_id)
+        entry = cls._entries.get(key)
+        if entry is None or variant not in entry["variants"]:
+            cls._misses += 1
+            return None
+        if entry["expires"] < time.monotonic():
+            del cls._entries[key]
+            cls._misses += 1
+            return None
+
+        cls._entries.move_to_end(key)
+        cls._hits += 1
+        return copy.deepcopy(entry["variants"][variant])
+
+    @classmethod
+    def generation(cls, collection_name, document_id):
+        """Devolver la generación actual del documento; cambia cada vez que se invalida."""
+        return (cls._epoch, cls._generations.get((collection_name, document_id), 0))
+
+    @classmethod
+    def put(cls, collection_name, document_id, variant, document, generation):
+        """Guardar un documento si no se ha invalidado desde que se empezó a leer."""
+        if not cls._enabled or document is None:
+            return
+        key = (collection_name, document_id)
+        if cls.generation(collection_name, document_id) != generation:
+            return
+
+        entry = cls._entries.get(key)
+        if entry is None or entry["expires"] < time.monotonic():
+            entry = {"expires": time.monotonic() + cls._ttl, "variants": {}}
+            cls._entries[key] = entry
+        entry["variants"][variant] = copy.deepcopy(document)
+        cls._entries.move_to_end(key)
+
+        while len(cls._entries) > cls._max_entries:
+            cls._entries.popitem(last=False)
+            cls._evictions += 1
+
+    @classmethod
+    def invalidate(cls, collection_name, document_id):
+        """Descartar un documento de la caché tras escribirlo."""
+        key = (collection_name, str(document_id))
+        cls._entries.pop(key, None)
+        cls._generations[key] = cls._generations.get(key, 0) + 1
+        if len(cls._generations) > cls._max_entries:
+            # Al cambiar de época las marcas anteriores dejan de ser válidas
+            cls._epoch += 1
+            cls._generations.clear()
+
+    @classmethod
+    def clear(cls):
+        """Vaciar la caché."""
+        cls._entries.clear()
+        cls._generations.clear()
+        cls._epoch += 1
+
+    @classmethod
+    def stats(cls):
+        """Devolver los contadores de la caché."""
+        return {
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "evictions": cls._evictions,
+            "size": len(cls._entries),
+            "max_entries": cls._max_entries,
+        }
+
+class CountCache:
+    """
+    CountCache guarda durante unos segundos el total de documentos que cumplen un filtro, para que las
+    cabeceras X-Total-Count de los listados no dupliquen las consultas a la base de datos.
+    Métodos de Clase:
+    - key(cls, query): Normaliza un filtro para usarlo como clave.
+    - get(cls, collection_name, key): Devuelve el total cacheado o None.
+    - put(cls, collection_name, key, count): Guarda un total.
+    - invalidate(cls, collection_name): Descarta los totales de una colección tras escribir en ella.
+    Configuración (variables de entorno):
+    - COUNT_CACHE_TTL_SECONDS: Segundos que se reutiliza un total (por defecto 5; 0 lo desactiva).
+    - COUNT_CACHE_MAX_ENTRIES: Número máximo de filtros distintos (por defecto 1000).
+    """
+
+    _ttl = float(os.getenv('COUNT_CACHE_TTL_SECONDS', 5))
+    _max_entries = int(os.getenv('COUNT_CACHE_MAX_ENTRIES', 1000))
+    _entries = OrderedDict()
+
+    @classmethod
+    def key(cls, query):
+        """Normalizar un filtro: el mismo filtro con las claves en otro orden produce la misma clave."""
+        return json_util.dumps(query or {}, sort_keys=True)
+
+    @classmethod
+    def get(cls, collection_name, key):
+        """Devolver el total cacheado o None si no está o ha caducado."""
+        entry = cls._entries.get((collection_name, key))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        cls._entries.move_to_end((collection_name, key))
+        return entry[1]
+
+    @classmethod
+    def put(cls, collection_name, key, count):
+        """Guardar un total."""
+        if cls._ttl <= 0:
+            return
+        cls._entries[(collection_name, key)] = (time.monotonic() + cls._ttl, count)
+        cls._entries.move_to_end((collection_name, key))
+        while len(cls._entries) > cls._max_entries:
+            cls._entries.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, collection_name):
+        """Descartar los totales de una colección."""
+        for key in [k for k in cls._entries if k[0] == collection_name]:
+            del cls._entries[key]
@@ -0,0 +1,68 @@
+from typing import Optional, Dict, Tuple
+from fastapi import HTTPException
+
+class GeoUtils:
+    """
+    GeoUtils agrupa las utilidades geoespaciales de los países: el campo GeoJSON 'location' que indexa el
+    índice 2dsphere (consultas por cercanía) y el filtro por área visible, que usa 'lat' y 'lon'.
+    """
+
+    @classmethod
+    def build_location(cls, lat: Optional[float], lon: Optional[float]) -> Optional[dict]:
+        """Construir un punto GeoJSON. MongoDB espera las coordenadas en orden [lon, lat]."""
+        if lat is None or lon is None:
+            return None
+        return {"type": "Point", "coordinates": [lon, lat]}
+
+    @classmethod
+    def add_location(cls, document: Dict) -> Dict:
+        """Añadir 'location' a un documento que tenga 'lat' y 'lon'."""
+        location = cls.build_location(document.get("lat"), document.get("lon"))
+        if location is not None:
+            document["location"] = location
+        return document
+
+    @classmethod
+    def check_coordinates(cls, lat: float, lon: float):
+        """Verificar que la latitud y la longitud estén dentro de rango."""
+        if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            raise HTTPException(status_code=400, detail="Las coordenadas deben cumplir -90 <= lat <= 90 y -180 <= lon <= 180")
+
+    @classmethod
+    def parse_bbox(cls, bbox: str) -> Tuple[float, float, float, float]:
+        """Leer un área 'minLon,minLat,maxLon,maxLat'. minLon > maxLon indica que cruza el antimeridiano."""
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox debe tener el formato minLon,minLat,maxLon,maxLat")
+        cls.check_coordinates(min_lat, min_lon)
+        cls.check_coordinates(max_lat, max_lon)
+        if min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="En bbox, minLat no puede ser mayor que maxLat")
+        return min_lon, min_lat, max_lon, max_lat
+
+    @classmethod
+    def add_bbox(cls, query: Dict, bbox: Optional[str], lat_field: str = "lat", lon_field: str = "lon"):
+        """
+        Agregar a la consulta el filtro de un área visible del mapa si se ha indicado.
+
+        El área visible es un rectángulo en latitud y longitud, así que se filtra por rangos de 'lat' y 'lon'
+        (índice lat_1_lon_1). Un polígono GeoJSON no sirve: MongoDB une sus vértices con arcos de círculo
+        máximo, que entre dos esquinas a la misma latitud se curvan hacia el polo, y el filtro dejaría fuera
+        puntos junto al borde superior del área (e incluiría otros de fuera).
+        """
+        if not bbox:
+            return
+        min_lon, min_lat, max_lon, max_lat = cls.parse_bbox(bbox)
+        query[lat_field] = {"$gte": min_lat, "$lte": max_lat}
+        if min_lon <= max_lon:
+            query[lon_field] = {"$gte": min_lon, "$lte": max_lon}
+        else:
+            # Cruza el antimeridiano: de minLon a 180 y de -180 a maxLon
+            query["$or"] = [{lon_field: {"$gte": min_lon}}, {lon_field: {"$lte": max_lon}}]
+
+    @classmethod
+    def build_near_query(cls, lat: float, lon: float, radius: float, field: str = "location") -> Dict:
+        """Consulta de los documentos a menos de 'radius' metros del punto, ordenados por distancia."""
+        cls.check_coordinates(lat, lon)
+        return {field: {"$nearSphere": {"$geometry": cls.build_location(lat, lon), "$maxDistance": radius}}}
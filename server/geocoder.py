@@ -0,0 +1,132 @@
+import bisect
+import json
+import logging
+import os
+import re
+import unicodedata
+from array import array
+
+logger = logging.getLogger(__name__)
+
+class Gazetteer:
+    """
+    Gazetteer es un geocodificador sin red: carga en memoria el nomenclátor de models/gazetteer.json
+    (países, capitales, ciudades y regiones) y resuelve nombres a coordenadas.
+    Métodos de Clase:
+    - load(cls, path=None): Carga el nomenclátor y construye los índices.
+    - normalize(cls, text): Normaliza un texto (minúsculas, sin tildes ni signos de puntuación).
+    - geocode(cls, query): Devuelve el mejor resultado para un nombre como "Madrid, España" o None.
+    - search(cls, query, limit): Devuelve los resultados exactos y, después, los que empiezan por la consulta.
+    Estructuras:
+    - Las coordenadas se guardan en dos array('d') y los nombres en listas paralelas.
+    - Un diccionario de claves normalizadas resuelve las búsquedas exactas en O(1).
+    - Una lista ordenada de claves resuelve las búsquedas por prefijo con bisect en O(log n).
+    """
+
+    PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "gazetteer.json")
+    _TYPE_RANK = {"pais": 0, "capital": 1, "region": 2, "ciudad": 3}
+
+    _names = []
+    _countries = []
+    _types = []
+    _lat = array('d')
+    _lon = array('d')
+    _index = {}
+    _keys = []
+    _loaded = False
+
+    @classmethod
+    def normalize(cls, text):
+        """Normalizar un texto: sin tildes, en minúsculas y con los signos de puntuación como espacios."""
+        text = unicodedata.normalize("NFKD", text or "")
+        text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+        return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+    @classmethod
+    def load(cls, path=None):
+        """Cargar el nomenclátor y construir los índices en memoria."""
+        with open(path or cls.PATH, encoding="utf-8") as f:
+            entries = json.load(f)
+        entries.sort(key=lambda e: cls._TYPE_RANK.get(e["tipo"], len(cls._TYPE_RANK)))
+
+        names, countries, types = [], [], []
+        lat, lon = array('d'), array('d')
+        index = {}
+        for i, entry in enumerate(entries):
+            names.append(entry["nombre"])
+            countries.append(entry["pais"])
+            types.append(entry["tipo"])
+            lat.append(entry["lat"])
+            lon.append(entry["lon"])
+
+            keys = {cls.normalize(entry["nombre"]), cls.normalize(f"{entry['nombre']} {entry['pais']}")}
+            keys.update(cls.normalize(alias) for alias in entry.get("alias", []))
+            for key in keys:
+                index.setdefault(key, []).append(i)
+
+        cls._names, cls._countries, cls._types = names, countries, types
+        cls._lat, cls._lon = lat, lon
+        cls._index = index
+        cls._keys = sorted(index)
+        cls._loaded = True
+        logger.info(f"Nomenclátor cargado con {len(names)} lugares y {len(index)} claves.")
+
+    @classmethod
+    def _entry(cls, i):
+        return {"nombre": cls._names[i], "pais": cls._countries[i], "tipo": cls._types[i],
+                "lat": cls._lat[i], "lon": cls._lon[i]}
+
+    @classmethod
+    def _prefix(cls, key, limit):
+        """Índices de los lugares cuyas claves empiezan por 'key'."""
+        found = []
+        position = bisect.bisect_left(cls._keys, key)
+        while position < len(cls._keys) and cls._keys[position].startswith(key) and len(found) < limit:
+            for i in cls._index[cls._keys[position]]:
+                if i not in found:
+                    found.append(i)
+            position += 1
+        return found[:limit]
+
+    @classmethod
+    def geocode(cls, query):
+        """
+        Devolver el lugar que mejor encaja con el nombre o None.
+
+        Se prueba el nombre completo; si contiene comas, la primera parte dentro del país indicado en la
+        última, después cada parte por separado y, por último, el primer lugar cuyo nombre empieza por la consulta.
+        """
+        if not cls._loaded:
+            cls.load()
+        key = cls.normalize(query)
+        if not key:
+            return None
+        if key in cls._index:
+            return cls._entry(cls._index[key][0])
+
+        parts = [cls.normalize(p) for p in query.split(",") if cls.normalize(p)]
+        if len(parts) > 1:
+            country = parts[-1]
+            for i in cls._index.get(parts[0], []):
+                if cls.normalize(cls._countries[i]) == country:
+                    return cls._entry(i)
+            for part in parts:
+                if part in cls._index:
+                    return cls._entry(cls._index[part][0])
+
+        found = cls._prefix(key, 1)
+        return cls._entry(found[0]) if found else None
+
+    @classmethod
+    def search(cls, query, limit=10):
+        """Devolver hasta 'limit' lugares: primero las coincidencias exactas y después las de prefijo."""
+        if not cls._loaded:
+            cls.load()
+        key = cls.normalize(query)
+        if not key:
+            return []
+        found = list(cls._index.get(key, []))
+        for i in cls._prefix(key, limit):
+            if i not in found:
+                found.append(i)
+        return [cls._entry(i) for i in found[:limit]]
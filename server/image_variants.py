@@ -0,0 +1,53 @@
+import logging
+import os
+import tempfile
+
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+class ImageVariants:
+    """
+    ImageVariants genera en el servidor versiones reducidas en WebP de las imágenes subidas, para que los
+    clientes no descarguen el original en las miniaturas y los popups del mapa.
+    Métodos de Clase:
+    - generate(cls, path): Crea las variantes de una imagen y devuelve su descripción.
+    Configuración (variables de entorno):
+    - MEDIA_VARIANTS: Variantes como 'nombre:lado_mayor' separadas por comas (por defecto 'thumb:160,medium:640').
+    - MEDIA_VARIANT_QUALITY: Calidad WebP de las variantes (por defecto 80).
+    """
+
+    _sizes = [(name, int(size)) for name, size in
+              (item.split(":") for item in os.getenv('MEDIA_VARIANTS', 'thumb:160,medium:640').split(",") if item)]
+    _quality = int(os.getenv('MEDIA_VARIANT_QUALITY', 80))
+
+    @classmethod
+    def generate(cls, path: str, directory: str | None = None) -> list:
+        """
+        Crear las variantes de la imagen en ficheros temporales. Es una función bloqueante.
+
+        Una variante nunca amplía la imagen: si el original ya es menor, se recodifica a WebP con su tamaño.
+        :return: Lista de {"name", "path", "width", "height", "format"}; vacía si el fichero no es una imagen
+        """
+        variants = []
+        try:
+            with PILImage.open(path) as original:
+                # Aplicar la orientación EXIF antes de reducir, para que las variantes no salgan giradas
+                source = ImageOps.exif_transpose(original)
+                if source.mode not in ("RGB", "RGBA"):
+                    source = source.convert("RGBA" if "transparency" in source.info else "RGB")
+
+                for name, size in cls._sizes:
+                    variant = source.copy()
+                    variant.thumbnail((size, size), PILImage.Resampling.LANCZOS)
+                    fd, variant_path = tempfile.mkstemp(prefix=f"{name}-", suffix=".webp", dir=directory)
+                    with os.fdopen(fd, "wb") as out:
+                        variant.save(out, format="WEBP", quality=cls._quality, method=4)
+                    variants.append({"name": name, "path": variant_path, "width": variant.width,
+                                     "height": variant.height, "format": "webp"})
+                return variants
+        except (UnidentifiedImageError, PILImage.DecompressionBombError, OSError) as e:
+            logger.warning(f"No se han podido generar las variantes de {path}: {e}")
+            for variant in variants:
+                os.remove(variant["path"])
+            return []
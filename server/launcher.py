@@ -0,0 +1,75 @@
+import logging
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+class Launcher:
+    """
+    Launcher arranca la API en producción con varios procesos de uvicorn que comparten el puerto.
+
+    Cada worker importa app:app y ejecuta su lifespan: abre y calienta su propio pool de MongoDB antes de
+    aceptar peticiones y lo cierra al parar. Con SIGTERM (o SIGINT) el proceso principal lo reenvía a los
+    workers, que dejan de aceptar conexiones, terminan las peticiones en curso (como mucho
+    GRACEFUL_TIMEOUT segundos), esperan a las subidas pendientes y cierran el pool antes de salir.
+    Las métricas (/metrics), las cachés y los perfiles son de cada proceso.
+    Métodos de Clase:
+    - worker_count(cls): Número de workers a partir del entorno o de los núcleos disponibles.
+    - options(cls): Argumentos de uvicorn.run.
+    - run(cls): Arranca el servidor y bloquea hasta que termina.
+    Configuración (variables de entorno):
+    - HOST: Dirección en la que escuchar (por defecto 0.0.0.0).
+    - PORT: Puerto (por defecto 8000).
+    - WORKERS o WEB_CONCURRENCY: Número de procesos (por defecto, los núcleos disponibles).
+    - GRACEFUL_TIMEOUT: Segundos para terminar las peticiones en curso al parar (por defecto 30).
+    - KEEPALIVE_TIMEOUT: Segundos que se mantiene abierta una conexión ociosa (por defecto 5).
+    - LOG_LEVEL: Nivel de log de uvicorn (por defecto info).
+    - FORWARDED_ALLOW_IPS: IPs de los proxies de confianza para X-Forwarded-* (por defecto 127.0.0.1).
+    Con DB_BACKEND=memory se usa un solo worker: los datos en memoria no se comparten entre procesos.
+    """
+
+    @classmethod
+    def worker_count(cls) -> int:
+        """Número de workers: WORKERS, WEB_CONCURRENCY o los núcleos que puede usar este proceso."""
+        configured = os.getenv('WORKERS') or os.getenv('WEB_CONCURRENCY')
+        if configured:
+            return max(1, int(configured))
+        try:
+            # Respeta la afinidad de CPU (contenedores con cpuset, taskset)
+            return max(1, len(os.sched_getaffinity(0)))
+        except AttributeError:
+            return max(1, os.cpu_count() or 1)
+
+    @classmethod
+    def options(cls) -> dict:
+        """Argumentos de uvicorn.run según el entorno."""
+        workers = cls.worker_count()
+        if workers > 1 and os.getenv('DB_BACKEND', 'mongo').strip().lower() == 'memory':
+            logger.warning("DB_BACKEND=memory no se comparte entre procesos: se usa un solo worker.")
+            workers = 1
+        return {
+            "host": os.getenv('HOST', "0.0.0.0"),
+            "port": int(os.getenv('PORT', 8000)),
+            "workers": workers,
+            "timeout_graceful_shutdown": int(os.getenv('GRACEFUL_TIMEOUT', 30)),
+            "timeout_keep_alive": int(os.getenv('KEEPALIVE_TIMEOUT', 5)),
+            "log_level": os.getenv('LOG_LEVEL', "info").lower(),
+            "proxy_headers": True,
+            "forwarded_allow_ips": os.getenv('FORWARDED_ALLOW_IPS', "127.0.0.1"),
+            # Sin lifespan no se abriría el pool al arrancar ni se cerraría al parar
+            "lifespan": "on",
+        }
+
+    @classmethod
+    def run(cls):
+        """Arrancar uvicorn con los workers configurados; con varios, la app se importa en cada proceso."""
+        options = cls.options()
+        logger.info(f"Arrancando {options['workers']} worker(s) en {options['host']}:{options['port']}")
+        uvicorn.run("app:app", **options)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    Launcher.run()
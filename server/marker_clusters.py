@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import math
+import os
+import time
+
+import numpy as np
+
+from async_db_connection import AsyncDatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+class MarkerIndex:
+    """
+    MarkerIndex mantiene en memoria una copia columnar (arrays de NumPy) de las coordenadas de los países
+    y agrupa los marcadores del mapa en una rejilla por nivel de zoom.
+    Métodos de Clase:
+    - ensure_loaded(cls): Carga la copia desde la base de datos si no existe o ha caducado.
+    - upsert(cls, document_id, lat, lon, email): Añade o actualiza un país tras escribirlo.
+    - remove(cls, document_id): Quita un país tras borrarlo.
+    - invalidate(cls): Fuerza una recarga completa en la siguiente consulta.
+    - clusters(cls, zoom, bbox, email): Devuelve los grupos de un nivel de zoom dentro de un área.
+    Estructura:
+    - _lat, _lon (float64), _email (int32, código del email) y _active (bool) son arrays paralelos; cada país
+      ocupa una fila, los huecos que dejan los borrados se reutilizan y la capacidad crece al doble.
+    - La celda de cada país por (zoom, email) se guarda hasta que cambia la versión de la copia. Los grupos
+      se forman solo con los países que caen dentro del área pedida: una celda cortada por el borde conserva
+      los de dentro y ningún grupo cuenta países de fuera.
+    - Las escrituras que llegan mientras se carga la copia se guardan y se aplican al terminar la carga,
+      porque el cursor puede haber pasado ya por esos documentos.
+    Configuración (variables de entorno):
+    - CLUSTER_CELLS_PER_TILE: Celdas de la rejilla por tesela de 256 px (por defecto 4, unos 64 px por celda).
+    - CLUSTER_SNAPSHOT_TTL_SECONDS: Cada cuánto se recarga la copia completa (por defecto 300). Con varios
+      workers, las escrituras de un worker solo se reflejan en los demás tras esta recarga.
+    """
+
+    _cells_per_tile = int(os.getenv('CLUSTER_CELLS_PER_TILE', 4))
+    _ttl = float(os.getenv('CLUSTER_SNAPSHOT_TTL_SECONDS', 300))
+
+    _lat = np.empty(0, dtype=np.float64)
+    _lon = np.empty(0, dtype=np.float64)
+    _email = np.empty(0, dtype=np.int32)
+    _active = np.empty(0, dtype=bool)
+    _ids = []
+    _rows = {}
+    _free = []
+    _size = 0
+    _emails = {}
+    _loaded_at = None
+    _loading = False
+    _changed_while_loading = []
+    _version = 0
+    _cache = {}
+    _lock = None
+
+    @classmethod
+    def _reset(cls, capacity):
+        cls._lat = np.zeros(capacity, dtype=np.float64)
+        cls._lon = np.zeros(capacity, dtype=np.float64)
+        cls._email = np.zeros(capacity, dtype=np.int32)
+        cls._active = np.zeros(capacity, dtype=bool)
+        cls._ids = [None] * capacity
+        cls._rows = {}
+        cls._free = []
+        cls._size = 0
+        cls._emails = {}
+
+    @classmethod
+    def _grow(cls):
+        capacity = max(1024, 2 * len(cls._lat))
+        for name in ("_lat", "_lon", "_email", "_active"):
+            old = getattr(cls, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(cls, name, new)
+        cls._ids.extend([None] * (capacity - len(cls._ids)))
+
+    @classmethod
+    def _email_code(cls, email):
+        return cls._emails.setdefault(email, len(cls._emails) + 1)
+
+    @classmethod
+    def _set_row(cls, document_id, lat, lon, email):
+        row = cls._rows.get(document_id)
+        if row is None:
+            if cls._free:
+                row = cls._free.pop()
+            else:
+                if cls._size == len(cls._lat):
+                    cls._grow()
+                row = cls._size
+                cls._size += 1
+            cls._rows[document_id] = row
+            cls._ids[row] = document_id
+        cls._lat[row] = lat
+        cls._lon[row] = lon
+        cls._email[row] = cls._email_code(email)
+        cls._active[row] = True
+
+    @classmethod
+    async def ensure_loaded(cls):
+        """Cargar la copia de las coordenadas si no existe o ha caducado."""
+        if cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls._ttl:
+            return
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls._ttl:
+                return
+            cls._loading = True
+            cls._changed_while_loading = []
+            try:
+                cls._reset(1024)
+                documents = AsyncDatabaseConnection.stream_documents("paises", {"lat": {"$type": "number"}, "lon": {"$type": "number"}},
+                                                                     {"lat": 1, "lon": 1, "email": 1})
+                async for d in documents:
+                    cls._set_row(d["_id"], d["lat"], d["lon"], d.get("email"))
+                cls._loaded_at = time.monotonic()
+            except BaseException:
+                cls._loaded_at = None
+                raise
+            finally:
+                changes = cls._changed_while_loading
+                cls._loading = False
+                cls._changed_while_loading = []
+            # El cursor puede haber pasado ya por los países escritos durante la carga: se aplican ahora, en orden
+            for change in changes:
+                if change is None:
+                    cls._loaded_at = None
+                else:
+                    cls.upsert(*change)
+            cls._version += 1
+            cls._cache.clear()
+            logger.info(f"Copia de coordenadas cargada con {len(cls._rows)} países.")
+
+    @classmethod
+    def upsert(cls, document_id, lat, lon, email):
+        """Añadir o actualizar un país en la copia después de escribirlo (o guardarlo si se está cargando)."""
+        if cls._loading:
+            cls._changed_while_loading.append((document_id, lat, lon, email))
+            return
+        if cls._loaded_at is None:
+            return
+        if lat is None or lon is None:
+            cls.remove(document_id)
+            return
+        cls._set_row(str(document_id).lower(), lat, lon, email)
+        cls._version += 1
+
+    @classmethod
+    def remove(cls, document_id):
+        """Quitar un país de la copia después de borrarlo (o guardarlo si se está cargando)."""
+        if cls._loading:
+            cls._changed_while_loading.append((document_id, None, None, None))
+            return
+        row = cls._rows.pop(str(document_id).lower(), None)
+        if row is not None:
+            cls._active[row] = False
+            cls._ids[row] = None
+            cls._free.append(row)
+            cls._version += 1
+
+    @classmethod
+    def invalidate(cls):
+        """Descartar la copia para que se recargue en la siguiente consulta (también la que se está cargando)."""
+        if cls._loading:
+            cls._changed_while_loading.append(None)
+        cls._loaded_at = None
+
+    @classmethod
+    def _grid(cls, zoom, email):
+        """Asignar a cada país activo su celda de una rejilla en proyección Web Mercator."""
+        key = (zoom, email, cls._version)
+        if key in cls._cache:
+            return cls._cache[key]
+
+        mask = cls._active[:cls._size].copy()
+        if email is not None:
+            mask &= cls._email[:cls._size] == cls._emails.get(email, -1)
+        rows = np.flatnonzero(mask)
+        lat = cls._lat[rows]
+        lon = cls._lon[rows]
+
+        n = (2 ** zoom) * cls._cells_per_tile
+        x = (lon + 180.0) / 360.0
+        clipped = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+        y = (1.0 - np.log(np.tan(clipped) + 1.0 / np.cos(clipped)) / math.pi) / 2.0
+        ix = np.clip((x * n).astype(np.int64), 0, n - 1)
+        iy = np.clip((y * n).astype(np.int64), 0, n - 1)
+
+        grid = {"rows": rows, "lat": lat, "lon": lon, "cell": ix * n + iy}
+        if len(cls._cache) > 256:
+            cls._cache.clear()
+        cls._cache[key] = grid
+        return grid
+
+    @staticmethod
+    def _aggregate(rows, lat, lon, cell):
+        """Agrupar los países por celda: centroide, número de países y la fila del primero."""
+        cells, first, inverse, counts = np.unique(cell, return_index=True, return_inverse=True, return_counts=True)
+        return {
+            "lat": np.bincount(inverse, weights=lat, minlength=len(cells)) / counts,
+            "lon": np.bincount(inverse, weights=lon, minlength=len(cells)) / counts,
+            "count": counts,
+            # Para las celdas con un único país se conserva su ID, de modo que el cliente pinte un marcador normal
+            "row": rows[first],
+        }
+
+    @classmethod
+    def clusters(cls, zoom, bbox=None, email=None):
+        """
+        Devolver los grupos de marcadores de un nivel de zoom.
+
+        :param bbox: Tupla (minLon, minLat, maxLon, maxLat); minLon > maxLon indica que cruza el antimeridiano
+        :return: Lista de {"lat", "lon", "count"} y, si el grupo tiene un solo país, su "_id"
+        """
+        grid = cls._grid(zoom, email)
+        if bbox is None:
+            if "all" not in grid:
+                grid["all"] = cls._aggregate(grid["rows"], grid["lat"], grid["lon"], grid["cell"])
+            groups = grid["all"]
+        else:
+            # Se filtran los países, no los centroides, antes de agrupar
+            min_lon, min_lat, max_lon, max_lat = bbox
+            lat, lon = grid["lat"], grid["lon"]
+            keep = (lat >= min_lat) & (lat <= max_lat)
+            if min_lon <= max_lon:
+                keep &= (lon >= min_lon) & (lon <= max_lon)
+            else:
+                keep &= (lon >= min_lon) | (lon <= max_lon)
+            groups = cls._aggregate(grid["rows"][keep], lat[keep], lon[keep], grid["cell"][keep])
+
+        result = []
+        for i in range(len(groups["count"])):
+            cluster = {"lat": round(float(groups["lat"][i]), 6), "lon": round(float(groups["lon"][i]), 6),
+                       "count": int(groups["count"][i])}
+            if cluster["count"] == 1:
+                cluster["_id"] = cls._ids[int(groups["row"][i])]
+            result.append(cluster)
+        return result
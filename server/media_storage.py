@@ -0,0 +1,233 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from email.utils import formatdate
+from mimetypes import guess_type
+
+import anyio
+import cloudinary
+import cloudinary.uploader
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class MediaStorage(ABC):
+    """
+    Interfaz de los almacenes de ficheros de imagen. Las implementaciones son bloqueantes y se usan desde el
+    pool de subidas (UploadJobs.run_blocking).
+    Métodos:
+    - save(self, path, key): Guarda el fichero local 'path' con la clave 'key' y devuelve su URL pública.
+    - delete(self, key): Borra un fichero guardado. Se usa para no dejar ficheros huérfanos cuando una subida
+      falla después de guardar alguno.
+    """
+
+    name = None
+
+    @abstractmethod
+    def save(self, path: str, key: str) -> str:
+        """Guardar el fichero local 'path' con la clave 'key' y devolver su URL pública."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Borrar un fichero guardado; no es un error que no exista."""
+
+class CloudinaryStorage(MediaStorage):
+    """Almacén en Cloudinary. La clave se usa como public_id, sin extensión."""
+
+    name = "cloudinary"
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
+            api_key = os.getenv("CLOUDINARY_API_KEY"),
+            api_secret = os.getenv("CLOUDINARY_API_SECRET"),
+            secure=True
+        )
+
+    def save(self, path: str, key: str) -> str:
+        public_id = os.path.splitext(key)[0]
+        return cloudinary.uploader.upload(path, public_id=public_id, overwrite=False)['secure_url']
+
+    def delete(self, key: str):
+        cloudinary.uploader.destroy(os.path.splitext(key)[0])
+
+class LocalStorage(MediaStorage):
+    """
+    Almacén en disco local. Los ficheros se sirven desde GET /api/v1/media/files/{key} con FileRangeResponse.
+
+    Las claves se derivan del SHA-256 del contenido, así que un fichero guardado no cambia nunca y se puede
+    cachear indefinidamente en el cliente.
+    """
+
+    name = "local"
+    KEY_PATTERN = re.compile(r"^[0-9a-f]{64}(-[a-z0-9]+)?\.[a-z0-9]+$")
+
+    def __init__(self):
+        self.directory = os.path.abspath(os.getenv("MEDIA_LOCAL_DIR", "media"))
+        self.base_url = os.getenv("MEDIA_PUBLIC_BASE_URL", "").rstrip("/")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str | None:
+        """Ruta del fichero de una clave, o None si la clave no es válida (evita salir del directorio)."""
+        if not self.KEY_PATTERN.match(key):
+            return None
+        return os.path.join(self.directory, key)
+
+    def save(self, path: str, key: str) -> str:
+        target = self.path(key)
+        if target is None:
+            raise ValueError(f"Clave de fichero no válida: {key}")
+        if not os.path.exists(target):
+            # Se copia a un temporal y se renombra para que nunca se sirva un fichero a medio escribir. El
+            # temporal es único por llamada: dos hilos del pool pueden guardar la misma clave a la vez
+            fd, partial = tempfile.mkstemp(prefix=f".{key}.", suffix=".tmp", dir=self.directory)
+            try:
+                with os.fdopen(fd, "wb") as target_file, open(path, "rb") as source:
+                    shutil.copyfileobj(source, target_file)
+                # mkstemp crea el fichero con permisos 0600; se dejan los habituales para que un proxy pueda servirlo
+                os.chmod(partial, 0o644)
+                os.replace(partial, target)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        return f"{self.base_url}/api/v1/media/files/{key}"
+
+    def delete(self, key: str):
+        target = self.path(key)
+        if target is not None and os.path.exists(target):
+            os.remove(target)
+
+class Storage:
+    """
+    Storage elige el almacén de ficheros de imagen.
+    Métodos de Clase:
+    - backend(cls): Devuelve el almacén configurado.
+    - key(cls, sha256, filename, variant): Clave de un fichero a partir de su contenido.
+    Configuración (variables de entorno):
+    - MEDIA_STORAGE: 'cloudinary' (por defecto) o 'local'.
+    - MEDIA_LOCAL_DIR: Directorio del almacén local (por defecto ./media).
+    - MEDIA_PUBLIC_BASE_URL: Prefijo de las URL del almacén local (por defecto, URL relativas).
+    """
+
+    _backends = {"cloudinary": CloudinaryStorage, "local": LocalStorage}
+    _backend = None
+
+    @classmethod
+    def backend(cls) -> MediaStorage:
+        """Devolver el almacén configurado en MEDIA_STORAGE."""
+        if cls._backend is None:
+            name = os.getenv("MEDIA_STORAGE", "cloudinary").lower()
+            if name not in cls._backends:
+                raise ValueError(f"MEDIA_STORAGE debe ser uno de {', '.join(cls._backends)}")
+            cls._backend = cls._backends[name]()
+            logger.info(f"Almacén de imágenes: {name}")
+        return cls._backend
+
+    @classmethod
+    def key(cls, sha256: str, filename: str | None = None, variant: str | None = None, extension: str | None = None) -> str:
+        """Clave '<sha256>[-variante].<extensión>'; la extensión sale del nombre original si no se indica."""
+        if extension is None:
+            extension = os.path.splitext(filename or "")[1].lstrip(".").lower()
+        extension = re.sub(r"[^a-z0-9]", "", extension or "") or "bin"
+        return f"{sha256}-{variant}.{extension}" if variant else f"{sha256}.{extension}"
+
+class FileRangeResponse(Response):
+    """
+    Respuesta de un fichero local con soporte de peticiones Range (un único rango), validación por ETag y
+    cabeceras de caché de larga duración.
+
+    Si el servidor ASGI ofrece la extensión 'http.response.zerocopysend', el cuerpo se envía con sendfile
+    sin pasar por Python; si no, se lee por bloques en un hilo.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, request: Request, path: str, etag: str, cache_control: str = "public, max-age=31536000, immutable"):
+        self.path = path
+        self.background = None
+        stat_result = os.stat(path)
+        size = stat_result.st_size
+        self.start, self.length = 0, size
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "Cache-Control": cache_control,
+        }
+        self.media_type = guess_type(path)[0] or "application/octet-stream"
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+            self.status_code, self.length = 304, 0
+            self.init_headers(headers)
+            return
+
+        self.status_code = 200
+        requested = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if requested and (if_range is None or if_range.strip() == etag):
+            byte_range = self._parse_range(requested, size)
+            if byte_range is None:
+                self.status_code, self.length = 416, 0
+                headers["Content-Range"] = f"bytes */{size}"
+            elif byte_range != (0, size - 1):
+                self.status_code = 206
+                self.start, self.length = byte_range[0], byte_range[1] - byte_range[0] + 1
+                headers["Content-Range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+
+        headers["Content-Length"] = str(self.length)
+        self.init_headers(headers)
+
+    @staticmethod
+    def _parse_range(header: str, size: int):
+        """
+        Leer 'bytes=inicio-fin', 'bytes=inicio-' o 'bytes=-sufijo'. Devuelve (inicio, fin) incluidos, None si el
+        rango no se puede satisfacer, o el fichero completo si piden varios rangos (lo permite RFC 9110).
+        """
+        unit, _, ranges = header.partition("=")
+        if unit.strip() != "bytes" or "," in ranges:
+            return (0, size - 1)
+        first, _, last = ranges.strip().partition("-")
+        try:
+            if first == "":
+                start, end = max(0, size - int(last)), size - 1
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return (0, size - 1)
+        if size == 0 or start > end or start >= size:
+            return None
+        return (start, end)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file, "offset": self.start,
+                            "count": self.length, "more_body": False})
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # El fichero ha encogido mientras se enviaba: se cierra la respuesta para no dejarla colgada
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
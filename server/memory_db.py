@@ -0,0 +1,1196 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import re
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_METERS = 6378100  # El mismo radio que usa MongoDB en $nearSphere con GeoJSON
+
+def _copy(value):
+    """Copia profunda de un documento: solo hace falta copiar diccionarios y listas."""
+    if type(value) is dict:
+        return {k: _copy(v) for k, v in value.items()}
+    if type(value) is list:
+        return [_copy(v) for v in value]
+    return value
+
+def _freeze(value):
+    """Valor hashable equivalente, para usar diccionarios y listas como clave de un índice."""
+    if isinstance(value, dict):
+        return ("__dict__", tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("__list__", tuple(_freeze(v) for v in value))
+    return value
+
+class MemoryQuery:
+    """
+    MemoryQuery implementa el lenguaje de consultas de MongoDB que usan los routers sobre diccionarios de
+    Python: filtros, proyecciones, ordenación y operadores de actualización.
+    Métodos de Clase:
+    - matches(cls, document, query): Indica si un documento cumple un filtro.
+    - project(cls, document, projection): Copia del documento con los campos de la proyección.
+    - sort_key(cls, value): Clave de ordenación con el orden de tipos de BSON.
+    - sort(cls, documents, sort_criteria, limit): Ordena documentos por varios campos.
+    - apply_update(cls, document, update, query, is_insert): Aplica una actualización con operadores o
+      un pipeline ($set/$unset con referencias '$campo').
+    - near_distance(cls, query): Función de distancia de la condición $nearSphere/$near de un filtro.
+    Operadores de consulta: $and, $or, $nor, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin, $exists, $type,
+    $regex/$options, $elemMatch, $size, $all, $not, $geoWithin ($geometry con aristas geodésicas, $box en el
+    plano como los pares de coordenadas antiguos, $centerSphere), $nearSphere/$near ($geometry, $maxDistance,
+    $minDistance).
+    Operadores de actualización: $set, $unset, $inc, $mul, $min, $max, $push ($each), $addToSet ($each),
+    $pull, $pop, $setOnInsert, $currentDate y el posicional 'campo.$'.
+    """
+
+    _TYPES = {
+        "double": (1,), "string": (2,), "object": (3,), "array": (4,), "binData": (5,), "objectId": (7,),
+        "bool": (8,), "date": (9,), "null": (10,), "regex": (11,), "int": (16,), "long": (18,),
+        "number": (1, 16, 18), "decimal": (19,),
+    }
+
+    @staticmethod
+    def _walk(value, parts):
+        """Valores de una ruta con puntos; las listas intermedias se recorren elemento a elemento."""
+        if not parts:
+            yield value
+            return
+        head, rest = parts[0], parts[1:]
+        if isinstance(value, dict):
+            if head in value:
+                yield from MemoryQuery._walk(value[head], rest)
+        elif isinstance(value, list):
+            if head.isdigit() and int(head) < len(value):
+                yield from MemoryQuery._walk(value[int(head)], rest)
+            for item in value:
+                if isinstance(item, dict):
+                    yield from MemoryQuery._walk(item, parts)
+
+    @classmethod
+    def values(cls, document, path):
+        """Lista de valores de 'path' en el documento (vacía si el campo no existe)."""
+        return list(cls._walk(document, path.split(".")))
+
+    @staticmethod
+    def _candidates(values):
+        """Cada valor y, si es una lista, también sus elementos (una condición se cumple con cualquiera)."""
+        for value in values:
+            yield value
+            if isinstance(value, list):
+                yield from value
+
+    @staticmethod
+    def type_rank(value):
+        """Posición del tipo en el orden de comparación de BSON."""
+        if value is None:
+            return 1
+        if isinstance(value, bool):
+            return 8
+        if isinstance(value, (int, float)):
+            return 2
+        if isinstance(value, str):
+            return 3
+        if isinstance(value, dict):
+            return 4
+        if isinstance(value, list):
+            return 5
+        if isinstance(value, bytes):
+            return 6
+        if isinstance(value, ObjectId):
+            return 7
+        if isinstance(value, datetime):
+            return 9
+        if isinstance(value, re.Pattern):
+            return 11
+        return 12
+
+    @classmethod
+    def _normalize(cls, value):
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @classmethod
+    def sort_key(cls, value):
+        """Clave comparable entre documentos: (rango del tipo, valor). Los tipos compuestos se comparan por su repr."""
+        rank = cls.type_rank(value)
+        if rank in (2, 3, 7, 8, 9):
+            return (rank, cls._normalize(value))
+        if rank == 1:
+            return (rank,)
+        return (rank, repr(value))
+
+    @classmethod
+    def _equals(cls, a, b):
+        if isinstance(b, re.Pattern):
+            return isinstance(a, str) and b.search(a) is not None
+        return cls.type_rank(a) == cls.type_rank(b) and cls._normalize(a) == cls._normalize(b)
+
+    @classmethod
+    def _equals_any(cls, values, target):
+        if not values:
+            return target is None
+        return any(cls._equals(candidate, target) for candidate in cls._candidates(values))
+
+    @classmethod
+    def _compare(cls, operator, a, b):
+        if cls.type_rank(a) != cls.type_rank(b) or cls.type_rank(a) not in (2, 3, 7, 8, 9):
+            return False
+        a, b = cls._normalize(a), cls._normalize(b)
+        if operator == "$gt":
+            return a > b
+        if operator == "$gte":
+            return a >= b
+        if operator == "$lt":
+            return a < b
+        return a <= b
+
+    @classmethod
+    def _type_matches(cls, value, type_name):
+        names = type_name if isinstance(type_name, list) else [type_name]
+        for name in names:
+            codes = cls._TYPES.get(name, (name,))
+            if ((1 in codes and isinstance(value, float)) or
+                    ((16 in codes or 18 in codes) and isinstance(value, int) and not isinstance(value, bool)) or
+                    (2 in codes and isinstance(value, str)) or
+                    (3 in codes and isinstance(value, dict)) or
+                    (4 in codes and isinstance(value, list)) or
+                    (5 in codes and isinstance(value, bytes)) or
+                    (7 in codes and isinstance(value, ObjectId)) or
+                    (8 in codes and isinstance(value, bool)) or
+                    (9 in codes and isinstance(value, datetime)) or
+                    (10 in codes and value is None) or
+                    (11 in codes and isinstance(value, re.Pattern))):
+                return True
+        return False
+
+    @staticmethod
+    def _regex(pattern, options=""):
+        if isinstance(pattern, re.Pattern):
+            return pattern
+        flags = 0
+        for option, flag in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+            if option in (options or ""):
+                flags |= flag
+        return re.compile(pattern, flags)
+
+    @staticmethod
+    def _is_operator_dict(condition):
+        return isinstance(condition, dict) and bool(condition) and all(k.startswith("$") for k in condition)
+
+    @classmethod
+    def matches(cls, document, query):
+        """Devolver True si el documento cumple el filtro."""
+        for key, condition in (query or {}).items():
+            if key == "$and":
+                if not all(cls.matches(document, q) for q in condition):
+                    return False
+            elif key == "$or":
+                if not any(cls.matches(document, q) for q in condition):
+                    return False
+            elif key == "$nor":
+                if any(cls.matches(document, q) for q in condition):
+                    return False
+            elif key.startswith("$"):
+                raise OperationFailure(f"unknown top level operator: {key}", 2)
+            elif not cls._match_field(document, key, condition):
+                return False
+        return True
+
+    @classmethod
+    def _match_field(cls, document, path, condition):
+        values = cls.values(document, path)
+        if cls._is_operator_dict(condition):
+            return all(cls._operator(operator, argument, values, condition) for operator, argument in condition.items())
+        return cls._equals_any(values, condition)
+
+    @classmethod
+    def _elem_match(cls, element, condition):
+        if cls._is_operator_dict(condition):
+            return all(cls._operator(operator, argument, [element], condition) for operator, argument in condition.items())
+        return isinstance(element, dict) and cls.matches(element, condition)
+
+    @classmethod
+    def _operator(cls, operator, argument, values, condition):
+        if operator == "$eq":
+            return cls._equals_any(values, argument)
+        if operator == "$ne":
+            return not cls._equals_any(values, argument)
+        if operator in ("$gt", "$gte", "$lt", "$lte"):
+            return any(cls._compare(operator, candidate, argument) for candidate in cls._candidates(values))
+        if operator == "$in":
+            return any(cls._equals_any(values, target) for target in argument)
+        if operator == "$nin":
+            return not any(cls._equals_any(values, target) for target in argument)
+        if operator == "$exists":
+            return bool(values) == bool(argument)
+        if operator == "$type":
+            if argument == "array" or argument == 4:
+                return any(isinstance(value, list) for value in values)
+            return any(cls._type_matches(candidate, argument) for candidate in cls._candidates(values))
+        if operator == "$regex":
+            pattern = cls._regex(argument, condition.get("$options", ""))
+            return any(isinstance(c, str) and pattern.search(c) is not None for c in cls._candidates(values))
+        if operator in ("$options", "$maxDistance", "$minDistance"):
+            # Modificadores de $regex y de $near/$nearSphere: se evalúan con su operador
+            return True
+        if operator == "$elemMatch":
+            return any(isinstance(value, list) and any(cls._elem_match(e, argument) for e in value) for value in values)
+        if operator == "$size":
+            return any(isinstance(value, list) and len(value) == argument for value in values)
+        if operator == "$all":
+            return all(cls._equals_any(values, target) for target in argument)
+        if operator == "$not":
+            if cls._is_operator_dict(argument):
+                return not all(cls._operator(o, a, values, argument) for o, a in argument.items())
+            return not cls._operator("$regex", argument, values, {})
+        if operator == "$geoWithin":
+            return any(cls._within(point, argument) for point in map(cls._point, values) if point is not None)
+        if operator in ("$nearSphere", "$near"):
+            distance = cls._near_function(argument, condition)
+            return any(distance(point) is not None for point in map(cls._point, values) if point is not None)
+        raise OperationFailure(f"unknown operator: {operator}", 2)
+
+    @staticmethod
+    def _point(value):
+        """Coordenadas [lon, lat] de un punto GeoJSON o de un par heredado, o None."""
+        if isinstance(value, dict) and value.get("type") == "Point":
+            value = value.get("coordinates")
+        if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(v, (int, float)) for v in value):
+            return float(value[0]), float(value[1])
+        return None
+
+    @staticmethod
+    def haversine(a, b):
+        """Distancia en metros entre dos puntos [lon, lat]."""
+        lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(h)))
+
+    @staticmethod
+    def _unit(point):
+        """Vector unitario de un punto [lon, lat] sobre la esfera."""
+        lon, lat = math.radians(point[0]), math.radians(point[1])
+        return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+    @classmethod
+    def _in_ring(cls, point, ring):
+        """
+        Punto dentro de un anillo GeoJSON con aristas geodésicas (arcos de círculo máximo), como $geometry en
+        MongoDB: una arista entre dos puntos de la misma latitud se curva hacia el polo, no sigue el paralelo.
+        El interior es la menor de las dos regiones que separa el anillo, sea cual sea su orientación, y los
+        bordes cuentan como dentro.
+
+        Se suma el ángulo que barre el anillo visto desde el punto (±2π si lo rodea, 0 si no) y el área con
+        signo del anillo, que indica a qué lado queda la región pequeña.
+        """
+        def dot(a, b):
+            return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+        def cross(a, b):
+            return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+        p = cls._unit(point)
+        vertices = [cls._unit(v) for v in (ring[:-1] if ring[0] == ring[-1] else ring)]
+        winding = 0.0
+        for a, b in zip(vertices, vertices[1:] + vertices[:1]):
+            normal = cross(a, b)
+            length = math.sqrt(dot(normal, normal))
+            if dot(p, a) >= 1 - 1e-15 or (length > 0 and abs(dot(p, normal)) <= 1e-12 * length and
+                                           dot(cross(a, p), normal) >= 0 and dot(cross(p, b), normal) >= 0):
+                return True
+            ta = tuple(a[i] - dot(a, p) * p[i] for i in range(3))
+            tb = tuple(b[i] - dot(b, p) * p[i] for i in range(3))
+            winding += math.atan2(dot(cross(ta, tb), p), dot(ta, tb))
+
+        # Área con signo del abanico de triángulos desde el primer vértice; positiva si el interior queda a la izquierda
+        area, first = 0.0, vertices[0]
+        for b, c in zip(vertices[1:], vertices[2:]):
+            area += 2 * math.atan2(dot(first, cross(b, c)), 1 + dot(first, b) + dot(b, c) + dot(c, first))
+        left_is_smaller = area % (4 * math.pi) < 2 * math.pi
+        return winding > math.pi if left_is_smaller else winding < -math.pi
+
+    @classmethod
+    def _within(cls, point, shape):
+        if "$geometry" in shape:
+            geometry = shape["$geometry"]
+            polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+            return any(cls._in_ring(point, [tuple(p) for p in polygon[0]]) and
+                       not any(cls._in_ring(point, [tuple(p) for p in hole]) for hole in polygon[1:])
+                       for polygon in polygons)
+        if "$box" in shape:
+            (x1, y1), (x2, y2) = shape["$box"]
+            return min(x1, x2) <= point[0] <= max(x1, x2) and min(y1, y2) <= point[1] <= max(y1, y2)
+        if "$centerSphere" in shape:
+            center, radians = shape["$centerSphere"]
+            return cls.haversine(point, center) <= radians * EARTH_RADIUS_METERS
+        raise OperationFailure(f"unsupported $geoWithin shape: {list(shape)}", 2)
+
+    @classmethod
+    def _near_function(cls, argument, condition):
+        """Función punto -> distancia en metros (None si queda fuera de $minDistance/$maxDistance)."""
+        if isinstance(argument, dict) and "$geometry" in argument:
+            center = cls._point(argument["$geometry"])
+            max_distance, min_distance = argument.get("$maxDistance"), argument.get("$minDistance")
+        else:
+            # Forma heredada: [lon, lat] con las distancias en radianes junto al operador
+            center = cls._point(argument)
+            max_distance, min_distance = condition.get("$maxDistance"), condition.get("$minDistance")
+            max_distance = max_distance * EARTH_RADIUS_METERS if max_distance is not None else None
+            min_distance = min_distance * EARTH_RADIUS_METERS if min_distance is not None else None
+
+        def distance(point):
+            d = cls.haversine(point, center)
+            if (max_distance is not None and d > max_distance) or (min_distance is not None and d < min_distance):
+                return None
+            return d
+        return distance
+
+    @classmethod
+    def near_distance(cls, query):
+        """Si el filtro tiene $nearSphere o $near, devolver documento -> distancia para ordenar; si no, None."""
+        for key, condition in (query or {}).items():
+            if key == "$and":
+                for sub in condition:
+                    found = cls.near_distance(sub)
+                    if found is not None:
+                        return found
+            elif isinstance(condition, dict) and not key.startswith("$"):
+                for operator in ("$nearSphere", "$near"):
+                    if operator in condition:
+                        distance = cls._near_function(condition[operator], condition)
+
+                        def document_distance(document, path=key):
+                            found = [d for d in (distance(p) for p in map(cls._point, cls.values(document, path)) if p) if d is not None]
+                            return min(found) if found else math.inf
+                        return document_distance
+        return None
+
+    @staticmethod
+    def _tree(paths):
+        tree = {}
+        for path in paths:
+            node, parts = tree, path.split(".")
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if node is True:
+                    break
+            else:
+                node[parts[-1]] = True
+        return tree
+
+    @classmethod
+    def _include(cls, document, tree):
+        result = {}
+        for key, value in document.items():
+            branch = tree.get(key)
+            if branch is None:
+                continue
+            if branch is True:
+                result[key] = _copy(value)
+            elif isinstance(value, dict):
+                result[key] = cls._include(value, branch)
+            elif isinstance(value, list):
+                result[key] = [cls._include(item, branch) for item in value if isinstance(item, dict)]
+        return result
+
+    @classmethod
+    def _exclude(cls, document, tree):
+        result = {}
+        for key, value in document.items():
+            branch = tree.get(key)
+            if branch is True:
+                continue
+            if branch is None:
+                result[key] = _copy(value)
+            elif isinstance(value, dict):
+                result[key] = cls._exclude(value, branch)
+            elif isinstance(value, list):
+                result[key] = [cls._exclude(item, branch) if isinstance(item, dict) else _copy(item) for item in value]
+            else:
+                result[key] = _copy(value)
+        return result
+
+    @classmethod
+    def project(cls, document, projection=None):
+        """Copiar el documento con los campos de la proyección (inclusión o exclusión, con rutas con puntos)."""
+        if not projection:
+            return _copy(document)
+        if isinstance(projection, (list, tuple)):
+            projection = {field: 1 for field in projection}
+        include_id = bool(projection.get("_id", 1))
+        fields = {k: v for k, v in projection.items() if k != "_id"}
+        if any(fields.values()):
+            tree = cls._tree(k for k, v in fields.items() if v)
+            if include_id:
+                tree["_id"] = True
+            return cls._include(document, tree)
+        tree = cls._tree(fields)
+        if not include_id:
+            tree["_id"] = True
+        return cls._exclude(document, tree)
+
+    @classmethod
+    def _field_key(cls, document, field, direction):
+        values = cls.values(document, field)
+        keys = [cls.sort_key(v) for v in cls._candidates(values) if not isinstance(v, list)] if values else []
+        if not keys:
+            return cls.sort_key(None)
+        # Con listas, MongoDB ordena por el menor elemento en orden ascendente y por el mayor en descendente
+        return min(keys) if direction > 0 else max(keys)
+
+    @classmethod
+    def normalize_sort(cls, key_or_list, direction=None):
+        """Criterios de ordenación como lista de (campo, dirección)."""
+        if key_or_list is None:
+            return []
+        if isinstance(key_or_list, str):
+            return [(key_or_list, direction or 1)]
+        if isinstance(key_or_list, dict):
+            return list(key_or_list.items())
+        return [(field, d) for field, d in key_or_list]
+
+    @classmethod
+    def sort(cls, documents, sort_criteria, limit=0):
+        """Ordenar (estable) por varios campos; con 'limit' y una sola dirección, con un heap."""
+        directions = {d for _, d in sort_criteria}
+        if limit and len(directions) == 1 and limit < len(documents):
+            direction = directions.pop()
+            key = lambda d: tuple(cls._field_key(d, f, direction) for f, _ in sort_criteria)
+            return heapq.nsmallest(limit, documents, key) if direction > 0 else heapq.nlargest(limit, documents, key)
+        documents = list(documents)
+        for field, direction in reversed(sort_criteria):
+            documents.sort(key=lambda d: cls._field_key(d, field, direction), reverse=direction < 0)
+        return documents
+
+    @classmethod
+    def _positional_index(cls, document, query, array_path):
+        """Índice del primer elemento de 'array_path' que cumple la parte del filtro sobre ese arreglo."""
+        conditions = []
+        pending = [query or {}]
+        while pending:
+            for key, condition in pending.pop().items():
+                if key == "$and":
+                    pending.extend(condition)
+                elif key == array_path or key.startswith(array_path + "."):
+                    conditions.append((key[len(array_path) + 1:], condition))
+        array = cls.values(document, array_path)
+        array = array[0] if array and isinstance(array[0], list) else []
+        for i, element in enumerate(array):
+            for sub_path, condition in conditions:
+                if not sub_path:
+                    if isinstance(condition, dict) and "$elemMatch" in condition:
+                        if cls._elem_match(element, condition["$elemMatch"]):
+                            return i
+                    elif cls._match_field({"v": element}, "v", condition):
+                        return i
+                elif isinstance(element, dict) and cls._match_field(element, sub_path, condition):
+                    return i
+        raise WriteError("The positional operator did not find the match needed from the query.", 2)
+
+    @classmethod
+    def _resolve_path(cls, document, path, query):
+        parts = path.split(".")
+        if "$" in parts:
+            position = parts.index("$")
+            parts[position] = str(cls._positional_index(document, query, ".".join(parts[:position])))
+        return parts
+
+    @staticmethod
+    def _parent(document, parts, create=True):
+        node = document
+        for part in parts[:-1]:
+            if isinstance(node, list):
+                index = int(part)
+                while create and len(node) <= index:
+                    node.append(None)
+                if index >= len(node):
+                    return None
+                if node[index] is None and create:
+                    node[index] = {}
+                node = node[index]
+            else:
+                if part not in node or node[part] is None:
+                    if not create:
+                        return None
+                    node[part] = {}
+                node = node[part]
+            if not isinstance(node, (dict, list)):
+                raise WriteError(f"Cannot create field '{parts[-1]}' in element {{{part}: {node!r}}}", 28)
+        return node
+
+    @classmethod
+    def _get(cls, document, parts):
+        parent = cls._parent(document, parts, create=False)
+        if parent is None:
+            return None, False
+        if isinstance(parent, list):
+            index = int(parts[-1])
+            return (parent[index], True) if index < len(parent) else (None, False)
+        return (parent[parts[-1]], True) if parts[-1] in parent else (None, False)
+
+    @classmethod
+    def _set(cls, document, parts, value):
+        parent = cls._parent(document, parts)
+        if isinstance(parent, list):
+            index = int(parts[-1])
+            while len(parent) <= index:
+                parent.append(None)
+            parent[index] = value
+        else:
+            parent[parts[-1]] = value
+
+    @classmethod
+    def _unset(cls, document, parts):
+        parent = cls._parent(document, parts, create=False)
+        if isinstance(parent, dict):
+            parent.pop(parts[-1], None)
+        elif isinstance(parent, list) and int(parts[-1]) < len(parent):
+            parent[int(parts[-1])] = None
+
+    @classmethod
+    def _expression(cls, document, expression):
+        """Evaluar una expresión de pipeline: referencias '$campo', literales, diccionarios y listas."""
+        if isinstance(expression, str) and expression.startswith("$") and not expression.startswith("$$"):
+            values = cls.values(document, expression[1:])
+            return _copy(values[0]) if values else None
+        if isinstance(expression, dict):
+            if len(expression) == 1 and "$literal" in expression:
+                return _copy(expression["$literal"])
+            if any(k.startswith("$") for k in expression):
+                raise OperationFailure(f"unsupported expression: {list(expression)}", 2)
+            return {k: cls._expression(document, v) for k, v in expression.items()}
+        if isinstance(expression, list):
+            return [cls._expression(document, v) for v in expression]
+        return _copy(expression)
+
+    @classmethod
+    def _pull_matches(cls, element, condition):
+        if cls._is_operator_dict(condition):
+            return cls._elem_match(element, condition)
+        if isinstance(condition, dict) and isinstance(element, dict):
+            return cls.matches(element, condition)
+        return cls._equals(element, condition)
+
+    @classmethod
+    def apply_update(cls, document, update, query=None, is_insert=False):
+        """Aplicar 'update' sobre 'document' en el sitio."""
+        if isinstance(update, list):
+            for stage in update:
+                for name, fields in stage.items():
+                    if name in ("$set", "$addFields"):
+                        for path, expression in fields.items():
+                            cls._set(document, path.split("."), cls._expression(document, expression))
+                    elif name == "$unset":
+                        for path in [fields] if isinstance(fields, str) else fields:
+                            cls._unset(document, path.split("."))
+                    else:
+                        raise OperationFailure(f"unsupported pipeline stage: {name}", 2)
+            return
+
+        for operator, fields in update.items():
+            if operator == "$setOnInsert" and not is_insert:
+                continue
+            for path, argument in fields.items():
+                parts = cls._resolve_path(document, path, query)
+                if parts[0] == "_id" and operator != "$setOnInsert" and not is_insert:
+                    raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+                current, exists = cls._get(document, parts)
+                if operator in ("$set", "$setOnInsert"):
+                    cls._set(document, parts, _copy(argument))
+                elif operator == "$unset":
+                    cls._unset(document, parts)
+                elif operator in ("$inc", "$mul"):
+                    if exists and (not isinstance(current, (int, float)) or isinstance(current, bool)):
+                        raise WriteError(f"Cannot apply {operator} to a value of non-numeric type", 14)
+                    base = current if exists else 0
+                    cls._set(document, parts, base + argument if operator == "$inc" else base * argument)
+                elif operator in ("$min", "$max"):
+                    if not exists or (cls.sort_key(argument) < cls.sort_key(current) if operator == "$min"
+                                      else cls.sort_key(argument) > cls.sort_key(current)):
+                        cls._set(document, parts, _copy(argument))
+                elif operator in ("$push", "$addToSet"):
+                    if exists and not isinstance(current, list):
+                        raise WriteError(f"The field '{path}' must be an array", 2)
+                    array = current if exists else []
+                    items = argument["$each"] if isinstance(argument, dict) and "$each" in argument else [argument]
+                    for item in items:
+                        if operator == "$push" or not any(cls._equals(e, item) for e in array):
+                            array.append(_copy(item))
+                    cls._set(document, parts, array)
+                elif operator == "$pull":
+                    if exists and isinstance(current, list):
+                        cls._set(document, parts, [e for e in current if not cls._pull_matches(e, argument)])
+                elif operator == "$pop":
+                    if exists and isinstance(current, list) and current:
+                        current.pop(0 if argument < 0 else -1)
+                elif operator == "$currentDate":
+                    cls._set(document, parts, datetime.now(timezone.utc).replace(tzinfo=None))
+                else:
+                    raise WriteError(f"Unknown modifier: {operator}", 9)
+
+class MemoryIndex:
+    """
+    Índice secundario de una colección en memoria.
+
+    Cada índice guarda una tabla hash (valores de los campos -> IDs) para las igualdades y los índices
+    únicos, y los de un solo campo además una lista ordenada para los rangos ($gt, $lt...). Los arreglos se
+    indexan por elemento, como los índices multikey. Los índices geoespaciales solo se registran: las
+    consultas $geoWithin y $nearSphere recorren la colección.
+    """
+
+    def __init__(self, name, keys, unique=False, partialFilterExpression=None, expireAfterSeconds=None, **options):
+        self.name = name
+        self.keys = keys
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.partial = partialFilterExpression
+        self.expire_after = expireAfterSeconds
+        self.options = options
+        self.geo = any(isinstance(direction, str) for _, direction in keys)
+        self.entries = {}
+        self.sorted = [] if len(self.fields) == 1 and not self.geo else None
+
+    def info(self):
+        """Descripción del índice con el formato de index_information()."""
+        info = {"v": 2, "key": list(self.keys)}
+        if self.unique and self.name != "_id_":
+            info["unique"] = True
+        if self.partial is not None:
+            info["partialFilterExpression"] = self.partial
+        if self.expire_after is not None:
+            info["expireAfterSeconds"] = self.expire_after
+        if self.geo:
+            info["2dsphereIndexVersion"] = 3
+        return info
+
+    def covers(self, document):
+        return self.partial is None or MemoryQuery.matches(document, self.partial)
+
+    def _field_values(self, document, field):
+        values = MemoryQuery.values(document, field)
+        if not values:
+            return [None]
+        expanded = []
+        for value in values:
+            if isinstance(value, list):
+                expanded.extend(value or [None])
+            else:
+                expanded.append(value)
+        return expanded
+
+    def keys_of(self, document):
+        """Claves del documento en el índice (varias si algún campo es un arreglo)."""
+        if self.geo or not self.covers(document):
+            return []
+        combinations = itertools.product(*(self._field_values(document, field) for field in self.fields))
+        return list({tuple(_freeze(v) for v in combination): combination for combination in combinations}.items())
+
+    def conflicts(self, document, document_id):
+        """Devolver la clave duplicada si el documento rompe la unicidad del índice, o None."""
+        if not self.unique:
+            return None
+        for key, _ in self.keys_of(document):
+            if self.entries.get(key, set()) - {document_id}:
+                return key
+        return None
+
+    def add(self, document, document_id):
+        for key, values in self.keys_of(document):
+            self.entries.setdefault(key, set()).add(document_id)
+            if self.sorted is not None:
+                insort(self.sorted, (MemoryQuery.sort_key(values[0]), MemoryQuery.sort_key(document_id), document_id))
+
+    def remove(self, document, document_id):
+        for key, values in self.keys_of(document):
+            ids = self.entries.get(key)
+            if ids is not None:
+                ids.discard(document_id)
+                if not ids:
+                    del self.entries[key]
+            if self.sorted is not None:
+                entry = (MemoryQuery.sort_key(values[0]), MemoryQuery.sort_key(document_id))
+                position = bisect_left(self.sorted, entry)
+                if position < len(self.sorted) and self.sorted[position][:2] == entry:
+                    del self.sorted[position]
+
+    def lookup(self, values):
+        """IDs con esos valores exactos en los campos del índice."""
+        return self.entries.get(tuple(_freeze(v) for v in values), set())
+
+    def range(self, condition):
+        """IDs cuyo valor cumple los operadores de rango de 'condition', dentro del mismo tipo de BSON."""
+        bounds = {op: condition[op] for op in ("$gt", "$gte", "$lt", "$lte") if op in condition}
+        ranks = {MemoryQuery.type_rank(v) for v in bounds.values()}
+        if len(ranks) != 1:
+            return None
+        rank = ranks.pop()
+        start, end = bisect_left(self.sorted, ((rank,),)), bisect_left(self.sorted, ((rank + 1,),))
+        for op in ("$gt", "$gte"):
+            if op in bounds:
+                key = MemoryQuery.sort_key(bounds[op])
+                start = max(start, bisect_left(self.sorted, (key,)))
+                while op == "$gt" and start < end and self.sorted[start][0] == key:
+                    start += 1
+        for op in ("$lt", "$lte"):
+            if op in bounds:
+                key = MemoryQuery.sort_key(bounds[op])
+                stop = bisect_left(self.sorted, (key,))
+                while op == "$lte" and stop < end and self.sorted[stop][0] == key:
+                    stop += 1
+                end = min(end, stop)
+        return {entry[2] for entry in self.sorted[start:end]}
+
+class MemoryCursor:
+    """Cursor asíncrono sobre el resultado de un find() en memoria, con sort/skip/limit/batch_size."""
+
+    def __init__(self, collection, query=None, projection=None, batch_size=0, sort=None, skip=0, limit=0):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._batch_size = batch_size or 101
+        self._sort = MemoryQuery.normalize_sort(sort)
+        self._skip = skip
+        self._limit = limit
+        self._results = None
+        self._position = 0
+        self._closed = False
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = MemoryQuery.normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = abs(limit)
+        return self
+
+    def batch_size(self, batch_size):
+        self._batch_size = batch_size or 101
+        return self
+
+    def _execute(self):
+        documents = self._collection._select(self._query)
+        near = MemoryQuery.near_distance(self._query)
+        wanted = self._skip + self._limit if self._limit else 0
+        if self._sort:
+            documents = MemoryQuery.sort(documents, self._sort, wanted)
+        elif near is not None:
+            documents = sorted(documents, key=near)
+        end = self._skip + self._limit if self._limit else None
+        self._results = documents[self._skip:end]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._results is None:
+            self._execute()
+        if self._closed or self._position >= len(self._results):
+            raise StopAsyncIteration
+        if self._position and self._position % self._batch_size == 0:
+            # Entre lotes se cede el bucle de eventos, como al pedir el siguiente lote al servidor
+            await asyncio.sleep(0)
+        document = self._results[self._position]
+        self._position += 1
+        return MemoryQuery.project(document, self._projection)
+
+    async def next(self):
+        return await self.__anext__()
+
+    async def to_list(self, length=None):
+        documents = []
+        async for document in self:
+            documents.append(document)
+            if length and len(documents) >= length:
+                break
+        return documents
+
+    async def close(self):
+        self._closed = True
+
+class MemoryCollection:
+    """
+    Colección en memoria con la interfaz de AsyncCollection que usa AsyncDatabaseConnection.
+
+    Los documentos se guardan en un diccionario por _id en orden de inserción y se copian al leer y al
+    escribir, así que quien los recibe puede modificarlos sin afectar a la colección. Las operaciones no
+    ceden el bucle de eventos mientras modifican datos, por lo que cada escritura es atómica.
+    """
+
+    TTL_INTERVAL_SECONDS = 60  # Como el monitor TTL de MongoDB
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._documents = {}
+        self._indexes = {"_id_": MemoryIndex("_id_", [("_id", 1)], unique=True)}
+        self._ttl_checked = 0.0
+
+    def _expire(self):
+        """Borrar los documentos caducados de los índices TTL, como mucho una vez por minuto."""
+        ttl_indexes = [index for index in self._indexes.values() if index.expire_after is not None]
+        now = time.monotonic()
+        if not ttl_indexes or now - self._ttl_checked < self.TTL_INTERVAL_SECONDS:
+            return
+        self._ttl_checked = now
+        utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for index in ttl_indexes:
+            limit = utc_now - timedelta(seconds=index.expire_after)
+            for document_id, document in list(self._documents.items()):
+                dates = [MemoryQuery._normalize(v) for v in MemoryQuery.values(document, index.fields[0]) if isinstance(v, datetime)]
+                if dates and min(dates) < limit:
+                    self._remove(document_id)
+
+    def _plan(self, query):
+        """IDs candidatos según los índices, o None si hay que recorrer la colección."""
+        best = None
+        for key, condition in query.items():
+            if key == "$and":
+                for sub in condition:
+                    candidates = self._plan(sub)
+                    if candidates is not None and (best is None or len(candidates) < len(best)):
+                        best = candidates
+        for index in self._indexes.values():
+            if index.geo or index.partial is not None or any(f not in query for f in index.fields):
+                continue
+            conditions = [query[f] for f in index.fields]
+            candidates = None
+            if all(not isinstance(c, (dict, list)) for c in conditions):
+                candidates = index.lookup(conditions)
+            elif len(conditions) == 1 and isinstance(conditions[0], dict):
+                condition = conditions[0]
+                if set(condition) == {"$in"} and all(not isinstance(v, (dict, list, re.Pattern)) for v in condition["$in"]):
+                    candidates = set().union(*(index.lookup([v]) for v in condition["$in"]))
+                elif "$eq" in condition and set(condition) == {"$eq"} and not isinstance(condition["$eq"], (dict, list)):
+                    candidates = index.lookup([condition["$eq"]])
+                elif index.sorted is not None and condition and set(condition) <= {"$gt", "$gte", "$lt", "$lte"}:
+                    candidates = index.range(condition)
+            if candidates is not None and (best is None or len(candidates) < len(best)):
+                best = candidates
+        return best
+
+    def _select(self, query):
+        """Documentos guardados (sin copiar) que cumplen el filtro, en orden de inserción."""
+        self._expire()
+        candidates = self._plan(query or {})
+        if candidates is None:
+            documents = self._documents.values()
+        else:
+            documents = [d for d in self._documents.values() if d["_id"] in candidates] \
+                if len(candidates) * 8 > len(self._documents) else \
+                sorted((self._documents[i] for i in candidates if i in self._documents), key=self._order)
+        return [d for d in documents if MemoryQuery.matches(d, query)]
+
+    def _order(self, document):
+        return self._sequence[document["_id"]]
+
+    @property
+    def _sequence(self):
+        # Posición de inserción de cada documento, recalculada solo cuando cambia la colección
+        if getattr(self, "_sequence_version", None) is not self._documents_version:
+            self._sequence_cache = {document_id: i for i, document_id in enumerate(self._documents)}
+            self._sequence_version = self._documents_version
+        return self._sequence_cache
+
+    _documents_version = None
+
+    def _changed(self):
+        self._documents_version = object()
+
+    def _duplicate_error(self, index, key):
+        message = f"E11000 duplicate key error collection: {self.full_name} index: {index.name} dup key: {key}"
+        return DuplicateKeyError(message, 11000, {"code": 11000, "errmsg": message, "keyPattern": dict(index.keys)})
+
+    def _check_unique(self, document, document_id):
+        for index in self._indexes.values():
+            key = index.conflicts(document, document_id)
+            if key is not None:
+                raise self._duplicate_error(index, key)
+
+    def _insert(self, document):
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        # Como en BSON, _id es el primer campo del documento guardado
+        stored = {"_id": document["_id"], **_copy(document)}
+        self._check_unique(stored, object())
+        self._documents[stored["_id"]] = stored
+        for index in self._indexes.values():
+            index.add(stored, stored["_id"])
+        self._changed()
+        return stored["_id"]
+
+    def _remove(self, document_id):
+        document = self._documents.pop(document_id)
+        for index in self._indexes.values():
+            index.remove(document, document_id)
+        self._changed()
+
+    def _replace(self, document_id, updated):
+        self._check_unique(updated, document_id)
+        current = self._documents[document_id]
+        for index in self._indexes.values():
+            index.remove(current, document_id)
+        self._documents[document_id] = updated
+        for index in self._indexes.values():
+            index.add(updated, document_id)
+
+    def _update(self, query, update, upsert=False, multi=False):
+        """Aplicar una actualización y devolver (coincidencias, modificados, ID insertado, [(antes, después)])."""
+        matched, modified, upserted_id, changes = 0, 0, None, []
+        for document in self._select(query):
+            updated = _copy(document)
+            MemoryQuery.apply_update(updated, update, query)
+            matched += 1
+            if updated != document:
+                self._replace(document["_id"], updated)
+                modified += 1
+            changes.append((document, self._documents[document["_id"]]))
+            if not multi:
+                break
+        if matched == 0 and upsert:
+            document = {k: _copy(v) for k, v in query.items() if not k.startswith("$") and not MemoryQuery._is_operator_dict(v)}
+            MemoryQuery.apply_update(document, update, query, is_insert=True)
+            upserted_id = self._insert(document)
+            changes.append((None, self._documents[upserted_id]))
+        return matched, modified, upserted_id, changes
+
+    @staticmethod
+    def _update_result(matched, modified, upserted_id):
+        raw = {"n": matched + (1 if upserted_id is not None else 0), "nModified": modified, "ok": 1.0}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def find(self, filter=None, projection=None, skip=0, limit=0, sort=None, batch_size=0, **kwargs):
+        return MemoryCursor(self, filter, projection, batch_size, sort, skip, limit)
+
+    async def find_one(self, filter=None, projection=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        documents = await MemoryCursor(self, filter, projection, sort=kwargs.get("sort")).limit(1).to_list()
+        return documents[0] if documents else None
+
+    async def insert_one(self, document, *args, **kwargs):
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents, ordered=True, *args, **kwargs):
+        inserted, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                                  "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult(inserted, True)
+
+    async def update_one(self, filter, update, upsert=False, *args, **kwargs):
+        matched, modified, upserted_id, _ = self._update(filter, update, upsert)
+        return self._update_result(matched, modified, upserted_id)
+
+    async def update_many(self, filter, update, upsert=False, *args, **kwargs):
+        matched, modified, upserted_id, _ = self._update(filter, update, upsert, multi=True)
+        return self._update_result(matched, modified, upserted_id)
+
+    async def replace_one(self, filter, replacement, upsert=False, *args, **kwargs):
+        for document in self._select(filter)[:1]:
+            updated = {"_id": document["_id"], **_copy({k: v for k, v in replacement.items() if k != "_id"})}
+            modified = updated != document
+            if modified:
+                self._replace(document["_id"], updated)
+            return self._update_result(1, int(modified), None)
+        if upsert:
+            return self._update_result(0, 0, self._insert(dict(replacement)))
+        return self._update_result(0, 0, None)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE, *args, **kwargs):
+        if sort:
+            first = MemoryQuery.sort(self._select(filter), MemoryQuery.normalize_sort(sort), 1)
+            filter = {"_id": first[0]["_id"]} if first else filter
+        _, _, _, changes = self._update(filter, update, upsert)
+        if not changes:
+            return None
+        before, after = changes[0]
+        document = after if return_document else before
+        return MemoryQuery.project(document, projection) if document is not None else None
+
+    async def delete_one(self, filter, *args, **kwargs):
+        documents = self._select(filter)[:1]
+        for document in documents:
+            self._remove(document["_id"])
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    async def delete_many(self, filter, *args, **kwargs):
+        documents = self._select(filter)
+        for document in documents:
+            self._remove(document["_id"])
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    async def count_documents(self, filter, *args, **kwargs):
+        return len(self._select(filter))
+
+    async def estimated_document_count(self, *args, **kwargs):
+        self._expire()
+        return len(self._documents)
+
+    async def distinct(self, key, filter=None, *args, **kwargs):
+        values = {}
+        for document in self._select(filter):
+            for value in MemoryQuery._candidates(MemoryQuery.values(document, key)):
+                if not isinstance(value, list):
+                    values.setdefault(_freeze(value), value)
+        return list(values.values())
+
+    async def bulk_write(self, requests, ordered=True, *args, **kwargs):
+        """Ejecutar InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne y DeleteMany con errores por operación."""
+        result = {"writeErrors": [], "writeConcernErrors": [], "nInserted": 0, "nUpserted": 0,
+                  "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany)):
+                    matched, modified, upserted_id, _ = self._update(request._filter, request._doc, request._upsert,
+                                                                     multi=isinstance(request, UpdateMany))
+                    result["nMatched"] += matched
+                    result["nModified"] += modified
+                    if upserted_id is not None:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": upserted_id})
+                elif isinstance(request, ReplaceOne):
+                    replaced = await self.replace_one(request._filter, request._doc, request._upsert)
+                    result["nMatched"] += replaced.matched_count
+                    result["nModified"] += replaced.modified_count
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    documents = self._select(request._filter)
+                    for document in documents if isinstance(request, DeleteMany) else documents[:1]:
+                        self._remove(document["_id"])
+                        result["nRemoved"] += 1
+                else:
+                    raise OperationFailure(f"unsupported bulk operation: {type(request).__name__}", 2)
+            except (WriteError, OperationFailure) as e:
+                result["writeErrors"].append({"index": i, "code": e.code or 2, "errmsg": str(e)})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    async def index_information(self, *args, **kwargs):
+        return {name: index.info() for name, index in self._indexes.items()}
+
+    async def create_index(self, keys, name=None, **options):
+        """Crear un índice; si es único y hay duplicados, falla como en MongoDB y no se crea."""
+        keys = MemoryQuery.normalize_sort(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if name in self._indexes:
+            return name
+        options.pop("background", None)
+        index = MemoryIndex(name, keys, **options)
+        for document_id, document in self._documents.items():
+            key = index.conflicts(document, document_id)
+            if key is not None:
+                raise self._duplicate_error(index, key)
+            index.add(document, document_id)
+        self._indexes[name] = index
+        return name
+
+    async def drop_index(self, name, *args, **kwargs):
+        if name == "_id_" or name not in self._indexes:
+            raise OperationFailure(f"index not found with name [{name}]", 27)
+        del self._indexes[name]
+
+    async def drop(self, *args, **kwargs):
+        self._empty()
+
+    def _empty(self):
+        # El objeto sigue siendo válido después de drop(), como una AsyncCollection: se vacía en el sitio
+        self._documents = {}
+        self._indexes = {"_id_": MemoryIndex("_id_", [("_id", 1)], unique=True)}
+        self._changed()
+
+class MemoryDatabase:
+    """Base de datos en memoria: un diccionario de colecciones que se crean al usarlas."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def get_collection(self, name, *args, **kwargs):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    async def list_collection_names(self, *args, **kwargs):
+        return list(self._collections)
+
+    async def drop_collection(self, name, *args, **kwargs):
+        if name in self._collections:
+            await self._collections[name].drop()
+
+    async def command(self, command, *args, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ("ping", "hello", "isMaster", "ismaster"):
+            return {"ok": 1.0}
+        raise OperationFailure(f"no such command: '{name}'", 59)
+
+class MemoryClient:
+    """
+    MemoryClient sustituye a AsyncMongoClient cuando DB_BACKEND=memory: mismas operaciones que usa la
+    aplicación, pero sobre diccionarios del proceso, sin red ni servidor.
+    Métodos de Clase:
+    - reset(cls): Borra todas las bases de datos en memoria.
+    Los datos se comparten entre los clientes del mismo proceso, así que sobreviven a close_connection()
+    y a un nuevo connect(). No se comparten entre procesos: con varios workers, cada uno tiene los suyos.
+    """
+
+    _databases = {}
+
+    def __init__(self, *args, **kwargs):
+        # Las opciones de AsyncMongoClient (pool, timeouts, listeners...) no tienen efecto en memoria
+        self.admin = MemoryDatabase(self, "admin")
+
+    def __getitem__(self, name):
+        return self.get_database(name)
+
+    def get_database(self, name, *args, **kwargs):
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(self, name)
+        return self._databases[name]
+
+    async def close(self):
+        pass
+
+    @classmethod
+    def reset(cls):
+        """
+        Borrar todas las bases de datos en memoria. Las colecciones se vacían en el sitio, así que las
+        referencias que ya tenga la aplicación (p. ej. la base de datos de AsyncDatabaseConnection) ven el cambio.
+        """
+        for database in cls._databases.values():
+            for collection in database._collections.values():
+                collection._empty()
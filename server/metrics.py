@@ -0,0 +1,267 @@
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+class Metrics:
+    """
+    Metrics guarda en memoria contadores, indicadores (gauges) e histogramas y los expone en el formato
+    de texto de Prometheus. Cada worker tiene los suyos; con varios workers, cada uno publica sus valores.
+    Métodos de Clase:
+    - inc(cls, name, labels, value): Suma a un contador o a un indicador.
+    - set(cls, name, labels, value): Fija el valor de un indicador.
+    - observe(cls, name, labels, value): Añade una observación a un histograma.
+    - add_collector(cls, collector): Registra una función que devuelve indicadores calculados al publicar.
+    - render(cls): Texto para GET /metrics.
+    """
+
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+    DEFINITIONS = {
+        "http_requests_total": ("counter", "Peticiones HTTP atendidas por ruta, método y código de estado", None),
+        "http_request_duration_seconds": ("histogram", "Duración de las peticiones HTTP por ruta y método", LATENCY_BUCKETS),
+        "http_requests_in_flight": ("gauge", "Peticiones HTTP en curso por ruta y método", None),
+        "db_operation_duration_seconds": ("histogram", "Duración de los métodos de AsyncDatabaseConnection", LATENCY_BUCKETS),
+        "db_operation_errors_total": ("counter", "Métodos de AsyncDatabaseConnection que han lanzado una excepción", None),
+        "db_documents_returned": ("histogram", "Documentos devueltos por cada método de AsyncDatabaseConnection", SIZE_BUCKETS),
+        "mongo_pool_connections": ("gauge", "Conexiones abiertas del pool de MongoDB por servidor", None),
+        "mongo_pool_connections_in_use": ("gauge", "Conexiones del pool de MongoDB prestadas a una operación", None),
+        "mongo_pool_checkout_failures_total": ("counter", "Esperas del pool de MongoDB que no han conseguido conexión", None),
+        "mongo_pool_cleared_total": ("counter", "Veces que se ha vaciado el pool de MongoDB", None),
+    }
+
+    _values = {}
+    _histograms = {}
+    _collectors = []
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    @classmethod
+    def inc(cls, name, labels=None, value=1):
+        """Sumar 'value' a un contador o a un indicador."""
+        key = (name, cls._key(labels))
+        cls._values[key] = cls._values.get(key, 0) + value
+
+    @classmethod
+    def set(cls, name, labels=None, value=0):
+        """Fijar el valor de un indicador."""
+        cls._values[(name, cls._key(labels))] = value
+
+    @classmethod
+    def observe(cls, name, labels=None, value=0.0):
+        """Añadir una observación a un histograma."""
+        key = (name, cls._key(labels))
+        histogram = cls._histograms.get(key)
+        if histogram is None:
+            buckets = cls.DEFINITIONS[name][2]
+            histogram = cls._histograms[key] = {"counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+        histogram["counts"][bisect_left(cls.DEFINITIONS[name][2], value)] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    @classmethod
+    def add_collector(cls, collector):
+        """
+        Registrar una función sin argumentos que devuelve [(nombre, ayuda, {etiquetas}, valor)] con indicadores
+        que se calculan al publicar (p. ej. los contadores de las cachés). Se ejecuta en el bucle de eventos, así
+        que no debe bloquear (nada de E/S).
+        """
+        cls._collectors.append(collector)
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+                   for k, v in labels)
+        return "{" + ",".join(escaped) + "}"
+
+    @classmethod
+    def render(cls) -> str:
+        """Devolver todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        lines = []
+        for name, (kind, description, buckets) in cls.DEFINITIONS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), histogram in list(cls._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(buckets) + ["+Inf"], histogram["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{cls._format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{cls._format_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{cls._format_labels(labels)} {histogram['count']}")
+            else:
+                for (metric, labels), value in list(cls._values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{cls._format_labels(labels)} {value}")
+
+        collected = {}
+        for collector in cls._collectors:
+            try:
+                for name, description, labels, value in collector():
+                    collected.setdefault(name, (description, []))[1].append((cls._key(labels), value))
+            except Exception as e:
+                logger.warning(f"No se han podido calcular las métricas de {collector}: {e}")
+        for name, (description, samples) in collected.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{cls._format_labels(labels)} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+def _documents_in(result):
+    """Número de documentos de un resultado de AsyncDatabaseConnection, o None si no devuelve documentos."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict):
+        return 1
+    return None
+
+def timed(function):
+    """
+    Decorador de los métodos de AsyncDatabaseConnection: mide la duración por operación y colección, cuenta
+    los errores y los documentos devueltos. En los generadores asíncronos la duración incluye el tiempo que
+    tarda quien los consume.
+    """
+    operation = function.__name__
+
+    def collection_of(args, kwargs):
+        return kwargs.get("collection_name") or (args[0] if args and isinstance(args[0], str) else "-")
+
+    if inspect.isasyncgenfunction(function):
+        @functools.wraps(function)
+        async def stream_wrapper(cls, *args, **kwargs):
+            labels = {"operation": operation, "collection": collection_of(args, kwargs)}
+            start, count = time.perf_counter(), 0
+            try:
+                async for item in function(cls, *args, **kwargs):
+                    count += 1
+                    yield item
+            except Exception:
+                Metrics.inc("db_operation_errors_total", labels)
+                raise
+            finally:
+                Metrics.observe("db_operation_duration_seconds", labels, time.perf_counter() - start)
+                Metrics.observe("db_documents_returned", labels, count)
+        return stream_wrapper
+
+    @functools.wraps(function)
+    async def wrapper(cls, *args, **kwargs):
+        labels = {"operation": operation, "collection": collection_of(args, kwargs)}
+        start = time.perf_counter()
+        try:
+            result = await function(cls, *args, **kwargs)
+        except Exception:
+            Metrics.inc("db_operation_errors_total", labels)
+            raise
+        finally:
+            Metrics.observe("db_operation_duration_seconds", labels, time.perf_counter() - start)
+        documents = _documents_in(result)
+        if documents is not None:
+            Metrics.observe("db_documents_returned", labels, documents)
+        return result
+    return wrapper
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Listener de pymongo que mantiene los indicadores del pool de conexiones de cada servidor."""
+
+    def _labels(self, event):
+        host, port = event.address
+        return {"address": f"{host}:{port}"}
+
+    def pool_created(self, event):
+        Metrics.set("mongo_pool_connections", self._labels(event), 0)
+        Metrics.set("mongo_pool_connections_in_use", self._labels(event), 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        Metrics.inc("mongo_pool_cleared_total", self._labels(event))
+
+    def pool_closed(self, event):
+        Metrics.set("mongo_pool_connections", self._labels(event), 0)
+        Metrics.set("mongo_pool_connections_in_use", self._labels(event), 0)
+
+    def connection_created(self, event):
+        Metrics.inc("mongo_pool_connections", self._labels(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        Metrics.inc("mongo_pool_connections", self._labels(event), -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        Metrics.inc("mongo_pool_checkout_failures_total", self._labels(event))
+
+    def connection_checked_out(self, event):
+        Metrics.inc("mongo_pool_connections_in_use", self._labels(event))
+
+    def connection_checked_in(self, event):
+        Metrics.inc("mongo_pool_connections_in_use", self._labels(event), -1)
+
+def route_template(scope) -> str:
+    """
+    Plantilla de la ruta que atiende una petición (p. ej. /api/v1/users/{id}) o 'unmatched'.
+
+    Como el router de Starlette, se prefiere la primera ruta que encaja con la ruta y el método (FULL); una
+    que solo encaja con la ruta (PARTIAL, p. ej. PUT /users/username-available antes que PUT /users/{id})
+    se usa solo si no hay ninguna completa, y entonces la respuesta es un 405.
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que registra por ruta (la plantilla, p. ej. /api/v1/users/{id}) y método la duración,
+    las peticiones en curso y los códigos de estado. Las peticiones que no encajan con ninguna ruta se
+    agrupan en route="unmatched" para no crear una serie por URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        labels = {"method": scope["method"], "route": route_template(scope)}
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        Metrics.inc("http_requests_in_flight", labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            Metrics.inc("http_requests_in_flight", labels, -1)
+            Metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+            Metrics.inc("http_requests_total", {**labels, "status": str(status["code"])})
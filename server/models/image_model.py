@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import List
 from datetime import datetime
 
 class Image(BaseModel):
@@ -16,8 +17,24 @@ class Image(BaseModel):
         URL de acceso a la imagen (obligatorio)
     date : str
         Fecha de creación de la imagen en formato ISO (obligatorio)
+    sha256 : str
+        Hash SHA-256 del fichero original, usado para detectar imágenes repetidas
+    variants : dict
+        Versiones reducidas en WebP por nombre, con su url, ancho y alto
     """
     name: str = Field(default=None, example="profile_picture.png")
     ownerId: int = Field(default=None, example=1)
     url: str = Field(default=None, example="https://res.cloudinary.com/demo/image/upload/v1234567890/sample.jpg")
     timestamp: str = Field(default=datetime.now().isoformat(), example=datetime.now().isoformat())
+    sha256: str = Field(default=None, example="9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
+    variants: dict = Field(default=None, example={"thumb": {"url": "https://res.cloudinary.com/demo/image/upload/thumb.webp", "width": 160, "height": 120, "format": "webp"}})
+
+class UploadSessionCreate(BaseModel):
+    """Datos para abrir una subida por partes."""
+    filename: str = Field(min_length=1, example="foto.jpg")
+    size: int = Field(gt=0, example=5242880)
+    sha256: str = Field(default=None, min_length=64, max_length=64, example="9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
+
+class ImageLookup(BaseModel):
+    ids: List[str] = Field(default_factory=list, example=["5f3c3e7d7f43b5a3b1c1e123"])
+    fields: str | None = Field(default=None, description="Campos específicos a devolver, separados por comas")
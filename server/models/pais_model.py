@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import List
 
 class Pais(BaseModel):
     id: str = Field(default=None)
@@ -7,12 +8,13 @@ class Pais(BaseModel):
     lat: float = Field(default=None)
     lon: float = Field(default=None)
     imagen: str = Field(default=None)
+    location: dict = Field(default=None)
 
 class PaisCreate(BaseModel):
     nombre: str = Field(default=None, validate_default=True)
     email: str = Field(default=None, validate_default=True)
-    lat: float = Field(default=None, validate_default=True)
-    lon: float = Field(default=None, validate_default=True)
+    lat: float | None = Field(default=None, description="Si se omite junto con lon, se obtiene del nombre")
+    lon: float | None = Field(default=None, description="Si se omite junto con lat, se obtiene del nombre")
     imagen: str = Field(default=None, validate_default=True)
 
 class PaisUpdate(BaseModel):
@@ -22,5 +24,15 @@ class PaisUpdate(BaseModel):
     lon: float | None = Field(default=None)
     imagen: str | None = Field(default=None)
 
+class PaisBatchUpdate(PaisUpdate):
+    id: str = Field(min_length=24, max_length=24)
+
+class PaisBatchDelete(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+
+class PaisLookup(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    fields: str | None = Field(default=None, description="Campos específicos a devolver, separados por comas")
+
 class PaisDeleteResponse(BaseModel):
     details: str = "El país se ha eliminado correctamente."
\ No newline at end of file
@@ -38,11 +38,23 @@ class UserUpdate(BaseModel):
     surname: str = Field(default=None, example="Doe", validate_default=True)
     description: str = Field(default=None, example="John Doe is a software engineer.", validate_default=True)
     profilePicture: str = Field(default=None, example="https://example.com/profile.jpg", validate_default=True)
+    # Opcional: solo se cambia si se envía; el índice único de userName rechaza los nombres en uso
+    userName: str = Field(default=None, example="johndoe")
 
     reviews: List[Review] = Field(default_factory=list, example=[{
         "user": "5f3c3e7d7f43b5a3b1c1e123",
         "rating": 5
     }])
 
+class UserBatchUpdate(UserUpdate):
+    id: str = Field(min_length=24, max_length=24, example="5f3c3e7d7f43b5a3b1c1e123")
+
+class UserBatchDelete(BaseModel):
+    ids: List[str] = Field(default_factory=list, example=["5f3c3e7d7f43b5a3b1c1e123"])
+
+class UserLookup(BaseModel):
+    ids: List[str] = Field(default_factory=list, example=["5f3c3e7d7f43b5a3b1c1e123"])
+    fields: str | None = Field(default=None, description="Campos específicos a devolver, separados por comas")
+
 class UserDeleteResponse(BaseModel):
     details: str = "El usuario se ha borrado correctamente."
@@ -1,29 +1,26 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 
+import logging
 import random
 import os
 
 from typing import Optional, Dict, List
 from fastapi import APIRouter, HTTPException, Query, Request, Path, UploadFile, File
-from fastapi.responses import JSONResponse
-import cloudinary
-import cloudinary.uploader
+from pymongo.errors import DuplicateKeyError
 
-from models.image_model import Image
-from db_connection import DatabaseConnection
+from models.image_model import Image, ImageLookup, UploadSessionCreate
+from async_db_connection import AsyncDatabaseConnection
 from api_utils import APIUtils
+from serializers import FastJSONResponse
+from upload_jobs import UploadJobs
+from upload_sessions import UploadSessions
+from image_variants import ImageVariants
 
-from dotenv import load_dotenv
+from media_storage import Storage, LocalStorage, FileRangeResponse
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-cloudinary.config(
-    cloud_name = os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key = os.getenv("CLOUDINARY_API_KEY"),
-    api_secret = os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
 router = APIRouter()
 
 endpoint_name = "media"
@@ -38,7 +35,10 @@ async def get_images(
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
     limit: int = Query(default=10, description="Cantidad de imagenes a devolver, por defecto 10"),
-    hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS")
+    hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS"),
+    after: str | None = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    stream: bool | None = Query(None, description="Devolver los resultados en streaming (NDJSON)"),
+    ids: str | None = Query(None, description="IDs separados por comas: devuelve esos imágenes en el mismo orden e ignora los demás filtros")
 ):
     APIUtils.check_accept_json(request)
 
@@ -47,19 +47,50 @@ async def get_images(
         projection = APIUtils.build_projection(fields)
         sort_criteria = APIUtils.build_sort_criteria(sort)
 
-        images = DatabaseConnection.query_document("image", query, projection, sort_criteria, offset, limit)
+        if ids is not None:
+            images, missing = await AsyncDatabaseConnection.read_documents_ids("image", APIUtils.parse_ids(ids), projection, hasDate=True)
+            headers = APIUtils.add_missing_ids({"X-Total-Count": str(len(images))}, missing)
+            return APIUtils.conditional_response(request, images, headers=headers, last_modified=last_modified(images))
+
+        if APIUtils.wants_ndjson(request, stream):
+            return APIUtils.ndjson_response(AsyncDatabaseConnection.stream_documents("image", query, projection, sort_criteria, offset, limit, hasDate=True))
+
+        next_cursor = None
+        if after or (offset == 0 and limit > 0):
+            images, next_cursor = await AsyncDatabaseConnection.query_document_after("image", query, projection, sort_criteria, after, limit, hasDate=True)
+        else:
+            images = await AsyncDatabaseConnection.query_document("image", query, projection, sort_criteria, offset, limit, hasDate=True)
         
-        total_count = len(images)
+        total_count = await AsyncDatabaseConnection.count_documents_cached("image", query)
 
         if hateoas:
             for image in images:
                 image["href"] = f"/api/{version}/{endpoint_name}/{image['_id']}"
 
-        return JSONResponse(status_code=200, content=images, 
-                            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)})
+        headers = {"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
+        return APIUtils.conditional_response(request, images,
+                                             headers=APIUtils.add_next_cursor(request, headers, next_cursor),
+                                             last_modified=last_modified(images))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar la imagen: {str(e)}")
 
+@router.post("/" + endpoint_name + ":lookup", tags=["Images CRUD endpoints"])
+async def lookup_images(request: Request, body: ImageLookup):
+    """Obtener varias imágenes por ID en una sola consulta, para listas demasiado largas para la URL."""
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(body.ids)
+
+    try:
+        images, missing = await AsyncDatabaseConnection.read_documents_ids("image", body.ids, APIUtils.build_projection(body.fields), hasDate=True)
+        return FastJSONResponse(status_code=200, content={"results": images, "missing": missing},
+                                headers={"X-Total-Count": str(len(images))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar las imágenes: {str(e)}")
+
 @router.get("/" + endpoint_name + "/{id}", tags=["Images CRUD endpoints"], response_model=Image)
 async def get_image_by_id(request: Request, 
     id: str = Path(description="ID de la imagen", min_length=24, max_length=24),
@@ -71,40 +102,141 @@ async def get_image_by_id(request: Request,
     try:
         projection = APIUtils.build_projection(fields)
 
-        image = DatabaseConnection.read_document("image", id, projection)
+        image = await AsyncDatabaseConnection.read_document_id("image", id, projection, hasDate=True)
         if image is None:
-            return JSONResponse(status_code=404, content={"detail": f"Imagen con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Imagen con ID {id} no encontrado"})
         
-        return JSONResponse(status_code=200, content=image,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})
+        return APIUtils.conditional_response(request, image, headers={"X-Total-Count": "1"},
+                                             last_modified=last_modified([image]))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener la imagen: {str(e)}")
 
-@router.post("/" + endpoint_name, tags=["Images CRUD endpoints"])
+@router.post("/" + endpoint_name, tags=["Images CRUD endpoints"], status_code=202)
 async def test_upload(file: UploadFile = File(...)):
+    """
+    Subir una imagen. El fichero se guarda en disco y la copia al almacén (MEDIA_STORAGE) se hace en segundo plano;
+    la respuesta 202 incluye el ID del trabajo, que se consulta en GET /media/jobs/{id}. Si ya se subió
+    un fichero idéntico (mismo SHA-256), se responde 200 con la imagen existente.
+    """
+    if UploadJobs.is_full():
+        return FastJSONResponse(status_code=503, content={"detail": "Hay demasiadas subidas en curso. Inténtalo más tarde"},
+                                headers={"Retry-After": "5"})
     try:
-        upload_result = cloudinary.uploader.upload(file.file)
-        thumbnail_url = upload_result['secure_url']
-        public_id = upload_result['public_id']
+        path, sha256 = await UploadJobs.spool(file)
+        return await enqueue_upload(path, sha256, file.filename)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al subir la imagen {str(e)}")
 
-        new_image = Image()
-        new_image.name = file.filename
-        new_image.ownerId = 1 + (int)(10 * random.random())
-        new_image.url = thumbnail_url
+@router.post("/" + endpoint_name + "/uploads", tags=["Images upload sessions"], status_code=201)
+async def create_upload_session(request: Request, body: UploadSessionCreate):
+    """
+    Abrir una subida por partes. Después se envían los bytes con PUT /media/uploads/{id} y la cabecera
+    'Content-Range: bytes inicio-fin/total', y se termina con POST /media/uploads/{id}/complete.
+    """
+    APIUtils.check_content_type_json(request)
 
-        body_dict = new_image.model_dump()
-        body_dict["timestamp"] = datetime.now()
+    try:
+        session_id = await UploadSessions.create(body.filename, body.size, body.sha256)
+        return FastJSONResponse(status_code=201, content={"uploadId": session_id, "offset": 0, "size": body.size},
+                                headers={"Location": f"/api/{version}/{endpoint_name}/uploads/{session_id}", "Upload-Offset": "0"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al abrir la subida: {str(e)}")
 
-        DatabaseConnection.create_document("image", body_dict, hasDate=True)
+@router.get("/" + endpoint_name + "/uploads/{id}", tags=["Images upload sessions"])
+async def get_upload_session(id: str = Path(description="ID de la subida", min_length=24, max_length=24)):
+    """Consultar cuántos bytes se han recibido, para continuar una subida interrumpida."""
+    APIUtils.check_id(id)
 
-        return JSONResponse(status_code=201, content={"detail": "La imagen se ha subido correctamente", "result": body_dict},
-                            headers={"Location": f"/api/{version}/{endpoint_name}/{body_dict['_id']}"} )
+    try:
+        session = await UploadSessions.get(id)
+        if session is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Subida con ID {id} no encontrada"})
+        return FastJSONResponse(status_code=200, content=upload_session_content(session),
+                                headers={"Upload-Offset": str(session["offset"]), "Cache-Control": "no-store"})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al subir la imagen {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener la subida: {str(e)}")
+
+@router.put("/" + endpoint_name + "/uploads/{id}", tags=["Images upload sessions"])
+async def put_upload_chunk(request: Request, id: str = Path(description="ID de la subida", min_length=24, max_length=24)):
+    """Enviar un rango de bytes del fichero. Se puede repetir un rango ya enviado, pero no dejar huecos."""
+    APIUtils.check_id(id)
+
+    try:
+        session = await UploadSessions.get(id)
+        if session is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Subida con ID {id} no encontrada"})
+
+        start, end = UploadSessions.parse_content_range(request.headers.get("Content-Range"), session["size"])
+        session["offset"] = await UploadSessions.write(session, start, end, request.stream())
+        return FastJSONResponse(status_code=200, content=upload_session_content(session),
+                                headers={"Upload-Offset": str(session["offset"])})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar la parte de la subida: {str(e)}")
+
+@router.post("/" + endpoint_name + "/uploads/{id}/complete", tags=["Images upload sessions"], status_code=202)
+async def complete_upload_session(id: str = Path(description="ID de la subida", min_length=24, max_length=24)):
+    """Terminar una subida completa. A partir de aquí sigue el mismo camino que POST /media."""
+    APIUtils.check_id(id)
+
+    if UploadJobs.is_full():
+        return FastJSONResponse(status_code=503, content={"detail": "Hay demasiadas subidas en curso. Inténtalo más tarde"},
+                                headers={"Retry-After": "5"})
+    try:
+        session = await UploadSessions.get(id)
+        if session is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Subida con ID {id} no encontrada"})
+
+        path, sha256 = await UploadSessions.finish(session)
+        return await enqueue_upload(path, sha256, session["filename"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al terminar la subida: {str(e)}")
+
+@router.delete("/" + endpoint_name + "/uploads/{id}", tags=["Images upload sessions"])
+async def delete_upload_session(id: str = Path(description="ID de la subida", min_length=24, max_length=24)):
+    """Cancelar una subida y borrar los bytes recibidos."""
+    APIUtils.check_id(id)
+
+    try:
+        if await UploadSessions.abort(id) == 0:
+            return FastJSONResponse(status_code=404, content={"detail": f"Subida con ID {id} no encontrada"})
+        return FastJSONResponse(status_code=200, content={"detail": "La subida se ha cancelado"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cancelar la subida: {str(e)}")
+
+@router.get("/" + endpoint_name + "/jobs/{id}", tags=["Images CRUD endpoints"])
+async def get_upload_job(request: Request, id: str = Path(description="ID del trabajo de subida", min_length=24, max_length=24)):
+    """Consultar el estado de una subida: queued, processing, done (con imageId y url) o failed (con error)."""
+    APIUtils.check_id(id)
+    APIUtils.check_accept_json(request)
+
+    try:
+        job = await UploadJobs.get(id)
+        if job is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Trabajo de subida con ID {id} no encontrado"})
+        headers = {"Location": f"/api/{version}/{endpoint_name}/{job['imageId']}"} if job.get("imageId") else {}
+        return FastJSONResponse(status_code=200, content=job, headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al obtener el trabajo de subida: {str(e)}")
+
+@router.api_route("/" + endpoint_name + "/files/{key}", methods=["GET", "HEAD"], tags=["Images CRUD endpoints"])
+async def get_image_file(request: Request, key: str = Path(description="Clave del fichero en el almacén local")):
+    """Servir un fichero del almacén local, con peticiones Range y caché de larga duración."""
+    storage = Storage.backend()
+    path = storage.path(key) if isinstance(storage, LocalStorage) else None
+    if path is None or not os.path.isfile(path):
+        return FastJSONResponse(status_code=404, content={"detail": f"Fichero {key} no encontrado"})
+    # La clave contiene el SHA-256 del contenido, así que sirve de ETag fuerte
+    return FileRangeResponse(request, path, etag=f'"{os.path.splitext(key)[0]}"')
 
 @router.options("/" + endpoint_name, tags=["Images OPTIONS endpoints"])
 async def options_images():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "POST", "OPTIONS"]},
         headers={"Allow": "GET, POST, OPTIONS"}
@@ -112,7 +244,7 @@ async def options_images():
 
 @router.options("/" + endpoint_name + "/{id}", tags=["Images OPTIONS endpoints"])
 async def options_image_by_id():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "OPTIONS"]},
         headers={"Allow": "GET, OPTIONS"}
@@ -128,4 +260,112 @@ def build_query(ownerId: Optional[int], name: Optional[str]) -> Dict[str, Dict]:
     if name is not None:
         query["name"] = name
 
-    return query
\ No newline at end of file
+    return query
+
+def last_modified(images: List[dict]) -> Optional[datetime]:
+    """
+    Fecha de la imagen más reciente, o None si alguna no incluye 'timestamp' (p. ej. por la proyección).
+
+    Las imágenes no se editan después de subirlas, así que su 'timestamp' sirve como fecha de modificación.
+    Se guarda en UTC; MongoDB lo devuelve sin zona horaria, así que una fecha sin zona se entiende en UTC.
+    """
+    dates = []
+    for image in images:
+        try:
+            date = datetime.fromisoformat(image["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        dates.append(date.astimezone(timezone.utc) if date.tzinfo else date.replace(tzinfo=timezone.utc))
+    return max(dates) if dates else None
+
+def upload_session_content(session: dict) -> dict:
+    """Estado público de una subida por partes."""
+    return {"uploadId": session["_id"], "filename": session["filename"], "offset": session["offset"],
+            "size": session["size"], "complete": session["offset"] >= session["size"]}
+
+async def enqueue_upload(path: str, sha256: str, filename: str):
+    """
+    Encolar el procesado de un fichero ya volcado a disco. Si ya existe una imagen con el mismo contenido,
+    se devuelve esa (200) en lugar de volver a subirla; si no, se responde 202 con el trabajo.
+    """
+    existing = await AsyncDatabaseConnection.query_document("image", {"sha256": sha256}, limit=1, hasDate=True)
+    if existing:
+        os.remove(path)
+        return FastJSONResponse(status_code=200, content={"detail": "La imagen ya existía", "result": existing[0]},
+                            headers={"Location": f"/api/{version}/{endpoint_name}/{existing[0]['_id']}"})
+
+    job_id = await UploadJobs.create(filename)
+    UploadJobs.start(job_id, path, lambda job_id, path: process_upload(job_id, path, filename, sha256))
+
+    return FastJSONResponse(status_code=202, content={"detail": "La imagen se está subiendo", "jobId": job_id, "status": "queued"},
+                        headers={"Location": f"/api/{version}/{endpoint_name}/jobs/{job_id}"})
+
+async def process_upload(job_id: str, path: str, filename: str, sha256: str):
+    """
+    Guardar en el almacén el fichero volcado a disco y sus variantes, y crear el documento de la imagen.
+
+    Si algo falla después de guardar ficheros, se borran del almacén, salvo que ya haya una imagen con el
+    mismo SHA-256: las claves salen del contenido y esos ficheros son también suyos.
+    """
+    saved = []
+    try:
+        await store_image(job_id, path, filename, sha256, saved)
+    except Exception:
+        if saved and not await AsyncDatabaseConnection.query_document("image", {"sha256": sha256}, {"_id": 1}, limit=1):
+            await UploadJobs.run_blocking(delete_stored_files, saved)
+        raise
+
+async def store_image(job_id: str, path: str, filename: str, sha256: str, saved: List[str]):
+    """Subir el fichero y sus variantes y crear el documento; 'saved' recibe las claves ya guardadas."""
+    url, variants = await UploadJobs.run_blocking(upload_with_variants, path, filename, sha256, saved)
+
+    new_image = Image()
+    new_image.name = filename
+    new_image.ownerId = 1 + (int)(10 * random.random())
+    new_image.url = url
+    new_image.sha256 = sha256
+    new_image.variants = variants
+
+    body_dict = new_image.model_dump()
+    # En UTC: Last-Modified e If-Modified-Since son fechas HTTP, siempre en GMT
+    body_dict["timestamp"] = datetime.now(timezone.utc)
+
+    try:
+        image_id = await AsyncDatabaseConnection.create_document("image", body_dict, hasDate=True)
+        await UploadJobs.update(job_id, "done", imageId=image_id, url=url)
+    except DuplicateKeyError:
+        # Otra subida del mismo fichero terminó antes: el índice único sobre sha256 impide duplicarla
+        existing = await AsyncDatabaseConnection.query_document("image", {"sha256": sha256}, {"url": 1}, limit=1)
+        await UploadJobs.update(job_id, "done", imageId=existing[0]["_id"], url=existing[0]["url"], duplicate=True)
+
+def upload_with_variants(path: str, filename: str, sha256: str, saved: List[str]):
+    """
+    Generar las variantes WebP y guardarlas en el almacén junto con el original. Es una función bloqueante
+    que se ejecuta en el pool de subidas.
+
+    :param saved: Lista a la que se añaden las claves guardadas, para poder borrarlas si algo falla
+    :return: Tupla (url del original, {nombre: {"url", "width", "height", "format"}})
+    """
+    storage = Storage.backend()
+    key = Storage.key(sha256, filename)
+    url = storage.save(path, key)
+    saved.append(key)
+    variants = {}
+    for variant in ImageVariants.generate(path, os.path.dirname(path)):
+        try:
+            key = Storage.key(sha256, variant=variant["name"], extension=variant["format"])
+            variants[variant["name"]] = {"url": storage.save(variant["path"], key), "width": variant["width"],
+                                         "height": variant["height"], "format": variant["format"]}
+            saved.append(key)
+        finally:
+            os.remove(variant["path"])
+    return url, variants
+
+def delete_stored_files(keys: List[str]):
+    """Borrar del almacén los ficheros de una subida fallida. Es bloqueante; un fallo al borrar solo se registra."""
+    storage = Storage.backend()
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception as e:
+            logger.warning(f"No se ha podido borrar el fichero {key} del almacén: {e}")
@@ -1,13 +1,16 @@
 from datetime import datetime
 from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Query, Request, Path
-from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 
 from bson.objectid import ObjectId
-from models.pais_model import Pais, PaisCreate, PaisUpdate, PaisDeleteResponse
-from db_connection import DatabaseConnection
+from models.pais_model import Pais, PaisCreate, PaisUpdate, PaisBatchUpdate, PaisBatchDelete, PaisLookup, PaisDeleteResponse
+from async_db_connection import AsyncDatabaseConnection
 from api_utils import APIUtils
+from geo_utils import GeoUtils
+from geocoder import Gazetteer
+from marker_clusters import MarkerIndex
+from serializers import FastJSONResponse
 
 router = APIRouter()
 
@@ -15,22 +18,23 @@ endpoint_name = "paises"
 version = "v1"
 
 @router.get("/" + endpoint_name + "/email/{email}", tags=["Paises CRUD endpoints"], response_model=List[Pais])
-async def get_paises_by_email(request: Request, email: str = Path(description="Email del usuario")):
+async def get_paises_by_email(request: Request, email: str = Path(description="Email del usuario"),
+                              stream: bool | None = Query(None, description="Devolver los países en streaming (NDJSON)")):
     """Obtener todos los países asociados a un email."""
 
     APIUtils.check_accept_json(request)
 
     try:
         query = {"email": email}
-        paises = DatabaseConnection.query_document("paises", query)
+        if APIUtils.wants_ndjson(request, stream):
+            return APIUtils.ndjson_response(AsyncDatabaseConnection.stream_documents("paises", query))
 
-        total_count = DatabaseConnection.count_documents("paises", query)
+        paises = await AsyncDatabaseConnection.query_document("paises", query)
 
-        return JSONResponse(
-            status_code=200,
-            content=paises,
-            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
-        )
+        total_count = len(paises)
+
+        return APIUtils.conditional_response(request, paises,
+                                             headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar los países: {str(e)}")
 
@@ -40,9 +44,14 @@ async def get_paises(
     fields: str | None = Query(None, description="Campos específicos a devolver"),
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
-    limit: int = Query(default=10, description="Cantidad de países a devolver, por defecto 10")
+    limit: int = Query(default=10, description="Cantidad de países a devolver, por defecto 10"),
+    after: str | None = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    stream: bool | None = Query(None, description="Devolver los países en streaming (NDJSON)"),
+    email: str | None = Query(None, description="Email del usuario"),
+    bbox: str | None = Query(None, description="Área visible del mapa: minLon,minLat,maxLon,maxLat"),
+    ids: str | None = Query(None, description="IDs separados por comas: devuelve esos países en el mismo orden e ignora los demás filtros")
 ):
-    """Obtener todos los países."""
+    """Obtener todos los países, opcionalmente solo los de un usuario, los de un área del mapa o los de una lista de IDs."""
 
     APIUtils.check_accept_json(request)
 
@@ -50,19 +59,112 @@ async def get_paises(
         projection = APIUtils.build_projection(fields)
         sort_criteria = APIUtils.build_sort_criteria(sort)
 
-        paises = DatabaseConnection.query_document(
-            "paises", {}, projection, sort_criteria, offset, limit
-        )
+        if ids is not None:
+            paises, missing = await AsyncDatabaseConnection.read_documents_ids("paises", APIUtils.parse_ids(ids), projection)
+            headers = APIUtils.add_missing_ids({"X-Total-Count": str(len(paises))}, missing)
+            return APIUtils.conditional_response(request, paises, headers=headers)
+
+        query = {}
+        if email is not None:
+            query["email"] = email
+        GeoUtils.add_bbox(query, bbox)
+
+        if APIUtils.wants_ndjson(request, stream):
+            return APIUtils.ndjson_response(AsyncDatabaseConnection.stream_documents(
+                "paises", query, projection, sort_criteria, offset, limit
+            ))
+
+        next_cursor = None
+        if after or (offset == 0 and limit > 0):
+            paises, next_cursor = await AsyncDatabaseConnection.query_document_after(
+                "paises", query, projection, sort_criteria, after, limit
+            )
+        else:
+            paises = await AsyncDatabaseConnection.query_document(
+                "paises", query, projection, sort_criteria, offset, limit
+            )
+
+        total_count = await AsyncDatabaseConnection.count_documents_cached("paises", query)
+
+        headers = {"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
+        return APIUtils.conditional_response(request, paises,
+                                             headers=APIUtils.add_next_cursor(request, headers, next_cursor))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar los países: {str(e)}")
+
+@router.get("/" + endpoint_name + "/geocode", tags=["Paises CRUD endpoints"])
+async def geocode_pais(
+    request: Request,
+    q: str = Query(min_length=1, description="Nombre del lugar, por ejemplo 'Madrid, España'"),
+    limit: int = Query(default=5, gt=0, le=50, description="Cantidad máxima de resultados, por defecto 5")
+):
+    """Obtener las coordenadas de un lugar con el nomenclátor en memoria, sin consultar servicios externos."""
 
-        total_count = DatabaseConnection.count_documents("paises", {})
+    APIUtils.check_accept_json(request)
 
-        return JSONResponse(
-            status_code=200,
-            content=paises,
-            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
-        )
+    best = Gazetteer.geocode(q)
+    if best is None:
+        return FastJSONResponse(status_code=404, content={"detail": f"No se ha encontrado ningún lugar para '{q}'"})
+
+    matches = [best] + [m for m in Gazetteer.search(q, limit) if m != best]
+    return FastJSONResponse(status_code=200, content=matches[:limit],
+                            headers={"X-Total-Count": str(len(matches[:limit]))})
+
+@router.get("/" + endpoint_name + "/clusters", tags=["Paises CRUD endpoints"])
+async def get_paises_clusters(
+    request: Request,
+    zoom: int = Query(ge=0, le=22, description="Nivel de zoom del mapa"),
+    bbox: str | None = Query(None, description="Área visible del mapa: minLon,minLat,maxLon,maxLat"),
+    email: str | None = Query(None, description="Email del usuario")
+):
+    """Obtener los marcadores del mapa agrupados en una rejilla para el nivel de zoom indicado."""
+
+    APIUtils.check_accept_json(request)
+
+    try:
+        area = GeoUtils.parse_bbox(bbox) if bbox else None
+        await MarkerIndex.ensure_loaded()
+        clusters = MarkerIndex.clusters(zoom, area, email)
+
+        return APIUtils.conditional_response(request, clusters,
+                                             headers={"Accept-Encoding": "gzip", "X-Total-Count": str(len(clusters))})
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al buscar los países: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al agrupar los países: {str(e)}")
+
+@router.get("/" + endpoint_name + "/near", tags=["Paises CRUD endpoints"], response_model=List[Pais])
+async def get_paises_near(
+    request: Request,
+    lat: float = Query(description="Latitud del centro"),
+    lon: float = Query(description="Longitud del centro"),
+    radius: float = Query(default=50000, gt=0, description="Radio de búsqueda en metros, por defecto 50 km"),
+    email: str | None = Query(None, description="Email del usuario"),
+    fields: str | None = Query(None, description="Campos específicos a devolver"),
+    limit: int = Query(default=100, gt=0, le=1000, description="Cantidad máxima de países a devolver, por defecto 100")
+):
+    """Obtener los países más cercanos a un punto, ordenados por distancia."""
+
+    APIUtils.check_accept_json(request)
+
+    try:
+        query = GeoUtils.build_near_query(lat, lon, radius)
+        if email is not None:
+            query["email"] = email
+        projection = APIUtils.build_projection(fields)
+
+        paises = await AsyncDatabaseConnection.query_document("paises", query, projection, limit=limit)
+
+        return FastJSONResponse(status_code=200, content=paises,
+                                headers={"Accept-Encoding": "gzip", "X-Total-Count": str(len(paises))})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar los países cercanos: {str(e)}")
 
 @router.get("/" + endpoint_name + "/{id}", tags=["Paises CRUD endpoints"], response_model=Pais)
 async def get_pais_by_id(request: Request, id: str = Path(description="ID del país")):
@@ -71,12 +173,11 @@ async def get_pais_by_id(request: Request, id: str = Path(description="ID del pa
     APIUtils.check_accept_json(request)
 
     try:
-        pais = DatabaseConnection.read_document_id("paises", id)
+        pais = await AsyncDatabaseConnection.read_document_id("paises", id)
         if pais is None:
-            return JSONResponse(status_code=404, content={"detail": f"País con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"País con ID {id} no encontrado"})
 
-        return JSONResponse(status_code=200, content=pais,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})
+        return APIUtils.conditional_response(request, pais, headers={"X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el país: {str(e)}")
 
@@ -88,9 +189,14 @@ async def create_pais(request: Request, pais: PaisCreate):
 
     try:
         pais_dict = pais.model_dump()
-        pais_dict['_id'] = DatabaseConnection.create_document("paises", pais_dict)
-
-        return JSONResponse(status_code=201, content=pais_dict,
+        error = fill_coordinates(pais_dict)
+        if error is not None:
+            return FastJSONResponse(status_code=422, content={"detail": error})
+        pais_dict = GeoUtils.add_location(pais_dict)
+        pais_dict['_id'] = await AsyncDatabaseConnection.create_document("paises", pais_dict)
+        MarkerIndex.upsert(pais_dict['_id'], pais_dict['lat'], pais_dict['lon'], pais_dict['email'])
+
+        return FastJSONResponse(status_code=201, content=pais_dict,
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear el país: {str(e)}")
@@ -105,15 +211,18 @@ async def update_pais(request: Request, pais: PaisUpdate, id: str = Path(descrip
         pais_dict = pais.model_dump()
         non_none_fields = {k: v for k, v in pais_dict.items() if v is not None}
         if not non_none_fields:
-            return JSONResponse(status_code=422, content={"detail": "No has especificado ningún campo del país"})
+            return FastJSONResponse(status_code=422, content={"detail": "No has especificado ningún campo del país"})
+        if APIUtils.is_valid_objectid(id):
+            await complete_locations([(id, non_none_fields)])
 
-        updated_document = DatabaseConnection.update_document_id("paises", id, non_none_fields)
+        updated_document = await AsyncDatabaseConnection.update_document_id("paises", id, non_none_fields)
         if updated_document is None:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un país con ese ID. No se ha editado nada"})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un país con ese ID. No se ha editado nada"})
+        MarkerIndex.upsert(id, updated_document.get('lat'), updated_document.get('lon'), updated_document.get('email'))
 
         json_serializable_document = jsonable_encoder(updated_document)
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
                 "detail": "El país se ha editado correctamente",
@@ -129,11 +238,132 @@ async def delete_pais(id: str = Path(description="ID del país")):
     """Eliminar un país por su ID."""
 
     try:
-        count = DatabaseConnection.delete_document_id("paises", id)
+        count = await AsyncDatabaseConnection.delete_document_id("paises", id)
         if count == 0:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un país con ese ID. No se ha borrado nada."})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un país con ese ID. No se ha borrado nada."})
+        MarkerIndex.remove(id)
 
-        return JSONResponse(status_code=200, content={"details": "El país se ha eliminado correctamente"},
+        return FastJSONResponse(status_code=200, content={"details": "El país se ha eliminado correctamente"},
                             headers={"Content-Type": "application/json"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar el país: {str(e)}")
+
+@router.post("/" + endpoint_name + ":lookup", tags=["Paises batch endpoints"])
+async def lookup_paises(request: Request, body: PaisLookup):
+    """Obtener varios países por ID en una sola consulta, para listas demasiado largas para la URL."""
+
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(body.ids)
+
+    try:
+        paises, missing = await AsyncDatabaseConnection.read_documents_ids("paises", body.ids, APIUtils.build_projection(body.fields))
+        return FastJSONResponse(status_code=200, content={"results": paises, "missing": missing},
+                                headers={"X-Total-Count": str(len(paises))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar los países: {str(e)}")
+
+@router.post("/" + endpoint_name + ":batch", tags=["Paises batch endpoints"])
+async def create_paises_batch(request: Request, paises: List[PaisCreate]):
+    """Crear varios países en una sola escritura masiva."""
+
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(paises)
+
+    try:
+        documents = [pais.model_dump() for pais in paises]
+        errors = [fill_coordinates(document) for document in documents]
+        results = await AsyncDatabaseConnection.create_documents(
+            "paises", [GeoUtils.add_location(document) for document, error in zip(documents, errors) if error is None]
+        )
+
+        # Los países sin coordenadas no se envían a la base de datos; se informa de ellos en su posición
+        created = iter(results)
+        results = [next(created) if error is None else {"_id": None, "status": 422, "detail": error} for error in errors]
+        for document, result in zip(documents, results):
+            if result["status"] == 201:
+                MarkerIndex.upsert(result["_id"], document["lat"], document["lon"], document["email"])
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=201 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear los países: {str(e)}")
+
+@router.put("/" + endpoint_name + ":batch", tags=["Paises batch endpoints"])
+async def update_paises_batch(request: Request, paises: List[PaisBatchUpdate]):
+    """Actualizar varios países en una sola escritura masiva."""
+
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(paises)
+
+    try:
+        updates = []
+        for pais in paises:
+            pais_dict = pais.model_dump(exclude={"id"})
+            updates.append((pais.id, {k: v for k, v in pais_dict.items() if v is not None}))
+        await complete_locations(updates)
+
+        results = await AsyncDatabaseConnection.update_documents_id("paises", updates)
+        if any("lat" in fields or "lon" in fields or "email" in fields for _, fields in updates):
+            MarkerIndex.invalidate()
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=200 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar los países: {str(e)}")
+
+@router.delete("/" + endpoint_name + ":batch", tags=["Paises batch endpoints"])
+async def delete_paises_batch(request: Request, body: PaisBatchDelete):
+    """Eliminar varios países por su ID en una sola escritura masiva."""
+
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(body.ids)
+
+    try:
+        results = await AsyncDatabaseConnection.delete_documents_id("paises", body.ids)
+        for result in results:
+            if result["status"] == 200:
+                MarkerIndex.remove(result["_id"])
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=200 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al eliminar los países: {str(e)}")
+
+async def complete_locations(updates):
+    """
+    Mantener 'location' en las actualizaciones que cambian las coordenadas.
+
+    Si una actualización solo trae 'lat' o solo 'lon', la otra coordenada se lee del documento actual;
+    todas esas lecturas se hacen en una única consulta.
+    """
+    partial = [(document_id, fields) for document_id, fields in updates
+               if ("lat" in fields) != ("lon" in fields) and APIUtils.is_valid_objectid(document_id)]
+    current = {}
+    if partial:
+        documents = await AsyncDatabaseConnection.query_document(
+            "paises", {}, {"lat": 1, "lon": 1}, id_list=[ObjectId(document_id) for document_id, _ in partial]
+        )
+        current = {d["_id"]: d for d in documents}
+
+    for document_id, fields in updates:
+        if "lat" not in fields and "lon" not in fields:
+            continue
+        stored = current.get(str(document_id).lower(), {})
+        location = GeoUtils.build_location(fields.get("lat", stored.get("lat")), fields.get("lon", stored.get("lon")))
+        if location is not None:
+            fields["location"] = location
+
+def fill_coordinates(pais_dict):
+    """
+    Completar lat/lon con el nomenclátor cuando el cliente no envía ninguno de los dos.
+
+    :return: None si el país tiene coordenadas, o el motivo del error: solo una coordenada (que el
+             nomenclátor sobrescribiría) o un nombre que no está en el nomenclátor
+    """
+    lat, lon = pais_dict.get("lat"), pais_dict.get("lon")
+    if lat is not None and lon is not None:
+        return None
+    if lat is not None or lon is not None:
+        return "Hay que indicar lat y lon a la vez, o ninguno de los dos para obtenerlos del nombre"
+    place = Gazetteer.geocode(pais_dict.get("nombre"))
+    if place is None:
+        return f"No se han encontrado las coordenadas de '{pais_dict.get('nombre')}'"
+    pais_dict["lat"], pais_dict["lon"] = place["lat"], place["lon"]
+    return None
@@ -0,0 +1,246 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs
+
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+class _Sampler(threading.Thread):
+    """
+    Hilo que muestrea cada cierto tiempo la pila de una petición. Si la tarea de la petición se está
+    ejecutando, toma la pila del hilo del bucle de eventos desde el marco del middleware; si está esperando
+    (consulta a MongoDB, lectura del cuerpo...), recorre la cadena de awaits de su corrutina y la marca con
+    '[await]'. Así el perfil reparte el tiempo de reloj entre CPU y esperas.
+    """
+
+    def __init__(self, capture_id, task, anchor, thread_id, interval):
+        super().__init__(name="profiler", daemon=True)
+        self.capture_id = capture_id
+        self.task = task
+        self.anchor = anchor
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+    def _running_stack(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame))
+            if frame is self.anchor:
+                return stack[::-1]
+            frame = frame.f_back
+        return None
+
+    def _awaiting_stack(self):
+        stack, awaitable = [], self.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) or getattr(awaitable, "ag_frame", None)
+            if frame is None:
+                break
+            if frame is self.anchor:
+                stack.clear()
+            stack.append(self._label(frame))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) or getattr(awaitable, "ag_await", None)
+        return stack + ["[await]"] if stack else None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                stack = self._running_stack() or self._awaiting_stack()
+            except Exception:
+                # La corrutina puede cambiar mientras se recorre; se descarta la muestra
+                continue
+            if stack:
+                self.samples[";".join(stack)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def signal_stop(self):
+        """Parar el muestreo sin esperar al hilo, para no registrar lo que pase después."""
+        self.stopped.set()
+
+class RequestProfiler:
+    """
+    RequestProfiler perfila peticiones concretas con un muestreo estadístico de pilas y guarda el resultado
+    en formato de pilas colapsadas (una línea 'marco;marco;... muestras'), que aceptan flamegraph.pl y
+    speedscope. Está desactivado salvo que se configure PROFILE_TOKEN o PROFILE_SAMPLE_RATE.
+    Métodos de Clase:
+    - wants(cls, scope): Decide si una petición se perfila (cabecera, parámetro o muestreo).
+    - is_authorized(cls, token): Comprueba el token de las capturas.
+    - start(cls, anchor): Arranca el muestreo de la petición en curso.
+    - save(cls, sampler, scope, status, duration): Guarda una captura y devuelve su ID.
+    - list(cls): Metadatos de las capturas guardadas, de la más reciente a la más antigua.
+    - path(cls, capture_id): Ruta del fichero de una captura, o None.
+    Activación:
+    - Cabecera 'X-Profile: <PROFILE_TOKEN>' o parámetro '?profile=<PROFILE_TOKEN>'.
+    - Una de cada PROFILE_SAMPLE_RATE peticiones, elegida al azar.
+    La respuesta de una petición perfilada lleva la cabecera X-Profile-Id con el ID de la captura.
+    Configuración (variables de entorno):
+    - PROFILE_TOKEN: Token para pedir un perfil y consultar las capturas (sin él no hay activación manual).
+    - PROFILE_SAMPLE_RATE: Perfilar 1 de cada N peticiones (por defecto 0, desactivado).
+    - PROFILE_INTERVAL_MS: Intervalo de muestreo (por defecto 2). En la práctica no baja del intervalo de
+      cambio de hilo de Python (5 ms) mientras la petición ocupa la CPU.
+    - PROFILE_MAX_ACTIVE: Peticiones perfiladas a la vez por proceso (por defecto 2).
+    - PROFILE_DIR: Directorio de las capturas (por defecto 'profiles' en el temporal del sistema).
+    - PROFILE_MAX_CAPTURES: Capturas que se conservan; se borran las más antiguas (por defecto 200).
+    Limitaciones: el trabajo que se hace en hilos (run_in_threadpool, endpoints síncronos) aparece como
+    espera en la llamada que lo lanza, no con su propia pila.
+    """
+
+    _ID_PATTERN = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+    _token = os.getenv('PROFILE_TOKEN') or None
+    _sample_rate = int(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    _interval = float(os.getenv('PROFILE_INTERVAL_MS', 2)) / 1000
+    _max_active = int(os.getenv('PROFILE_MAX_ACTIVE', 2))
+    _directory = os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), "profiles")
+    _max_captures = int(os.getenv('PROFILE_MAX_CAPTURES', 200))
+    _active = 0
+
+    @classmethod
+    def is_authorized(cls, token: str | None) -> bool:
+        """Devolver True si 'token' coincide con PROFILE_TOKEN (comparación en tiempo constante)."""
+        return cls._token is not None and token is not None and hmac.compare_digest(token.encode(), cls._token.encode())
+
+    @classmethod
+    def wants(cls, scope) -> bool:
+        """Decidir si se perfila una petición HTTP."""
+        if cls._active >= cls._max_active:
+            return False
+        if cls._token is not None:
+            headers = dict(scope["headers"])
+            token = headers.get(b"x-profile", b"").decode("latin-1") or \
+                parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [None])[0]
+            if cls.is_authorized(token):
+                return True
+        return cls._sample_rate > 0 and random.randrange(cls._sample_rate) == 0
+
+    @classmethod
+    def start(cls, anchor) -> _Sampler:
+        """Arrancar el muestreo de la tarea actual; 'anchor' es el marco desde el que se recorta la pila."""
+        sampler = _Sampler(cls.new_id(), asyncio.current_task(), anchor, threading.get_ident(), cls._interval)
+        cls._active += 1
+        sampler.start()
+        return sampler
+
+    @classmethod
+    def _write(cls, capture_id, samples, metadata):
+        os.makedirs(cls._directory, exist_ok=True)
+        base = os.path.join(cls._directory, capture_id)
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in samples.most_common())
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+        captures = sorted(name[:-5] for name in os.listdir(cls._directory) if name.endswith(".json"))
+        for old in captures[:max(0, len(captures) - cls._max_captures)]:
+            for extension in (".json", ".collapsed"):
+                if os.path.exists(os.path.join(cls._directory, old + extension)):
+                    os.remove(os.path.join(cls._directory, old + extension))
+
+    @classmethod
+    async def save(cls, sampler: _Sampler, scope, status: int, duration: float) -> str:
+        """Detener el muestreo y guardar la captura con la ruta y el método como raíz de las pilas."""
+        sampler.signal_stop()
+        cls._active -= 1
+        await run_in_threadpool(sampler.stop)
+        capture_id = sampler.capture_id
+        route = route_template(scope)
+        root = f"{scope['method']} {route}".replace(";", ",")
+        samples = Counter({f"{root};{stack}": count for stack, count in sampler.samples.items()})
+        metadata = {
+            "id": capture_id,
+            "method": scope["method"],
+            "route": route,
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "samples": sum(samples.values()),
+            "interval_ms": cls._interval * 1000,
+            "createdAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        try:
+            await run_in_threadpool(cls._write, capture_id, samples, metadata)
+        except OSError as e:
+            logger.warning(f"No se ha podido guardar el perfil {capture_id}: {e}")
+        return capture_id
+
+    @classmethod
+    def list(cls):
+        """Devolver los metadatos de las capturas, de la más reciente a la más antigua."""
+        if not os.path.isdir(cls._directory):
+            return []
+        captures = []
+        for name in sorted(os.listdir(cls._directory), reverse=True):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(cls._directory, name), encoding="utf-8") as f:
+                        captures.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return captures
+
+    @classmethod
+    def path(cls, capture_id: str) -> str | None:
+        """Ruta de las pilas colapsadas de una captura, o None si el ID no es válido o no existe."""
+        if not cls._ID_PATTERN.match(capture_id):
+            return None
+        path = os.path.join(cls._directory, capture_id + ".collapsed")
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def new_id() -> str:
+        """ID ordenable por fecha: milisegundos desde la época y un sufijo aleatorio."""
+        return f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila las peticiones que elige RequestProfiler y añade X-Profile-Id a su respuesta.
+    El resto de peticiones solo pagan la comprobación de la cabecera.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RequestProfiler.wants(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = RequestProfiler.start(sys._getframe())
+        status = {"code": 500}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", sampler.capture_id.encode())]}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            await RequestProfiler.save(sampler, scope, status["code"], time.perf_counter() - start)
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Any
+
+import orjson
+from bson.objectid import ObjectId
+from fastapi.responses import JSONResponse
+
+class DocumentSerializer:
+    """
+    DocumentSerializer convierte los documentos de MongoDB en estructuras serializables y los codifica
+    a JSON con orjson.
+    Métodos de Clase:
+    - to_json_document(cls, d, hasDate, date_format): Adapta un documento leído del cursor, sin copiarlo.
+    - dumps(cls, content): Codifica a JSON (bytes) cualquier contenido, incluidos ObjectId y datetime anidados.
+    """
+
+    DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    @classmethod
+    def to_json_document(cls, d: dict, hasDate: bool = False, date_format: str | None = None) -> dict:
+        """
+        Adaptar un documento del cursor para la respuesta.
+
+        El documento se modifica en el sitio: el cursor entrega un diccionario nuevo por documento, por lo que
+        no hace falta copiarlo. Los ObjectId y datetime anidados los resuelve el codificador en dumps().
+        :param hasDate: Si es True, el campo 'timestamp' se convierte a texto
+        :param date_format: Formato strftime para 'timestamp'; por defecto ISO 8601
+        """
+        _id = d.get('_id')
+        if type(_id) is ObjectId:
+            d['_id'] = str(_id)
+        if hasDate:
+            timestamp = d.get('timestamp')
+            if isinstance(timestamp, datetime):
+                d['timestamp'] = timestamp.strftime(date_format) if date_format else timestamp.isoformat()
+            else:
+                d['timestamp'] = timestamp
+        return d
+
+    @staticmethod
+    def _default(value: Any):
+        """Codificar los tipos de BSON que orjson no conoce."""
+        if isinstance(value, ObjectId):
+            return str(value)
+        raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+    @classmethod
+    def dumps(cls, content: Any) -> bytes:
+        """Codificar el contenido a JSON."""
+        return orjson.dumps(content, default=cls._default, option=cls._OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON codificada con DocumentSerializer en lugar del módulo json de la biblioteca estándar."""
+
+    def render(self, content: Any) -> bytes:
+        return DocumentSerializer.dumps(content)
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Las pruebas usan el motor en memoria y directorios temporales: se configuran antes de importar la app
+os.environ["DB_BACKEND"] = "memory"
+os.environ["MEDIA_STORAGE"] = "local"
+os.environ["MEDIA_LOCAL_DIR"] = tempfile.mkdtemp(prefix="media-")
+os.environ["UPLOAD_SPOOL_DIR"] = tempfile.mkdtemp(prefix="spool-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from async_db_connection import AsyncDatabaseConnection
+from document_cache import DocumentCache, CountCache
+from marker_clusters import MarkerIndex
+from memory_db import MemoryClient
+from username_filter import UsernameFilter
+
+API = "/api/v1"
+
+def insert(collection_name, documents):
+    """Insertar documentos directamente en la colección (el motor en memoria no depende del bucle de eventos)."""
+    collection = AsyncDatabaseConnection.get_collection(collection_name)
+    return asyncio.run(collection.insert_many(documents)).inserted_ids
+
+@pytest.fixture
+def client():
+    """Cliente de la API con una base de datos en memoria vacía y las cachés del proceso vacías."""
+    MemoryClient.reset()
+    DocumentCache.clear()
+    CountCache._entries.clear()
+    MarkerIndex.invalidate()
+    UsernameFilter._loaded_at = None
+    # Los locks se crean en el bucle de eventos de la prueba anterior
+    MarkerIndex._lock = UsernameFilter._lock = None
+    from app import app
+    with TestClient(app) as client:
+        yield client
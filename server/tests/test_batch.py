@@ -0,0 +1,56 @@
+from bson.objectid import ObjectId
+
+from conftest import API, insert
+
+def user(user_name):
+    return {"email": f"{user_name}@example.com", "name": "Nombre", "surname": "Apellido", "description": "",
+            "userName": user_name, "oauthId": user_name, "oauthProvider": "google", "oauthToken": "",
+            "profilePicture": ""}
+
+def pais(nombre, lat=40.4, lon=-3.7):
+    return {"nombre": nombre, "email": "a@example.com", "lat": lat, "lon": lon, "imagen": ""}
+
+def test_create_batch_reports_duplicated_username_and_keeps_the_rest(client):
+    insert("user", [{**user("ocupado"), "reviews": []}])
+
+    response = client.post(f"{API}/users:batch", json=[user("nuevo_1"), user("ocupado"), user("nuevo_2")])
+
+    assert response.status_code == 207
+    content = response.json()
+    assert (content["succeeded"], content["failed"]) == (2, 1)
+    assert [r["status"] for r in content["results"]] == [201, 409, 201]
+    created = [r["_id"] for r in content["results"] if r["status"] == 201]
+    assert client.post(f"{API}/users:lookup", json={"ids": created}).json()["missing"] == []
+
+def test_create_batch_without_failures_is_201(client):
+    response = client.post(f"{API}/paises:batch", json=[pais("Uno"), pais("Dos")])
+
+    assert response.status_code == 201
+    assert response.json()["failed"] == 0
+
+def test_update_batch_marks_invalid_missing_and_empty_items(client):
+    existing = str(insert("paises", [pais("Antes")])[0])
+    missing = str(ObjectId())
+
+    response = client.put(f"{API}/paises:batch", json=[
+        {"id": existing, "nombre": "Después"},
+        {"id": missing, "nombre": "Nadie"},
+        {"id": "x" * 24, "nombre": "Inválido"},
+        {"id": existing},
+    ])
+
+    assert response.status_code == 207
+    assert [r["status"] for r in response.json()["results"]] == [200, 404, 400, 422]
+    assert client.get(f"{API}/paises/{existing}").json()["nombre"] == "Después"
+
+def test_delete_batch_reports_each_id(client):
+    ids = [str(i) for i in insert("paises", [pais("Uno"), pais("Dos")])]
+
+    response = client.request("DELETE", f"{API}/paises:batch", json={"ids": [ids[0], str(ObjectId()), ids[1]]})
+
+    assert response.status_code == 207
+    assert [r["status"] for r in response.json()["results"]] == [200, 404, 200]
+    assert client.get(f"{API}/paises/{ids[0]}").status_code == 404
+
+def test_empty_batch_is_rejected(client):
+    assert client.post(f"{API}/paises:batch", json=[]).status_code == 422
@@ -0,0 +1,48 @@
+import asyncio
+import zlib
+
+import brotli
+import pytest
+import zstandard
+
+from compression import CompressionMiddleware
+
+LINES = [b'{"_id": "%d", "nombre": "pais %d"}\n' % (i, i) for i in range(3)]
+
+async def ndjson_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]})
+    for line in LINES:
+        await send({"type": "http.response.body", "body": line, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def run(encoding):
+    """Enviar una petición al middleware y devolver la cabecera de respuesta y los bloques del cuerpo."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", encoding.encode())]}
+    asyncio.run(CompressionMiddleware(ndjson_app)(scope, receive, send))
+    return messages[0], [m["body"] for m in messages[1:]]
+
+DECOMPRESSORS = {
+    "gzip": lambda: zlib.decompressobj(31).decompress,
+    "br": lambda: brotli.Decompressor().process,
+    "zstd": lambda: zstandard.ZstdDecompressor().decompressobj().decompress,
+}
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_streamed_chunks_decode_as_they_arrive(encoding):
+    start, chunks = run(encoding)
+    assert dict(start["headers"])[b"content-encoding"] == encoding.encode()
+
+    decompress = DECOMPRESSORS[encoding]()
+    # Cada bloque enviado se descomprime entero sin esperar a los siguientes
+    for line, chunk in zip(LINES, chunks):
+        assert decompress(chunk) == line
+    assert decompress(b"".join(chunks[len(LINES):])) == b""
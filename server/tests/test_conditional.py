@@ -0,0 +1,78 @@
+import io
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+import pytest
+from PIL import Image
+
+from conftest import API, insert
+from multimedia_v1 import last_modified
+
+def test_etag_and_if_none_match(client):
+    pais_id = str(insert("paises", [{"nombre": "Uno", "email": "a@example.com", "lat": 1.0, "lon": 2.0, "imagen": ""}])[0])
+    first = client.get(f"{API}/paises/{pais_id}")
+    etag = first.headers["ETag"]
+
+    cached = client.get(f"{API}/paises/{pais_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    client.put(f"{API}/paises/{pais_id}", json={"nombre": "Dos"})
+    changed = client.get(f"{API}/paises/{pais_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_list_etag_changes_with_the_page(client):
+    insert("paises", [{"nombre": "Uno", "email": "a@example.com", "lat": 1.0, "lon": 2.0, "imagen": ""}])
+    etag = client.get(f"{API}/paises").headers["ETag"]
+
+    assert client.get(f"{API}/paises", headers={"If-None-Match": f'"otra", {etag}'}).status_code == 304
+    client.post(f"{API}/paises", json={"nombre": "Dos", "email": "a@example.com", "lat": 3.0, "lon": 4.0, "imagen": ""})
+    assert client.get(f"{API}/paises", headers={"If-None-Match": etag}).status_code == 200
+
+def test_last_modified_is_utc_and_if_modified_since(client):
+    # MongoDB devuelve las fechas sin zona horaria, en UTC
+    image_id = str(insert("image", [{"name": "a.jpg", "ownerId": 1, "url": "u", "timestamp": datetime(2024, 1, 1, 12, 0)}])[0])
+
+    response = client.get(f"{API}/media/{image_id}")
+    assert response.headers["Last-Modified"] == "Mon, 01 Jan 2024 12:00:00 GMT"
+
+    same = client.get(f"{API}/media/{image_id}", headers={"If-Modified-Since": "Mon, 01 Jan 2024 12:00:00 GMT"})
+    earlier = client.get(f"{API}/media/{image_id}", headers={"If-Modified-Since": "Mon, 01 Jan 2024 11:59:59 GMT"})
+    etag_wins = client.get(f"{API}/media/{image_id}", headers={"If-Modified-Since": "Mon, 01 Jan 2024 12:00:00 GMT",
+                                                                "If-None-Match": '"otra"'})
+    assert (same.status_code, earlier.status_code, etag_wins.status_code) == (304, 200, 200)
+
+def test_last_modified_mixes_naive_and_aware_dates():
+    images = [{"timestamp": "2024-01-01T11:00:00"}, {"timestamp": "2024-01-01T13:30:00+02:00"}]
+
+    assert last_modified(images) == datetime(2024, 1, 1, 11, 30, tzinfo=timezone.utc)
+    assert last_modified([{"name": "sin fecha"}]) is None
+
+@pytest.fixture
+def tokyo_time(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_uploaded_image_last_modified_on_a_non_utc_host(client, tokyo_time):
+    png = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 10, 10)).save(png, format="PNG")
+    before = datetime.now(timezone.utc).replace(microsecond=0)
+
+    job = client.post(f"{API}/media", files={"file": ("rojo.png", png.getvalue(), "image/png")}).json()
+    for _ in range(200):
+        status = client.get(f"{API}/media/jobs/{job['jobId']}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    assert status["status"] == "done", status
+
+    modified = parsedate_to_datetime(client.get(f"{API}/media/{status['imageId']}").headers["Last-Modified"])
+    assert before <= modified <= datetime.now(timezone.utc)
+    fresh = client.get(f"{API}/media/{status['imageId']}", headers={"If-Modified-Since": format_datetime(modified, usegmt=True)})
+    assert fresh.status_code == 304
@@ -0,0 +1,69 @@
+from bson.objectid import ObjectId
+
+from conftest import API, insert
+from db_indexes import IndexRegistry
+from geo_utils import GeoUtils
+from memory_db import MemoryQuery
+
+def pais(nombre, lat, lon):
+    return GeoUtils.add_location({"_id": ObjectId(), "nombre": nombre, "email": "a@example.com", "lat": lat, "lon": lon, "imagen": ""})
+
+def bbox_query(bbox):
+    query = {}
+    GeoUtils.add_bbox(query, bbox)
+    return query
+
+def test_wide_box_at_60n_keeps_points_just_inside_the_top_edge():
+    # Con polígonos GeoJSON (bordes geodésicos) y franjas de 90°, en la franja de -80 a 10 los bordes de
+    # 50°N y 60°N se curvan hasta unos 59°N y 68°N a -35 de longitud: MongoDB excluiría el punto de 55°N
+    # e incluiría el de 65°N. El área visible es un rectángulo en lat/lon.
+    query = bbox_query("-80,50,80,60")
+
+    assert "$geoWithin" not in str(query)
+    assert MemoryQuery.matches(pais("borde", 59.9, 0), query)
+    assert MemoryQuery.matches(pais("esquina", 59.99, 79.9), query)
+    assert MemoryQuery.matches(pais("centro", 55, -35), query)
+    assert not MemoryQuery.matches(pais("encima", 65, -35), query)
+    assert not MemoryQuery.matches(pais("fuera", 55, 85), query)
+
+def test_box_across_the_antimeridian():
+    query = bbox_query("170,-10,-170,10")
+
+    assert MemoryQuery.matches(pais("este", 0, 175), query)
+    assert MemoryQuery.matches(pais("oeste", 0, -175), query)
+    assert not MemoryQuery.matches(pais("centro", 0, 0), query)
+
+def test_bbox_query_is_covered_by_an_index():
+    assert not [q for q in IndexRegistry.uncovered_queries() if q["route"] == "GET /paises?bbox="]
+
+def test_get_paises_by_bbox(client):
+    insert("paises", [pais("borde", 59.9, 0), pais("polo", 65, 0), pais("sur", 50.5, -79)])
+
+    response = client.get(f"{API}/paises", params={"bbox": "-80,50,80,60", "limit": 50})
+
+    assert response.status_code == 200
+    assert sorted(p["nombre"] for p in response.json()) == ["borde", "sur"]
+    assert client.get(f"{API}/paises", params={"bbox": "0,60,10,50"}).status_code == 400
+
+def geo_within(lon, lat, ring, holes=()):
+    polygon = {"type": "Polygon", "coordinates": [ring, *holes]}
+    return MemoryQuery.matches({"location": {"type": "Point", "coordinates": [lon, lat]}},
+                               {"location": {"$geoWithin": {"$geometry": polygon}}})
+
+def test_memory_geometry_uses_geodesic_edges():
+    # Como en MongoDB, las aristas de 50°N y 60°N entre 80°O y 80°E se curvan hacia el polo: a 0° de longitud
+    # pasan por unos 81.7°N y 84.3°N, así que 55°N queda fuera y 83°N dentro
+    ring = [[-80, 50], [80, 50], [80, 60], [-80, 60], [-80, 50]]
+    for ordered in (ring, ring[::-1]):
+        assert not geo_within(0, 55, ordered)
+        assert geo_within(0, 83, ordered)
+        assert geo_within(79.9, 55, ordered)
+        assert not geo_within(180, -83, ordered)
+
+def test_memory_geometry_edges_and_holes():
+    square = [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]
+    hole = [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]
+    assert geo_within(5, 0, square) and geo_within(0, 5, square)
+    assert geo_within(2, 2, square, [hole])
+    assert not geo_within(5, 5, square, [hole])
+    assert not geo_within(11, 5, square)
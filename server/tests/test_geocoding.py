@@ -0,0 +1,29 @@
+from conftest import API
+
+def pais(nombre, **coordinates):
+    return {"nombre": nombre, "email": "a@example.com", "imagen": "", **coordinates}
+
+def test_coordinates_are_geocoded_when_both_are_missing(client):
+    response = client.post(f"{API}/paises", json=pais("Madrid"))
+
+    assert response.status_code == 201
+    assert round(response.json()["lat"]) == 40 and round(response.json()["lon"]) == -4
+
+def test_half_specified_coordinates_are_rejected(client):
+    for coordinates in ({"lat": 10.0}, {"lon": 20.0}):
+        response = client.post(f"{API}/paises", json=pais("Madrid", **coordinates))
+
+        assert response.status_code == 422
+        assert "lat y lon" in response.json()["detail"]
+    assert client.get(f"{API}/paises").json() == []
+
+def test_half_specified_coordinates_in_a_batch(client):
+    response = client.post(f"{API}/paises:batch", json=[pais("Madrid"), pais("Madrid", lat=10.0), pais("Lima", lat=1.0, lon=2.0)])
+
+    assert response.status_code == 207
+    assert [r["status"] for r in response.json()["results"]] == [201, 422, 201]
+
+def test_client_coordinates_are_kept(client):
+    response = client.post(f"{API}/paises", json=pais("Madrid", lat=1.5, lon=2.5))
+
+    assert (response.json()["lat"], response.json()["lon"]) == (1.5, 2.5)
@@ -0,0 +1,87 @@
+import asyncio
+
+from bson.objectid import ObjectId
+
+from async_db_connection import AsyncDatabaseConnection
+from marker_clusters import MarkerIndex
+from memory_db import MemoryClient
+
+def pais(lat, lon):
+    return {"_id": ObjectId(), "nombre": "Lugar", "email": "a@example.com", "lat": lat, "lon": lon}
+
+def reset():
+    MemoryClient.reset()
+    MarkerIndex._lock = None
+
+async def load_while(write):
+    """Cargar la copia y ejecutar 'write' cuando el cursor ya ha pasado por los primeros documentos."""
+    MarkerIndex.invalidate()
+    task = asyncio.create_task(MarkerIndex.ensure_loaded())
+    while not (MarkerIndex._loading and MarkerIndex._rows):
+        await asyncio.sleep(0)
+    await write()
+    await task
+
+def test_writes_during_the_first_load_are_applied():
+    reset()
+    collection = AsyncDatabaseConnection.get_collection("paises")
+    documents = [pais(10.0, 20.0) for _ in range(1200)]
+    first, deleted = str(documents[0]["_id"]), str(documents[1]["_id"])
+    created = pais(-30.0, 40.0)
+
+    async def main():
+        await collection.insert_many(documents)
+
+        async def write():
+            await collection.update_one({"_id": documents[0]["_id"]}, {"$set": {"lat": 50.0}})
+            MarkerIndex.upsert(first, 50.0, 20.0, "a@example.com")
+            await collection.delete_one({"_id": documents[1]["_id"]})
+            MarkerIndex.remove(deleted)
+            await collection.insert_one(created)
+            MarkerIndex.upsert(created["_id"], -30.0, 40.0, "a@example.com")
+
+        await load_while(write)
+
+    asyncio.run(main())
+
+    assert not MarkerIndex._loading
+    assert MarkerIndex._lat[MarkerIndex._rows[first]] == 50.0
+    assert deleted not in MarkerIndex._rows
+    assert str(created["_id"]) in MarkerIndex._rows
+    assert len(MarkerIndex._rows) == 1200
+
+def test_invalidate_during_a_load_forces_another_load():
+    reset()
+    collection = AsyncDatabaseConnection.get_collection("paises")
+
+    async def main():
+        await collection.insert_many([pais(1.0, 2.0) for _ in range(1200)])
+
+        async def write():
+            MarkerIndex.invalidate()
+
+        await load_while(write)
+
+    asyncio.run(main())
+
+    assert MarkerIndex._loaded_at is None
+
+def test_clusters_keep_only_the_points_inside_the_area():
+    reset()
+    collection = AsyncDatabaseConnection.get_collection("paises")
+    west, east = pais(10.0, 5.0), pais(10.0, 60.0)
+
+    async def main():
+        await collection.insert_many([west, east])
+        MarkerIndex.invalidate()
+        await MarkerIndex.ensure_loaded()
+
+    asyncio.run(main())
+
+    # En zoom 0 cada celda mide 90° de longitud: los dos países comparten celda, con el centroide en 32.5°E
+    assert MarkerIndex.clusters(0) == [{"lat": 10.0, "lon": 32.5, "count": 2}]
+    # Un área que no contiene el centroide conserva el país que sí está dentro
+    assert MarkerIndex.clusters(0, (40.0, 0.0, 80.0, 20.0)) == [{"lat": 10.0, "lon": 60.0, "count": 1, "_id": str(east["_id"])}]
+    # Un área que contiene el centroide no cuenta el país de fuera
+    assert MarkerIndex.clusters(0, (0.0, 0.0, 35.0, 20.0)) == [{"lat": 10.0, "lon": 5.0, "count": 1, "_id": str(west["_id"])}]
+    assert MarkerIndex.clusters(0, (100.0, 0.0, 120.0, 20.0)) == []
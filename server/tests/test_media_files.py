@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from conftest import API
+from image_variants import ImageVariants
+from media_storage import MediaStorage, Storage
+
+DATA = bytes(range(256)) * 4
+SHA256 = hashlib.sha256(DATA).hexdigest()
+KEY = f"{SHA256}.bin"
+URL = f"{API}/media/files/{KEY}"
+ETAG = f'"{SHA256}"'
+
+@pytest.fixture
+def stored(client, tmp_path):
+    source = tmp_path / "fichero.bin"
+    source.write_bytes(DATA)
+    Storage.backend().save(str(source), KEY)
+    yield
+    Storage.backend().delete(KEY)
+
+def test_whole_file(client, stored):
+    response = client.get(URL)
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert (response.headers["ETag"], response.headers["Accept-Ranges"]) == (ETAG, "bytes")
+
+    head = client.head(URL)
+    assert (head.status_code, head.content, head.headers["Content-Length"]) == (200, b"", str(len(DATA)))
+
+@pytest.mark.parametrize("header, start, end", [("bytes=10-19", 10, 19), ("bytes=1000-", 1000, 1023),
+                                                ("bytes=-24", 1000, 1023), ("bytes=1000-5000", 1000, 1023)])
+def test_single_range(client, stored, header, start, end):
+    response = client.get(URL, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+    assert response.content == DATA[start:end + 1]
+
+def test_unsatisfiable_and_ignored_ranges(client, stored):
+    unsatisfiable = client.get(URL, headers={"Range": "bytes=2000-"})
+    assert (unsatisfiable.status_code, unsatisfiable.headers["Content-Range"]) == (416, f"bytes */{len(DATA)}")
+
+    # Varios rangos, unidades desconocidas o un If-Range que no coincide devuelven el fichero completo
+    for headers in ({"Range": "bytes=0-1,5-6"}, {"Range": "items=0-1"}, {"Range": "bytes=0-9", "If-Range": '"otra"'}):
+        response = client.get(URL, headers=headers)
+        assert (response.status_code, response.content) == (200, DATA), headers
+    assert client.get(URL, headers={"Range": "bytes=0-9", "If-Range": ETAG}).status_code == 206
+
+def test_if_none_match_and_unknown_keys(client, stored):
+    cached = client.get(URL, headers={"If-None-Match": f'"otra", W/{ETAG}', "Range": "bytes=0-9"})
+    assert (cached.status_code, cached.content) == (304, b"")
+
+    assert client.get(f"{API}/media/files/{'0' * 64}.bin").status_code == 404
+    assert client.get(f"{API}/media/files/..%2Fsecreto.bin").status_code == 404
+
+def test_storage_interface_is_abstract():
+    with pytest.raises(TypeError):
+        MediaStorage()
+
+def test_failed_upload_deletes_stored_files(client, monkeypatch):
+    png = io.BytesIO()
+    Image.new("RGB", (640, 480), (0, 90, 30)).save(png, format="PNG")
+    sha256 = hashlib.sha256(png.getvalue()).hexdigest()
+
+    generate = ImageVariants.generate
+
+    def generate_then_fail(path, directory):
+        first, *rest = generate(path, directory)
+        for variant in rest:
+            os.remove(variant["path"])
+        yield first
+        raise OSError("disco lleno")
+    monkeypatch.setattr(ImageVariants, "generate", generate_then_fail)
+
+    job = client.post(f"{API}/media", files={"file": ("verde.png", png.getvalue(), "image/png")}).json()
+    for _ in range(200):
+        status = client.get(f"{API}/media/jobs/{job['jobId']}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+
+    assert status["status"] == "failed"
+    assert [name for name in os.listdir(Storage.backend().directory) if name.startswith(sha256)] == []
+
+def test_concurrent_saves_of_the_same_key(client, tmp_path, monkeypatch):
+    data = os.urandom(64 * 1024)
+    key = f"{hashlib.sha256(data).hexdigest()}.bin"
+    source = tmp_path / "fichero.bin"
+    source.write_bytes(data)
+    storage = Storage.backend()
+
+    # Los dos hilos terminan de copiar antes de que ninguno renombre su temporal
+    barrier = threading.Barrier(2, timeout=5)
+    replace = os.replace
+
+    def replace_together(partial, target):
+        barrier.wait()
+        replace(partial, target)
+    monkeypatch.setattr(os, "replace", replace_together)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        urls = list(pool.map(lambda _: storage.save(str(source), key), range(2)))
+    monkeypatch.undo()
+
+    assert set(urls) == {f"/api/v1/media/files/{key}"}
+    with open(storage.path(key), "rb") as stored:
+        assert stored.read() == data
+    assert [name for name in os.listdir(storage.directory) if name.endswith(".tmp")] == []
+    storage.delete(key)
@@ -0,0 +1,31 @@
+import inspect
+
+from conftest import API
+from metrics import route_template
+
+def template(client, method, path):
+    return route_template({"type": "http", "app": client.app, "method": method, "path": path})
+
+def test_route_template_prefers_a_full_match(client):
+    # /users/username-available solo admite GET: un PUT lo atiende /users/{id}
+    assert template(client, "GET", f"{API}/users/username-available") == f"{API}/users/username-available"
+    assert template(client, "PUT", f"{API}/users/username-available") == f"{API}/users/{{id}}"
+    assert template(client, "DELETE", f"{API}/users/username-available") == f"{API}/users/{{id}}"
+
+def test_route_template_partial_and_unmatched(client):
+    assert template(client, "PATCH", f"{API}/paises") == f"{API}/paises"
+    assert template(client, "GET", "/no/existe") == "unmatched"
+
+def test_requests_are_labelled_with_the_route_that_served_them(client):
+    client.put(f"{API}/users/username-available", json={})
+    exposition = client.get("/metrics").text
+    assert any(line.startswith("http_requests_total{") and 'method="PUT"' in line and f'route="{API}/users/{{id}}"' in line
+               for line in exposition.splitlines())
+
+def test_metrics_endpoint_runs_in_the_event_loop(client):
+    # Una ruta síncrona pasaría por el pool de hilos y esperaría detrás de las peticiones en curso
+    route = next(route for route in client.app.routes if getattr(route, "path", None) == "/metrics")
+    assert inspect.iscoroutinefunction(route.endpoint)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
@@ -0,0 +1,98 @@
+import asyncio
+
+from bson.objectid import ObjectId
+
+from async_db_connection import AsyncDatabaseConnection
+from conftest import API, insert
+
+def make_paises(count):
+    return [{"_id": ObjectId(), "nombre": f"Lugar {i % 7}", "email": "a@example.com", "lat": 1.0, "lon": 2.0,
+             "imagen": ""} for i in range(count)]
+
+def read_all(client, url):
+    """Recorrer las páginas siguiendo X-Next-Cursor y devolver los documentos y el número de páginas."""
+    documents, pages = [], 0
+    response = client.get(url)
+    while True:
+        assert response.status_code == 200
+        documents.extend(response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return documents, pages
+        assert 'rel="next"' in response.headers["Link"]
+        response = client.get(url, params={"after": cursor})
+
+def test_cursor_pages_cover_every_document_once(client):
+    insert("paises", make_paises(25))
+
+    documents, pages = read_all(client, f"{API}/paises?limit=10")
+
+    assert pages == 3
+    ids = [d["_id"] for d in documents]
+    assert len(ids) == len(set(ids)) == 25
+    assert ids == sorted(ids)
+
+def test_cursor_with_duplicated_sort_values_breaks_ties_by_id(client):
+    insert("paises", make_paises(30))
+
+    documents, _ = read_all(client, f"{API}/paises?limit=4&sort=nombre")
+
+    assert len({d["_id"] for d in documents}) == 30
+    keys = [(d["nombre"], d["_id"]) for d in documents]
+    assert keys == sorted(keys)
+
+def test_insert_between_pages_does_not_repeat_or_skip(client):
+    insert("paises", make_paises(8))
+    first = client.get(f"{API}/paises?limit=5")
+    insert("paises", make_paises(2))
+
+    second = client.get(f"{API}/paises?limit=5", params={"after": first.headers["X-Next-Cursor"]})
+
+    ids = [d["_id"] for d in first.json() + second.json()]
+    assert len(ids) == len(set(ids)) == 10
+
+def test_last_page_has_no_cursor(client):
+    insert("paises", make_paises(10))
+
+    response = client.get(f"{API}/paises?limit=10")
+
+    assert len(response.json()) == 10
+    assert "X-Next-Cursor" not in response.headers
+
+def test_cursor_from_another_sort_is_rejected(client):
+    insert("paises", make_paises(5))
+    cursor = client.get(f"{API}/paises?limit=2&sort=nombre").headers["X-Next-Cursor"]
+
+    assert client.get(f"{API}/paises?limit=2&sort=email", params={"after": cursor}).status_code == 400
+    assert client.get(f"{API}/paises?limit=2", params={"after": "no-es-un-cursor"}).status_code == 400
+
+def test_cursor_over_documents_without_the_sort_field(client):
+    documents = make_paises(12)
+    for document in documents[:5]:
+        del document["nombre"]
+    documents[5]["nombre"] = None
+    insert("paises", documents)
+
+    pages, _ = read_all(client, f"{API}/paises?limit=2&sort=nombre")
+
+    # Los nulos y los ausentes van primero; la paginación sigue después de ellos
+    assert len({d["_id"] for d in pages}) == 12
+    assert [d.get("nombre") for d in pages[:6]] == [None] * 6
+    assert [d["nombre"] for d in pages[6:]] == sorted(d["nombre"] for d in documents[6:])
+
+def test_descending_cursor_reaches_the_documents_without_the_sort_field(client):
+    documents = make_paises(8)
+    for document in documents[:3]:
+        del document["nombre"]
+    insert("paises", documents)
+
+    seen, after = [], None
+    while True:
+        page, after = asyncio.run(AsyncDatabaseConnection.query_document_after("paises", {}, None, [("nombre", -1)], after, 3))
+        seen.extend(page)
+        if after is None:
+            break
+
+    assert len({d["_id"] for d in seen}) == 8
+    assert [d.get("nombre") for d in seen[5:]] == [None] * 3
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import time
+
+from PIL import Image
+
+from conftest import API
+from upload_sessions import UploadSessions
+
+def png_bytes():
+    png = io.BytesIO()
+    Image.new("RGB", (32, 32), (10, 120, 200)).save(png, format="PNG")
+    return png.getvalue()
+
+def open_session(client, data, **extra):
+    response = client.post(f"{API}/media/uploads", json={"filename": "azul.png", "size": len(data), **extra})
+    assert response.status_code == 201
+    assert response.headers["Upload-Offset"] == "0"
+    return response.json()["uploadId"]
+
+def put(client, upload_id, data, start, end, total=None):
+    total = len(data) if total is None else total
+    return client.put(f"{API}/media/uploads/{upload_id}", content=data[start:end + 1],
+                      headers={"Content-Range": f"bytes {start}-{end}/{total}"})
+
+def test_offset_advances_and_gaps_are_rejected(client):
+    data = png_bytes()
+    upload_id = open_session(client, data)
+
+    first = put(client, upload_id, data, 0, 9)
+    assert (first.status_code, first.headers["Upload-Offset"]) == (200, "10")
+
+    gap = put(client, upload_id, data, 20, 29)
+    assert (gap.status_code, gap.headers["Upload-Offset"]) == (409, "10")
+
+    # Repetir bytes ya recibidos (reintento) se admite y avanza hasta el final del rango
+    retry = put(client, upload_id, data, 5, 14)
+    assert (retry.status_code, retry.headers["Upload-Offset"]) == (200, "15")
+
+    status = client.get(f"{API}/media/uploads/{upload_id}")
+    assert status.headers["Upload-Offset"] == "15"
+    assert status.json()["complete"] is False
+
+    early = client.post(f"{API}/media/uploads/{upload_id}/complete")
+    assert (early.status_code, early.headers["Upload-Offset"]) == (409, "15")
+
+def test_complete_upload_creates_the_image(client):
+    data = png_bytes()
+    upload_id = open_session(client, data, sha256=hashlib.sha256(data).hexdigest())
+    half = len(data) // 2
+    assert put(client, upload_id, data, 0, half - 1).status_code == 200
+    assert put(client, upload_id, data, half, len(data) - 1, total="*").json()["complete"] is True
+
+    job = client.post(f"{API}/media/uploads/{upload_id}/complete")
+    assert job.status_code == 202
+    for _ in range(200):
+        status = client.get(job.headers["Location"]).json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    assert status["status"] == "done", status
+    assert client.get(f"{API}/media/{status['imageId']}").json()["sha256"] == hashlib.sha256(data).hexdigest()
+    # La sesión desaparece al completarse
+    assert client.get(f"{API}/media/uploads/{upload_id}").status_code == 404
+
+def test_invalid_content_range(client):
+    data = png_bytes()
+    upload_id = open_session(client, data)
+    size = len(data)
+
+    cases = {
+        None: 400,
+        "bytes=0-9/*": 400,
+        "bytes 9-0/*": 400,
+        f"bytes 0-9/{size + 1}": 400,
+        f"bytes 0-{size}/{size}": 416,
+    }
+    for header, status in cases.items():
+        headers = {"Content-Range": header} if header else {}
+        assert client.put(f"{API}/media/uploads/{upload_id}", content=data[:10], headers=headers).status_code == status, header
+
+    too_long = client.put(f"{API}/media/uploads/{upload_id}", content=data[:20], headers={"Content-Range": f"bytes 0-9/{size}"})
+    assert too_long.status_code == 400
+    assert client.get(f"{API}/media/uploads/{upload_id}").headers["Upload-Offset"] == "0"
+
+def test_sha256_mismatch_aborts_the_session(client):
+    data = png_bytes()
+    upload_id = open_session(client, data, sha256="0" * 64)
+    put(client, upload_id, data, 0, len(data) - 1)
+
+    assert client.post(f"{API}/media/uploads/{upload_id}/complete").status_code == 422
+    assert client.get(f"{API}/media/uploads/{upload_id}").status_code == 404
+
+def test_size_limit_and_cancel(client, monkeypatch):
+    monkeypatch.setattr(UploadSessions, "_max_bytes", 100)
+    assert client.post(f"{API}/media/uploads", json={"filename": "grande.png", "size": 101}).status_code == 413
+
+    upload_id = open_session(client, b"x" * 50)
+    assert client.delete(f"{API}/media/uploads/{upload_id}").status_code == 200
+    assert client.get(f"{API}/media/uploads/{upload_id}").status_code == 404
+    assert client.delete(f"{API}/media/uploads/{upload_id}").status_code == 404
@@ -0,0 +1,57 @@
+from starlette.routing import Match
+
+from conftest import API, insert
+from db_indexes import IndexRegistry
+
+def available(client, user_name):
+    return client.get(f"{API}/users/username-available", params={"userName": user_name}).json()["available"]
+
+def user(user_name):
+    return {"userName": user_name, "email": f"{user_name}@example.com", "name": user_name.title(), "surname": "Pérez",
+            "description": "", "profilePicture": ""}
+
+def rename(client, user_id, user_name):
+    return client.put(f"{API}/users/{user_id}", json=user(user_name))
+
+def test_filter_is_advisory_and_the_unique_index_decides(client):
+    insert("user", [{"userName": "ana", "email": "ana@example.com"}])
+    assert available(client, "ana") is False
+    assert available(client, "luis") is True
+
+    # Otro worker crea el usuario: el filtro de este proceso no lo tiene hasta reconstruirse
+    insert("user", [{"userName": "luis", "email": "luis@example.com"}])
+    assert available(client, "luis") is True
+    assert client.post(f"{API}/users", json={**user("luis"), "oauthId": "x", "oauthProvider": "google",
+                                             "oauthToken": "t"}).status_code == 400
+
+def test_rename_to_a_name_in_use_is_a_conflict(client):
+    ana, eva = (str(i) for i in insert("user", [{"userName": "ana", "email": "ana@example.com"},
+                                                {"userName": "eva", "email": "eva@example.com"}]))
+
+    assert rename(client, ana, "eva").status_code == 409
+    assert client.get(f"{API}/users/{ana}").json()["userName"] == "ana"
+
+    assert rename(client, ana, "clara").status_code == 200
+    assert available(client, "clara") is False
+    assert available(client, "ana") is True
+
+def test_update_without_user_name_keeps_it(client):
+    user_id = str(insert("user", [{"userName": "ana", "email": "ana@example.com"}])[0])
+    body = {k: v for k, v in user("ana").items() if k != "userName"}
+
+    assert client.put(f"{API}/users/{user_id}", json=body).status_code == 200
+    assert client.get(f"{API}/users/{user_id}").json()["userName"] == "ana"
+
+def test_batch_rename_to_a_name_in_use_is_a_conflict(client):
+    ana, eva = (str(i) for i in insert("user", [{"userName": "ana", "email": "ana@example.com"},
+                                                {"userName": "eva", "email": "eva@example.com"}]))
+
+    response = client.put(f"{API}/users:batch", json=[{"id": ana, **user("eva")}, {"id": eva, **user("berta")}])
+    assert [r["status"] for r in response.json()["results"]] == [409, 200]
+    assert available(client, "berta") is False
+
+def test_declared_queries_name_existing_routes(client):
+    for query in IndexRegistry.QUERIES:
+        method, path = query["route"].split()[:2]
+        scope = {"type": "http", "method": method, "path": API + path.split("?")[0]}
+        assert any(route.matches(scope)[0] == Match.FULL for route in client.app.routes), query["route"]
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from async_db_connection import AsyncDatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+class UploadJobs:
+    """
+    UploadJobs procesa las subidas de ficheros en segundo plano para no bloquear el bucle de eventos.
+    El fichero se vuelca a disco, la petición responde 202 con el ID del trabajo y el trabajo se ejecuta
+    después; su estado se guarda en la colección 'upload_job' para que cualquier worker pueda consultarlo.
+    Métodos de Clase:
+    - spool(cls, file): Copia el fichero recibido a un temporal en disco y devuelve su ruta y su SHA-256.
+    - is_full(cls): Indica si se ha alcanzado el máximo de trabajos pendientes.
+    - pending(cls): Número de trabajos en cola o en curso en este proceso.
+    - create(cls, filename): Registra un trabajo en estado 'queued' y devuelve su ID.
+    - start(cls, job_id, path, process): Lanza el trabajo; process(job_id, path) es una corrutina.
+    - run_blocking(cls, function, *args): Ejecuta una función bloqueante en el pool de subidas.
+    - update(cls, job_id, status, **fields): Cambia el estado de un trabajo.
+    - get(cls, job_id): Devuelve el estado de un trabajo o None.
+    - shutdown(cls): Espera a los trabajos en curso y cierra el pool.
+    Configuración (variables de entorno):
+    - UPLOAD_WORKERS: Hilos del pool que hacen las subidas remotas (por defecto 4).
+    - UPLOAD_MAX_PENDING: Trabajos en cola o en curso admitidos por proceso (por defecto 100).
+    - UPLOAD_SPOOL_DIR: Directorio de los temporales (por defecto el del sistema).
+    """
+
+    COLLECTION = "upload_job"
+
+    _workers = int(os.getenv('UPLOAD_WORKERS', 4))
+    _max_pending = int(os.getenv('UPLOAD_MAX_PENDING', 100))
+    _spool_dir = os.getenv('UPLOAD_SPOOL_DIR') or None
+    _executor = None
+    _tasks = set()
+
+    @classmethod
+    def _get_executor(cls):
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=cls._workers, thread_name_prefix="upload")
+        return cls._executor
+
+    @staticmethod
+    def _copy_and_hash(source, target) -> str:
+        """Copiar un fichero por bloques calculando su SHA-256 en la misma pasada."""
+        digest = hashlib.sha256()
+        while chunk := source.read(1024 * 1024):
+            digest.update(chunk)
+            target.write(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    async def spool(cls, file: UploadFile):
+        """
+        Copiar el fichero recibido a un temporal propio, que sobrevive al final de la petición.
+
+        :return: Tupla (ruta del temporal, SHA-256 en hexadecimal)
+        """
+        fd, path = tempfile.mkstemp(prefix="upload-", dir=cls._spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as spooled:
+                digest = await run_in_threadpool(cls._copy_and_hash, file.file, spooled)
+        except Exception:
+            os.remove(path)
+            raise
+        return path, digest
+
+    @classmethod
+    def is_full(cls) -> bool:
+        """Devolver True si no se admiten más trabajos en este proceso."""
+        return len(cls._tasks) >= cls._max_pending
+
+    @classmethod
+    def pending(cls) -> int:
+        """Devolver el número de trabajos en cola o en curso en este proceso."""
+        return len(cls._tasks)
+
+    @classmethod
+    async def create(cls, filename: str) -> str:
+        """Registrar un trabajo nuevo y devolver su ID."""
+        now = datetime.now(timezone.utc)
+        job = {"status": "queued", "filename": filename, "createdAt": now, "updatedAt": now}
+        return await AsyncDatabaseConnection.create_document(cls.COLLECTION, job)
+
+    @classmethod
+    def start(cls, job_id: str, path: str, process):
+        """
+        Lanzar el trabajo como tarea del bucle de eventos.
+
+        Si process() falla, el trabajo queda en 'failed' con el error. El temporal se borra siempre al terminar.
+        """
+        async def run():
+            try:
+                await cls.update(job_id, "processing")
+                await process(job_id, path)
+            except Exception as e:
+                logger.error(f"Error en el trabajo de subida {job_id}: {e}")
+                await cls.update(job_id, "failed", error=str(e))
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        task = asyncio.create_task(run())
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def run_blocking(cls, function, *args, **kwargs):
+        """Ejecutar una función bloqueante (p. ej. la subida a Cloudinary) en el pool de subidas."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._get_executor(), lambda: function(*args, **kwargs))
+
+    @classmethod
+    async def update(cls, job_id: str, status: str, **fields):
+        """Cambiar el estado de un trabajo."""
+        fields.update({"status": status, "updatedAt": datetime.now(timezone.utc)})
+        await AsyncDatabaseConnection.update_document_id(cls.COLLECTION, job_id, fields)
+
+    @classmethod
+    async def get(cls, job_id: str):
+        """Leer el estado de un trabajo sin pasar por la caché de documentos."""
+        return await AsyncDatabaseConnection.read_document_id(cls.COLLECTION, job_id, use_cache=False)
+
+    @classmethod
+    async def shutdown(cls):
+        """Esperar a los trabajos en curso y cerrar el pool."""
+        if cls._tasks:
+            await asyncio.gather(*cls._tasks, return_exceptions=True)
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=True)
+            cls._executor = None
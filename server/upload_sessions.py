@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from async_db_connection import AsyncDatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+class UploadSessions:
+    """
+    UploadSessions gestiona las subidas por partes: el cliente abre una sesión con el tamaño del fichero,
+    envía rangos de bytes con PUT y la finaliza. Los bytes se escriben en un fichero parcial en disco y el
+    desplazamiento recibido se guarda en la colección 'upload_session', así que tras un corte el cliente
+    consulta la sesión y continúa desde ese punto.
+    Métodos de Clase:
+    - create(cls, filename, size, sha256): Abre una sesión y devuelve su ID.
+    - get(cls, session_id): Devuelve la sesión o None.
+    - parse_content_range(cls, header, size): Lee una cabecera 'Content-Range: bytes inicio-fin/total'.
+    - write(cls, session, start, end, chunks): Escribe un rango y devuelve el nuevo desplazamiento.
+    - finish(cls, session): Comprueba que el fichero está completo y devuelve su ruta y su SHA-256.
+    - abort(cls, session_id): Cancela una sesión y borra su fichero parcial.
+    - cleanup(cls): Borra los ficheros parciales de sesiones caducadas.
+    Configuración (variables de entorno):
+    - UPLOAD_SPOOL_DIR: Directorio de los ficheros parciales (por defecto el temporal del sistema). Si hay
+      varios workers, debe ser un directorio que vean todos.
+    - UPLOAD_MAX_BYTES: Tamaño máximo de un fichero (por defecto 100 MB).
+    - UPLOAD_SESSION_TTL_SECONDS: Tiempo sin actividad tras el que una sesión caduca (por defecto 86400).
+    """
+
+    COLLECTION = "upload_session"
+    _CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+    _spool_dir = os.getenv('UPLOAD_SPOOL_DIR') or tempfile.gettempdir()
+    _max_bytes = int(os.getenv('UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+    _ttl = int(os.getenv('UPLOAD_SESSION_TTL_SECONDS', 86400))
+    _buffer_size = 1024 * 1024
+
+    @classmethod
+    def path(cls, session_id: str) -> str:
+        """Ruta del fichero parcial de una sesión."""
+        return os.path.join(cls._spool_dir, f"chunked-{session_id}.part")
+
+    @classmethod
+    async def create(cls, filename: str, size: int, sha256: str | None = None) -> str:
+        """Abrir una sesión de subida con el fichero parcial vacío."""
+        if size > cls._max_bytes:
+            raise HTTPException(status_code=413, detail=f"El fichero no puede superar {cls._max_bytes} bytes")
+        cls.cleanup()
+
+        now = datetime.now(timezone.utc)
+        session = {"filename": filename, "size": size, "offset": 0, "sha256": sha256, "createdAt": now, "updatedAt": now}
+        session_id = await AsyncDatabaseConnection.create_document(cls.COLLECTION, session)
+        open(cls.path(session_id), "wb").close()
+        return session_id
+
+    @classmethod
+    async def get(cls, session_id: str):
+        """Leer una sesión sin pasar por la caché de documentos; None si no existe o su fichero ha desaparecido."""
+        session = await AsyncDatabaseConnection.read_document_id(cls.COLLECTION, session_id, use_cache=False)
+        if session is not None and not os.path.exists(cls.path(session_id)):
+            return None
+        return session
+
+    @classmethod
+    def parse_content_range(cls, header: str | None, size: int):
+        """Devolver (inicio, fin) de 'Content-Range: bytes inicio-fin/total' con fin incluido."""
+        match = cls._CONTENT_RANGE.match((header or "").strip())
+        if match is None:
+            raise HTTPException(status_code=400, detail="La cabecera Content-Range debe tener el formato 'bytes inicio-fin/total'")
+        start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+        if end < start or (total != "*" and int(total) != size):
+            raise HTTPException(status_code=400, detail="El rango de Content-Range no es válido para esta subida")
+        if end >= size:
+            raise HTTPException(status_code=416, detail=f"El rango supera el tamaño declarado de {size} bytes")
+        return start, end
+
+    @classmethod
+    def _write_at(cls, path: str, position: int, data: bytes):
+        with open(path, "r+b") as f:
+            f.seek(position)
+            f.write(data)
+
+    @classmethod
+    async def write(cls, session: dict, start: int, end: int, chunks) -> int:
+        """
+        Escribir el rango [start, end] leyendo el cuerpo de la petición por bloques.
+
+        Un rango puede repetir bytes ya recibidos (reintento de una parte), pero no dejar huecos. Si la conexión
+        se corta a mitad, los bytes escritos se conservan y el desplazamiento avanza hasta ellos.
+        :param chunks: Iterador asíncrono con el cuerpo de la petición
+        :return: El nuevo desplazamiento
+        """
+        if start > session["offset"]:
+            raise HTTPException(status_code=409, detail=f"Se esperaba el rango a partir del byte {session['offset']}",
+                                headers={"Upload-Offset": str(session["offset"])})
+
+        path = cls.path(session["_id"])
+        position, buffer = start, bytearray()
+        limit = end - start + 1
+        try:
+            async for chunk in chunks:
+                if len(buffer) + (position - start) + len(chunk) > limit:
+                    raise HTTPException(status_code=400, detail="El cuerpo es mayor que el rango de Content-Range")
+                buffer += chunk
+                if len(buffer) >= cls._buffer_size:
+                    await run_in_threadpool(cls._write_at, path, position, bytes(buffer))
+                    position += len(buffer)
+                    buffer.clear()
+        except ClientDisconnect:
+            logger.info(f"Conexión cortada en la sesión de subida {session['_id']} en el byte {position + len(buffer)}.")
+        finally:
+            if buffer:
+                await run_in_threadpool(cls._write_at, path, position, bytes(buffer))
+                position += len(buffer)
+
+            # $max evita que una petición más lenta haga retroceder el desplazamiento
+            updated = await AsyncDatabaseConnection.update_document_operators(
+                cls.COLLECTION, session["_id"], {"$max": {"offset": position}, "$set": {"updatedAt": datetime.now(timezone.utc)}}
+            )
+        return updated["offset"] if updated else position
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    async def finish(cls, session: dict):
+        """
+        Cerrar una sesión completa y devolver (ruta del fichero, SHA-256). El fichero pasa a ser del llamador.
+
+        Si el cliente declaró un SHA-256 al abrir la sesión y no coincide, la sesión se cancela.
+        """
+        if session["offset"] < session["size"]:
+            raise HTTPException(status_code=409, detail=f"Faltan bytes: se han recibido {session['offset']} de {session['size']}",
+                                headers={"Upload-Offset": str(session["offset"])})
+
+        path = cls.path(session["_id"])
+        digest = await run_in_threadpool(cls._hash_file, path)
+        if session.get("sha256") and session["sha256"].lower() != digest:
+            await cls.abort(session["_id"])
+            raise HTTPException(status_code=422, detail="El SHA-256 del fichero recibido no coincide con el declarado")
+
+        await AsyncDatabaseConnection.delete_document_id(cls.COLLECTION, session["_id"])
+        return path, digest
+
+    @classmethod
+    async def abort(cls, session_id: str) -> int:
+        """Cancelar una sesión y borrar su fichero parcial. Devuelve el número de sesiones borradas."""
+        if os.path.exists(cls.path(session_id)):
+            os.remove(cls.path(session_id))
+        return await AsyncDatabaseConnection.delete_document_id(cls.COLLECTION, session_id)
+
+    @classmethod
+    def cleanup(cls):
+        """Borrar los ficheros parciales sin actividad desde hace más de UPLOAD_SESSION_TTL_SECONDS."""
+        limit = time.time() - cls._ttl
+        try:
+            with os.scandir(cls._spool_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith("chunked-") and entry.name.endswith(".part") and entry.stat().st_mtime < limit:
+                        os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"No se han podido limpiar las subidas caducadas: {e}")
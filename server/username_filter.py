@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+
+from async_db_connection import AsyncDatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+class UsernameFilter:
+    """
+    UsernameFilter es un filtro de Bloom en memoria con los nombres de usuario existentes. Responde sin ir a
+    la base de datos cuando un nombre no está en el filtro; si el filtro dice que puede existir, se confirma
+    con una consulta por el índice único de userName.
+    Métodos de Clase:
+    - ensure_loaded(cls): Construye el filtro desde la base de datos si no existe o ha caducado.
+    - add(cls, user_name): Añade un nombre tras crear o renombrar un usuario.
+    - might_contain(cls, user_name): False si el nombre no está en el filtro; True si puede existir.
+    - stats(cls): Tamaño del filtro y nombres cargados.
+    Limitaciones:
+    - Un filtro de Bloom no admite borrados: los nombres de usuarios borrados siguen dando True (y se
+      confirman en la base de datos) hasta la siguiente reconstrucción.
+    - Con varios workers, los nombres creados en otro worker no están en el filtro de este hasta que se
+      reconstruye, así que pueden salir libres. La disponibilidad que devuelve es orientativa; la garantía la
+      da el índice único de userName, que rechaza el nombre repetido al crear o renombrar el usuario.
+    Configuración (variables de entorno):
+    - USERNAME_FILTER_CAPACITY: Nombres previstos (por defecto 1000000; crece si hay más al reconstruir).
+    - USERNAME_FILTER_FP_RATE: Tasa de falsos positivos buscada (por defecto 0.01).
+    - USERNAME_FILTER_REBUILD_SECONDS: Cada cuánto se reconstruye el filtro (por defecto 300).
+    """
+
+    _capacity = int(os.getenv('USERNAME_FILTER_CAPACITY', 1000000))
+    _fp_rate = float(os.getenv('USERNAME_FILTER_FP_RATE', 0.01))
+    _ttl = float(os.getenv('USERNAME_FILTER_REBUILD_SECONDS', 300))
+
+    _bits = None
+    _size = 0
+    _hashes = 0
+    _count = 0
+    _loaded_at = None
+    _loading = False
+    _added_while_loading = []
+    _lock = None
+
+    @classmethod
+    def _reset(cls, capacity):
+        """Dimensionar el filtro: m = -n·ln(p) / ln(2)² bits y k = m/n·ln(2) funciones hash."""
+        capacity = max(capacity, 1)
+        cls._size = max(8, math.ceil(-capacity * math.log(cls._fp_rate) / (math.log(2) ** 2)))
+        cls._hashes = max(1, round(cls._size / capacity * math.log(2)))
+        cls._bits = bytearray((cls._size + 7) // 8)
+        cls._count = 0
+
+    @classmethod
+    def _positions(cls, user_name):
+        """Posiciones de los k bits de un nombre con doble hash (Kirsch-Mitzenmacher) sobre BLAKE2b."""
+        digest = hashlib.blake2b(user_name.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % cls._size for i in range(cls._hashes)]
+
+    @classmethod
+    def _set(cls, user_name):
+        for position in cls._positions(user_name):
+            cls._bits[position >> 3] |= 1 << (position & 7)
+        cls._count += 1
+
+    @classmethod
+    async def ensure_loaded(cls):
+        """Construir el filtro con los nombres de la base de datos si no existe o ha caducado."""
+        if cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls._ttl:
+            return
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._loaded_at is not None and time.monotonic() - cls._loaded_at < cls._ttl:
+                return
+            cls._loading = True
+            cls._added_while_loading = []
+            try:
+                names = [d["userName"] async for d in AsyncDatabaseConnection.stream_documents(
+                    "user", {"userName": {"$type": "string"}}, {"_id": 0, "userName": 1})]
+                cls._reset(max(cls._capacity, 2 * len(names)))
+                for user_name in names + cls._added_while_loading:
+                    cls._set(user_name)
+                cls._loaded_at = time.monotonic()
+                logger.info(f"Filtro de nombres de usuario construido con {len(names)} nombres.")
+            finally:
+                cls._loading = False
+                cls._added_while_loading = []
+
+    @classmethod
+    def add(cls, user_name):
+        """Añadir un nombre después de crear un usuario."""
+        if not isinstance(user_name, str):
+            return
+        if cls._loading:
+            cls._added_while_loading.append(user_name)
+        if cls._bits is not None:
+            cls._set(user_name)
+
+    @classmethod
+    def might_contain(cls, user_name) -> bool:
+        """Devolver False si el nombre no está en el filtro y True si puede existir (o no hay filtro)."""
+        if cls._bits is None or cls._loading:
+            return True
+        return all(cls._bits[position >> 3] & (1 << (position & 7)) for position in cls._positions(user_name))
+
+    @classmethod
+    def stats(cls):
+        """Devolver el tamaño del filtro y los nombres cargados."""
+        return {"bits": cls._size, "hashes": cls._hashes, "count": cls._count, "fp_rate": cls._fp_rate}
@@ -2,15 +2,16 @@ import httpx
 
 from typing import List
 from fastapi import APIRouter, HTTPException, Query, Request, Path
-from fastapi.responses import JSONResponse
 import json
 from bson.objectid import ObjectId
 
-from models.user_model import User, Review, UserCreate, UserUpdate, UserDeleteResponse
-from db_connection import DatabaseConnection
+from models.user_model import User, Review, UserCreate, UserUpdate, UserBatchUpdate, UserBatchDelete, UserLookup, UserDeleteResponse
+from async_db_connection import AsyncDatabaseConnection
 from api_utils import APIUtils
+from serializers import FastJSONResponse
+from username_filter import UsernameFilter
+from pymongo.errors import DuplicateKeyError
 from fastapi import Path, HTTPException
-from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
@@ -35,7 +36,10 @@ async def get_users(
     sort: str | None = Query(None, description="Campos por los que ordenar, separados por comas"),
     offset: int = Query(default=0, description="Índice de inicio para los resultados de la paginación"),
     limit: int = Query(default=10, description="Cantidad de usuarios a devolver, por defecto 10"),
-    hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS")
+    hateoas: bool | None = Query(None, description="Incluir enlaces HATEOAS"),
+    after: str | None = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor)"),
+    stream: bool | None = Query(None, description="Devolver los resultados en streaming (NDJSON)"),
+    ids: str | None = Query(None, description="IDs separados por comas: devuelve esos usuarios en el mismo orden e ignora los demás filtros")
 ):
     APIUtils.check_accept_json(request)
 
@@ -43,6 +47,11 @@ async def get_users(
         projection = APIUtils.build_projection(fields)
         sort_criteria = APIUtils.build_sort_criteria(sort)
 
+        if ids is not None:
+            users, missing = await AsyncDatabaseConnection.read_documents_ids("user", APIUtils.parse_ids(ids), projection)
+            headers = APIUtils.add_missing_ids({"X-Total-Count": str(len(users))}, missing)
+            return APIUtils.conditional_response(request, users, headers=headers)
+
         query = {}
         if email is not None:
             query["email"] = email
@@ -62,19 +71,51 @@ async def get_users(
             query["userName"] = userName
 
 
-        users = DatabaseConnection.query_document("user", query, projection, sort_criteria, offset, limit)
+        if APIUtils.wants_ndjson(request, stream):
+            return APIUtils.ndjson_response(AsyncDatabaseConnection.stream_documents("user", query, projection, sort_criteria, offset, limit))
+
+        next_cursor = None
+        if after or (offset == 0 and limit > 0):
+            users, next_cursor = await AsyncDatabaseConnection.query_document_after("user", query, projection, sort_criteria, after, limit)
+        else:
+            users = await AsyncDatabaseConnection.query_document("user", query, projection, sort_criteria, offset, limit)
 
-        total_count = len(users)
+        total_count = await AsyncDatabaseConnection.count_documents_cached("user", query)
 
         if hateoas:
             for user in users:
                 user["href"] = f"/api/{version}/{endpoint_name}/{user['_id']}"
 
-        return JSONResponse(status_code=200, content=users, 
-                            headers={"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)})
+        headers = {"Accept-Encoding": "gzip", "X-Total-Count": str(total_count)}
+        return APIUtils.conditional_response(request, users,
+                                             headers=APIUtils.add_next_cursor(request, headers, next_cursor))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al buscar el usuario: {str(e)}")
 
+#comprobar si un nombre de usuario está libre (debe ir antes de /users/{id})
+@router.get("/" + endpoint_name + "/username-available", tags=["user CRUD endpoints"])
+async def get_username_available(request: Request,
+                                 userName: str = Query(min_length=1, description="Nombre de usuario a comprobar")):
+    """
+    Comprobar si un nombre de usuario está libre. Los nombres que el filtro de Bloom descarta se responden
+    sin consultar la base de datos; el resto se confirma con el índice único de userName. La respuesta es
+    orientativa: un nombre creado en otro worker desde la última reconstrucción del filtro puede salir libre,
+    y entonces lo rechaza el índice único al crear o renombrar el usuario.
+    """
+    APIUtils.check_accept_json(request)
+
+    try:
+        await UsernameFilter.ensure_loaded()
+        available = not await check_username_taken(userName)
+        return FastJSONResponse(status_code=200, content={"userName": userName, "available": available},
+                                headers={"Cache-Control": "no-store"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al comprobar el nombre de usuario: {str(e)}")
+
 @router.get("/" + endpoint_name + "/{id}", tags=["user CRUD endpoints"], response_model=User)
 async def get_users_by_id(request: Request,
                         id: str = Path(description="ID del usuario", min_length=24, max_length=24),
@@ -89,12 +130,11 @@ async def get_users_by_id(request: Request,
             projection["oauthId"] = 1
             projection["oauthProvider"] = 1      
         
-        user = DatabaseConnection.read_document_id("user", id, projection)
+        user = await AsyncDatabaseConnection.read_document_id("user", id, projection)
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
 
-        return JSONResponse(status_code=200, content=user,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})
+        return APIUtils.conditional_response(request, user, headers={"X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el usuario: {str(e)}")
 
@@ -104,55 +144,25 @@ async def add_review_to_user(review: Review, id: str = Path(description="ID del
     APIUtils.check_id(id)
 
     try:
-        review_dict = review.model_dump()
         if review.user is None or review.rating is None:
-            return JSONResponse(status_code=400, content={"detail": "El usuario y la valoración son obligatorios"}) 
+            return FastJSONResponse(status_code=400, content={"detail": "El usuario y la valoración son obligatorios"}) 
         if review.rating < 1 or review.rating > 5:
-            return JSONResponse(status_code=400, content={"detail": "La valoración debe estar entre 1 y 5"})
-        
-        user = DatabaseConnection.read_document_id("user", id)
-        if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
-        reviwer = DatabaseConnection.read_document_id("user", review_dict["user"])
+            return FastJSONResponse(status_code=400, content={"detail": "La valoración debe estar entre 1 y 5"})
+        APIUtils.check_id(review.user)
+
+        reviwer = await AsyncDatabaseConnection.read_document_id("user", review.user, {"_id": 1})
         if reviwer is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {review_dict['user']} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {review.user} no encontrado"})
 
-        if not user["reviews"]:  # Si user["reviews"] está vacío
-            user["reviews"].append(review_dict)
-        else:
-            review_found = False
-            for i in range(len(user["reviews"])):
-                if user["reviews"][i]["user"] == review_dict["user"]:
-                    user["reviews"][i] = review_dict  
-                    review_found = True
-                    break  
-            if not review_found:
-                user["reviews"].append(review_dict)  
-
-
-        #convertir a obejct id todos los usuarios de las reviews
-        for i in range(len(user["reviews"])):
-            user["reviews"][i]["user"] = ObjectId(user["reviews"][i]["user"])
-
-        changes = {"reviews": user["reviews"]}
-        upadatedUser = DatabaseConnection.update_document("user", id, changes)
-        reviews = upadatedUser["reviews"]
-        if len(reviews) == 0:
-            return JSONResponse(status_code=200, content={"detail": "El usuario no tiene reviews", "average": 0})
-        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
+        user = await upsert_review(id, ObjectId(review.user), review.rating)
+        if user is None:
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
 
-        average = total / len(reviews)
-        average = round(average, 2)
-        newReview = {"totalRates": len(reviews), "ratingAverage": average}
-        
-    
-        return JSONResponse(status_code=200, content=newReview,
+        newReview = {"totalRates": user["ratingCount"], "ratingAverage": rating_average(user)}
+        return FastJSONResponse(status_code=200, content=newReview,
                             headers={"Content-Type": "application/json", "X-Total-Count": "1"})
-
-       
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear la review: {str(e)}")
 
@@ -162,21 +172,15 @@ async def get_review_average(id: str = Path(description="ID del usuario", min_le
     APIUtils.check_id(id)
 
     try:
-        user = DatabaseConnection.read_document_id("user", id)
+        user = await read_review_aggregates(id)
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
 
-        reviews = user["reviews"]
-        if len(reviews) == 0:
-            return JSONResponse(status_code=200, content={"detail": "El usuario no tiene reviews", "average": 0})
-        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
-        
-        average = total / len(reviews)
-        average = round(average, 2)
-        return JSONResponse(status_code=200, content={"detail": f"La media de las reviews del usuario {id} es {average}", "average": average})
+        if user["ratingCount"] == 0:
+            return FastJSONResponse(status_code=200, content={"detail": "El usuario no tiene reviews", "average": 0})
+
+        average = rating_average(user)
+        return FastJSONResponse(status_code=200, content={"detail": f"La media de las reviews del usuario {id} es {average}", "average": average})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener la media de las reviews: {str(e)}")
 
@@ -186,13 +190,18 @@ async def create_users(user: UserCreate, request: Request):
 
     try:
         body_dict = user.model_dump()
-        if not check_unique_username(body_dict["userName"]):
-            return JSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
         body_dict["wantEmails"] = True
         body_dict["reviews"] = []
-
-        DatabaseConnection.create_document("user", body_dict)
-        return JSONResponse(status_code=201, content={"detail": "El usuario se ha creado correctamente", "result": body_dict},
+        body_dict["ratingSum"] = 0
+        body_dict["ratingCount"] = 0
+
+        # El índice único de userName rechaza los nombres repetidos sin una consulta previa
+        try:
+            await AsyncDatabaseConnection.create_document("user", body_dict)
+        except DuplicateKeyError:
+            return FastJSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
+        UsernameFilter.add(body_dict["userName"])
+        return FastJSONResponse(status_code=201, content={"detail": "El usuario se ha creado correctamente", "result": body_dict},
                             headers={"Location": f"/api/{version}/{endpoint_name}/{body_dict['_id']}"} )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al crear el usuario: {str(e)}")
@@ -203,10 +212,20 @@ async def update_users(user: UserUpdate, id: str = Path(description="ID del usua
 
     try:
         updated_fields = user.model_dump()
-        if "userName" in updated_fields and not check_unique_username(updated_fields["userName"]):
-            return JSONResponse(status_code=400, content={"detail": "El nombre de usuario ya existe"})
-        DatabaseConnection.update_document("user", id, updated_fields)
-        return JSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha actualizado correctamente."})
+        if "userName" not in user.model_fields_set:
+            updated_fields.pop("userName", None)
+        if "reviews" in user.model_fields_set:
+            prepare_reviews(updated_fields)
+        else:
+            updated_fields.pop("reviews", None)
+        # Como al crear, el índice único de userName rechaza un nombre en uso sin una consulta previa
+        try:
+            await AsyncDatabaseConnection.update_document_id("user", id, updated_fields)
+        except DuplicateKeyError:
+            return FastJSONResponse(status_code=409, content={"detail": "El nombre de usuario ya existe"})
+        if "userName" in updated_fields:
+            UsernameFilter.add(updated_fields["userName"])
+        return FastJSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha actualizado correctamente."})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al actualizar el usuario: {str(e)}")
 
@@ -226,12 +245,11 @@ async def get_users_by_oauthId(request: Request,
         if oauthProvider is not None:
             query["oauthProvider"] = oauthProvider
         
-        user = DatabaseConnection.query_document("user", query, projection)
+        user = await AsyncDatabaseConnection.query_document("user", query, projection)
         if user is None or len(user) == 0:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con oauthId {oauthId} no encontrado"})
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con oauthId {oauthId} no encontrado"})
 
-        return JSONResponse(status_code=200, content=user,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})
+        return APIUtils.conditional_response(request, user, headers={"X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el usuario: {str(e)}")
 
@@ -240,18 +258,18 @@ async def delete_users(id: str = Path(description="ID del usuario", min_length=2
     APIUtils.check_id(id)
 
     try:
-        count = DatabaseConnection.delete_document("user", id)
+        count = await AsyncDatabaseConnection.delete_document_id("user", id)
         if count == 0:
-            return JSONResponse(status_code=404, content={"detail": "No se ha encontrado un usuario con ese ID. No se ha borrado nada."})
+            return FastJSONResponse(status_code=404, content={"detail": "No se ha encontrado un usuario con ese ID. No se ha borrado nada."})
 
-        return JSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha eliminado correctamente."})
+        return FastJSONResponse(status_code=200, content={"detail": f"El usuario ({id}) se ha eliminado correctamente."})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al eliminar el usuario: {str(e)}")
 
 #obtrenr perfil completo con reviews totales y media
 @router.get("/" + endpoint_name + "/{id}/profile", tags=["user CRUD endpoints"], response_model=User)
-async def get_user_profile(id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
+async def get_user_profile(request: Request, id: str = Path(description="ID del usuario", min_length=24, max_length=24)):
     APIUtils.check_id(id)
     projection = {}
     projection["oauthId"] = 0
@@ -259,33 +277,98 @@ async def get_user_profile(id: str = Path(description="ID del usuario", min_leng
     
     
     try:
-        user = DatabaseConnection.read_document_id("user", id, projection)
+        user = await AsyncDatabaseConnection.read_document_id("user", id, projection)
         if user is None:
-            return JSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
-
-        reviews = user["reviews"]
-        if len(reviews) == 0:
-            user["ratingAverage"] = 0
-            user["totalRates"] = 0
-            return JSONResponse(status_code=200, content=user,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})        
-        total = 0
-        for review in reviews:
-            total += review["rating"]
-        
-        average = total / len(reviews)
-        average = round(average, 2)
-        user["ratingAverage"] = average
-        user["totalRates"] = len(reviews)
+            return FastJSONResponse(status_code=404, content={"detail": f"Usuario con ID {id} no encontrado"})
 
-        return JSONResponse(status_code=200, content=user,
-                            headers={"Content-Type": "application/json", "X-Total-Count": "1"})
+        if "ratingCount" not in user:
+            aggregates = await read_review_aggregates(id)
+            user["ratingSum"], user["ratingCount"] = aggregates["ratingSum"], aggregates["ratingCount"]
+
+        user["ratingAverage"] = rating_average(user)
+        user["totalRates"] = user.pop("ratingCount")
+        user.pop("ratingSum", None)
+
+        return APIUtils.conditional_response(request, user, headers={"X-Total-Count": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener el perfil completo del usuario: {str(e)}")
 
+@router.post("/" + endpoint_name + ":lookup", tags=["user batch endpoints"])
+async def lookup_users(request: Request, body: UserLookup):
+    """Obtener varios usuarios por ID en una sola consulta, para listas demasiado largas para la URL."""
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(body.ids)
+
+    try:
+        users, missing = await AsyncDatabaseConnection.read_documents_ids("user", body.ids, APIUtils.build_projection(body.fields))
+        return FastJSONResponse(status_code=200, content={"results": users, "missing": missing},
+                                headers={"X-Total-Count": str(len(users))})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar los usuarios: {str(e)}")
+
+@router.post("/" + endpoint_name + ":batch", tags=["user batch endpoints"])
+async def create_users_batch(users: List[UserCreate], request: Request):
+    """Crear varios usuarios en una sola escritura masiva. Los nombres de usuario repetidos se rechazan con 409."""
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(users)
+
+    try:
+        documents = []
+        for user in users:
+            body_dict = user.model_dump()
+            body_dict["wantEmails"] = True
+            body_dict["reviews"] = []
+            body_dict["ratingSum"] = 0
+            body_dict["ratingCount"] = 0
+            documents.append(body_dict)
+
+        results = await AsyncDatabaseConnection.create_documents("user", documents)
+        for document, result in zip(documents, results):
+            if result["status"] == 201:
+                UsernameFilter.add(document["userName"])
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=201 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al crear los usuarios: {str(e)}")
+
+@router.put("/" + endpoint_name + ":batch", tags=["user batch endpoints"])
+async def update_users_batch(users: List[UserBatchUpdate], request: Request):
+    """Actualizar varios usuarios en una sola escritura masiva. Solo se modifican los campos enviados."""
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(users)
+
+    try:
+        updates = []
+        for user in users:
+            updated_fields = user.model_dump(exclude={"id"}, exclude_unset=True)
+            if "reviews" in updated_fields:
+                prepare_reviews(updated_fields)
+            updates.append((user.id, updated_fields))
+        results = await AsyncDatabaseConnection.update_documents_id("user", updates)
+        for (_, updated_fields), result in zip(updates, results):
+            if result["status"] == 200 and "userName" in updated_fields:
+                UsernameFilter.add(updated_fields["userName"])
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=200 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar los usuarios: {str(e)}")
+
+@router.delete("/" + endpoint_name + ":batch", tags=["user batch endpoints"])
+async def delete_users_batch(body: UserBatchDelete, request: Request):
+    """Eliminar varios usuarios por su ID en una sola escritura masiva."""
+    APIUtils.check_content_type_json(request)
+    APIUtils.check_batch_size(body.ids)
+
+    try:
+        results = await AsyncDatabaseConnection.delete_documents_id("user", body.ids)
+        content = APIUtils.batch_content(results)
+        return FastJSONResponse(status_code=200 if content["failed"] == 0 else 207, content=content)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al eliminar los usuarios: {str(e)}")
+
 @router.options("/" + endpoint_name, tags=["user OPTIONS endpoints"])
 async def options_notifications():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "OPTIONS"]},
         headers={"Allow": "GET, POST, OPTIONS"}
@@ -293,16 +376,103 @@ async def options_notifications():
 
 @router.options("/" + endpoint_name + "/{id}", tags=["user OPTIONS endpoints"])
 async def options_notifications_by_id():
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=200,
         content={"methods": ["GET", "PUT", "DELETE", "OPTIONS"]},
         headers={"Allow": "GET, PUT, DELETE, OPTIONS"}
     )
 
-#fun to check if the userName is unique
-def check_unique_username(userName):
-    query = {"userName": userName}
-    user = DatabaseConnection.query_document("user", query)
-    if len(user) > 0:
+#comprobar si un nombre de usuario ya está en uso
+async def check_username_taken(userName):
+    """
+    Devolver True si el nombre está en uso. Si el filtro de Bloom lo descarta se responde sin consultar la base
+    de datos; si no, se confirma con el índice único de userName. Es orientativo: la garantía la da ese
+    índice al crear o renombrar un usuario.
+    """
+    if not UsernameFilter.might_contain(userName):
         return False
-    return True
\ No newline at end of file
+    return await AsyncDatabaseConnection.exists("user", {"userName": userName})
+
+_REVIEW_AGGREGATES = {"ratingSum": 1, "ratingCount": 1}
+_REVIEW_RETRIES = 5
+
+def review_aggregates(reviews):
+    """Calcular ratingSum y ratingCount a partir de una lista de reviews."""
+    ratings = [r["rating"] for r in reviews if r.get("rating") is not None]
+    return {"ratingSum": sum(ratings), "ratingCount": len(ratings)}
+
+def prepare_reviews(updated_fields):
+    """Guardar los revisores como ObjectId y recalcular los agregados cuando se sustituyen las reviews."""
+    reviews = updated_fields["reviews"] or []
+    for review in reviews:
+        if APIUtils.is_valid_objectid(review.get("user")):
+            review["user"] = ObjectId(review["user"])
+    updated_fields["reviews"] = reviews
+    updated_fields.update(review_aggregates(reviews))
+
+def rating_average(user):
+    """Media de las valoraciones a partir de los agregados del usuario."""
+    if not user.get("ratingCount"):
+        return 0
+    return round(user["ratingSum"] / user["ratingCount"], 2)
+
+async def backfill_review_aggregates(id):
+    """
+    Inicializar ratingSum y ratingCount en usuarios creados antes de existir los agregados.
+
+    La escritura solo se aplica si el arreglo de reviews no ha cambiado desde que se leyó.
+    """
+    user = await AsyncDatabaseConnection.read_document_id("user", id, {"reviews": 1, "ratingCount": 1}, use_cache=False)
+    if user is None or "ratingCount" in user:
+        return user
+    aggregates = review_aggregates(user.get("reviews") or [])
+    await AsyncDatabaseConnection.update_document_operators(
+        "user", id, {"$set": aggregates},
+        condition={"ratingCount": {"$exists": False}, "reviews": user.get("reviews")}
+    )
+    return await AsyncDatabaseConnection.read_document_id("user", id, {"reviews": 1, **_REVIEW_AGGREGATES}, use_cache=False)
+
+async def read_review_aggregates(id):
+    """Leer ratingSum y ratingCount de un usuario sin traer sus reviews."""
+    user = await AsyncDatabaseConnection.read_document_id("user", id, _REVIEW_AGGREGATES)
+    if user is not None and "ratingCount" not in user:
+        user = await backfill_review_aggregates(id)
+    return user
+
+async def upsert_review(id, reviewer_id, rating):
+    """
+    Añadir o sustituir la review de reviewer_id y mantener ratingSum/ratingCount con una única
+    actualización atómica por intento.
+
+    Una review nueva se añade con $push solo si el revisor no tiene ya una. Si la tiene, su valoración
+    se sustituye comparando con el valor leído ($elemMatch), así que dos reviews concurrentes no
+    pueden pisarse: la que pierde la carrera vuelve a intentarlo con el valor actual.
+    :return: Agregados del usuario tras la escritura, o None si el usuario no existe
+    """
+    for _ in range(_REVIEW_RETRIES):
+        user = await AsyncDatabaseConnection.update_document_operators(
+            "user", id,
+            {"$push": {"reviews": {"user": reviewer_id, "rating": rating}}, "$inc": {"ratingSum": rating, "ratingCount": 1}},
+            condition={"reviews.user": {"$ne": reviewer_id}, "ratingCount": {"$exists": True}},
+            projection=_REVIEW_AGGREGATES
+        )
+        if user is not None:
+            return user
+
+        current = await backfill_review_aggregates(id)
+        if current is None:
+            return None
+        previous = next((r["rating"] for r in current.get("reviews") or [] if r.get("user") == reviewer_id), None)
+        if previous is None:
+            continue
+
+        user = await AsyncDatabaseConnection.update_document_operators(
+            "user", id,
+            {"$set": {"reviews.$.rating": rating}, "$inc": {"ratingSum": rating - previous}},
+            condition={"reviews": {"$elemMatch": {"user": reviewer_id, "rating": previous}}},
+            projection=_REVIEW_AGGREGATES
+        )
+        if user is not None:
+            return user
+
+    raise HTTPException(status_code=409, detail="La review se ha modificado a la vez desde otra petición. Inténtalo de nuevo.")